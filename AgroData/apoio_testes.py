@@ -0,0 +1,9 @@
+# ==============================================================================
+# APOIO AOS TESTES
+# ==============================================================================
+# Os testes usam um cache em memória do próprio processo: o cache configurado
+# (arquivos em disco ou Redis) seria compartilhado entre execuções e processos.
+# Uso: @override_settings(CACHES=CACHE_LOCAL) na classe de teste, com
+# cache.clear() no setUp.
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
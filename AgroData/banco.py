@@ -0,0 +1,134 @@
+import sys
+
+from django.conf import settings
+from django.core import checks
+from django.db import connections
+
+# ======================================================================
+# CONEXÕES COM O BANCO: VERIFICAÇÕES E MÉTRICAS DO POOL
+# ======================================================================
+# A configuração (conexões persistentes ou pool do psycopg 3) fica no
+# settings.py, lida das variáveis DB_POOL*, DB_CONN_MAX_AGE e DB_HEALTH_CHECKS.
+# Este módulo:
+#   - valida a configuração (system check, roda em todo manage.py);
+#   - testa a conexão e abre o pool (check com a tag 'database': manage.py
+#     migrate e manage.py check --database default);
+#   - abre o pool na inicialização do WSGI (verificar_banco_na_inicializacao);
+#   - expõe as métricas do pool (espera por conexão, uso, erros) para a API
+#     de status (fichatecnica_app.views.status_api).
+# As métricas são do processo que atende a requisição (cada processo tem seu pool).
+
+# Contadores do psycopg_pool repassados para a API de status (os ausentes valem 0)
+ESTATISTICAS_POOL = (
+    'pool_min', 'pool_max', 'pool_size', 'pool_available',
+    'requests_waiting', 'requests_num', 'requests_queued', 'requests_wait_ms',
+    'requests_errors', 'usage_ms', 'returns_bad',
+    'connections_num', 'connections_ms', 'connections_errors', 'connections_lost',
+)
+
+
+def _opcoes_pool(alias='default'):
+    opcoes = settings.DATABASES[alias].get('OPTIONS', {}).get('pool')
+    if opcoes is True:
+        return {}
+    return opcoes or None
+
+
+def verificar_configuracao_banco(app_configs=None, **kwargs):
+    """System check: o pool configurado tem as dependências e os parâmetros válidos."""
+    erros = []
+    for alias, banco in settings.DATABASES.items():
+        opcoes = _opcoes_pool(alias)
+        if opcoes is None:
+            continue
+
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            erros.append(checks.Error(
+                f"O pool de conexões do banco '{alias}' (DB_POOL=1) requer o psycopg 3 com o psycopg_pool.",
+                hint="Instale 'psycopg[binary,pool]' ou defina DB_POOL=0.",
+                id='agrodata.E001',
+            ))
+
+        if banco.get('CONN_MAX_AGE', 0) != 0:
+            erros.append(checks.Error(
+                f"O banco '{alias}' usa pool e CONN_MAX_AGE diferente de 0.",
+                hint="Com o pool, as conexões persistentes devem ficar desligadas (CONN_MAX_AGE = 0).",
+                id='agrodata.E002',
+            ))
+
+        minimo = opcoes.get('min_size', 4)
+        maximo = opcoes.get('max_size', minimo)
+        if minimo < 0 or maximo < max(minimo, 1):
+            erros.append(checks.Error(
+                f"Tamanho do pool do banco '{alias}' inválido (min={minimo}, max={maximo}).",
+                hint="Use 0 <= DB_POOL_MIN <= DB_POOL_MAX e DB_POOL_MAX >= 1.",
+                id='agrodata.E003',
+            ))
+    return erros
+
+
+def _abrir_conexao(alias):
+    """Abre o pool (esperando as conexões mínimas) e testa uma conexão com SELECT 1."""
+    conexao = connections[alias]
+    opcoes = _opcoes_pool(alias)
+    if opcoes is not None and conexao.vendor == 'postgresql':
+        conexao.pool.open()
+        conexao.pool.wait(timeout=opcoes.get('timeout', 30))
+    with conexao.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def verificar_conexao_banco(app_configs=None, databases=None, **kwargs):
+    """System check (tag 'database'): cada banco indicado aceita conexões."""
+    erros = []
+    for alias in databases or []:
+        try:
+            _abrir_conexao(alias)
+        except Exception as e:  # PoolTimeout não herda de DatabaseError
+            erros.append(checks.Error(
+                f"Não foi possível conectar ao banco '{alias}': {e}",
+                id='agrodata.E004',
+            ))
+    return erros
+
+
+def verificar_banco_na_inicializacao(alias='default'):
+    """
+    Chamado pelo WSGI ao subir o processo: abre o pool (se houver) e testa a conexão.
+    Falhas só são registradas; as requisições tentam conectar de novo depois.
+    """
+    try:
+        _abrir_conexao(alias)
+    except Exception as e:  # Erros do driver e PoolTimeout
+        sys.stderr.write(f"Banco '{alias}' indisponível na inicialização: {e}\n")
+    finally:
+        # Não deixa a conexão de teste presa à thread de inicialização (com pool, ela volta ao pool)
+        connections[alias].close()
+
+
+def estatisticas_conexoes(alias='default'):
+    """Modo de reuso das conexões e, com pool, os contadores do psycopg_pool deste processo."""
+    banco = settings.DATABASES[alias]
+    opcoes = _opcoes_pool(alias)
+    info = {
+        'modo': 'pool' if opcoes is not None else 'persistente',
+        'conn_max_age': banco.get('CONN_MAX_AGE', 0),
+        'health_checks': banco.get('CONN_HEALTH_CHECKS', False),
+    }
+    if opcoes is None:
+        return info
+
+    conexao = connections[alias]
+    pool = conexao.pool if conexao.vendor == 'postgresql' else None
+    if pool is None:
+        return info
+
+    estatisticas = pool.get_stats()
+    pool_info = {nome: estatisticas.get(nome, 0) for nome in ESTATISTICAS_POOL}
+    pedidos = pool_info['requests_num']
+    pool_info['espera_media_ms'] = round(pool_info['requests_wait_ms'] / pedidos, 2) if pedidos else 0
+    info['pool'] = pool_info
+    return info
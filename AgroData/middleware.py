@@ -0,0 +1,96 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+# ==============================================================================
+# COMPRESSÃO DAS RESPOSTAS (BROTLI / GZIP)
+# ==============================================================================
+# Comprime as respostas acima de COMPRESSAO_MIN_BYTES conforme o Accept-Encoding
+# do cliente: brotli ('br', se o pacote estiver instalado) tem preferência sobre
+# gzip. Respostas em streaming (ex: eventos SSE) não são tocadas.
+#
+# Mitigação do BREACH (como no GZipMiddleware do Django): o gzip sempre recebe
+# um preenchimento aleatório (GZIP_MAX_RANDOM_BYTES) e o brotli, que não tem
+# essa proteção, nunca é usado em text/html (páginas com token CSRF ao lado de
+# dados do usuário); o HTML vai em gzip.
+
+try:
+    import brotli
+except ImportError:  # Dependência opcional: sem ela, só gzip
+    brotli = None
+
+COMPRESSAO_MIN_BYTES_PADRAO = 1024
+BROTLI_QUALIDADE = 5  # Bom equilíbrio entre CPU e tamanho para respostas dinâmicas
+GZIP_MAX_RANDOM_BYTES = 100  # Mesmo valor do GZipMiddleware
+
+_ACEITA_BR = re.compile(r'\bbr\b')
+_ACEITA_GZIP = re.compile(r'\bgzip\b')
+
+
+def _codificacao_aceita(accept_encoding, content_type=''):
+    html = content_type.split(';', 1)[0].strip().lower() == 'text/html'
+    if brotli is not None and not html and _ACEITA_BR.search(accept_encoding):
+        return 'br'
+    if _ACEITA_GZIP.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+class CompressaoMiddleware(MiddlewareMixin):
+    """Compressão brotli/gzip negociada pelo Accept-Encoding (substitui o GZipMiddleware)."""
+
+    def process_response(self, request, response):
+        minimo = getattr(settings, 'COMPRESSAO_MIN_BYTES', COMPRESSAO_MIN_BYTES_PADRAO)
+
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < minimo:
+            return response
+
+        # O conteúdo varia com o Accept-Encoding (importante para caches/proxies)
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codificacao = _codificacao_aceita(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), response.get('Content-Type', '')
+        )
+        if codificacao is None:
+            return response
+
+        if codificacao == 'br':
+            comprimido = brotli.compress(response.content, quality=BROTLI_QUALIDADE)
+        else:
+            comprimido = compress_string(response.content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+        if len(comprimido) >= len(response.content):
+            return response
+
+        response.content = comprimido
+        response.headers['Content-Length'] = str(len(comprimido))
+        response.headers['Content-Encoding'] = codificacao
+
+        # Mesmo tratamento do GZipMiddleware: o corpo mudou, então o ETag forte vira fraco
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        return response
+
+
+# ==============================================================================
+# PERFIL DO USUÁRIO (request.perfil)
+# ==============================================================================
+# Depois do AuthenticationMiddleware: request.perfil é o Profile do usuário,
+# carregado só no primeiro acesso (ver agro_app/perfil.py).
+
+class PerfilMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Import local: os modelos só podem ser importados com os apps carregados
+        from agro_app.perfil import perfil_preguicoso
+        request.perfil = perfil_preguicoso(request)
+        return self.get_response(request)
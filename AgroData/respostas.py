@@ -0,0 +1,48 @@
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+# ==============================================================================
+# RESPOSTA JSON RÁPIDA
+# ==============================================================================
+# Usa o orjson (bem mais rápido que o json da biblioteca padrão) quando está
+# instalado, e cai para o DjangoJSONEncoder caso contrário. Nos dois casos
+# Decimal vira string e datas/horas viram ISO 8601, sem precisar percorrer o
+# dicionário antes (o antigo convert_decimal_and_clean).
+
+try:
+    import orjson
+except ImportError:  # Dependência opcional
+    orjson = None
+
+
+def _default_orjson(obj):
+    # O orjson já serializa datetime/date/time/UUID; Decimal fica como no DjangoJSONEncoder
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+
+
+def dumps_json(data):
+    """Serializa 'data' em JSON (bytes UTF-8, sem escapar acentos)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default_orjson, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Substituto do JsonResponse (mesma assinatura básica: data, safe, status...)
+    com o serializador rápido acima.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps_json(data), **kwargs)
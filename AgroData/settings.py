@@ -58,15 +58,22 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compressão brotli/gzip das respostas grandes (deve ficar antes dos que leem o corpo)
+    'AgroData.middleware.CompressaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.perfil: Profile do usuário carregado uma vez por requisição (agro_app/perfil.py)
+    'AgroData.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Tamanho mínimo (bytes) para comprimir uma resposta (AgroData.middleware)
+COMPRESSAO_MIN_BYTES = 1024
+
 ROOT_URLCONF = 'AgroData.urls'
 
 TEMPLATES = [
@@ -93,15 +100,89 @@ WSGI_APPLICATION = 'AgroData.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'agrodata_db',
-        'USER': 'agrodata_user',
-        'PASSWORD': 'Gsp@univesp2025',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'agrodata_db'),
+        'USER': os.environ.get('DB_USER', 'agrodata_user'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'Gsp@univesp2025'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
 
 
+# ------------------------------------------------------------------
+# REUSO DE CONEXÕES COM O POSTGRESQL (PERSISTENTES OU POOL)
+# ------------------------------------------------------------------
+# Sem pool (padrão): uma conexão por requisição (DB_CONN_MAX_AGE=0). Conexões
+# persistentes (DB_CONN_MAX_AGE > 0) só servem no WSGI: no ASGI (views async e
+# stream SSE do clima) cada thread do sync_to_async guarda a sua conexão, que o
+# close_old_connections nunca fecha, e elas se acumulam até o max_connections do
+# PostgreSQL. Para reaproveitar conexões, use o pool.
+#
+# DB_POOL=1: pool de conexões do psycopg 3 (requer 'psycopg[pool]'), por
+# processo, com DB_POOL_MIN/DB_POOL_MAX conexões e espera máxima de
+# DB_POOL_TIMEOUT segundos por uma conexão livre. Com o pool o CONN_MAX_AGE
+# precisa ser 0: a conexão volta para o pool no fim de cada requisição.
+#
+# DB_HEALTH_CHECKS=1 (padrão): testa a conexão reaproveitada antes de usá-la
+# (no pool, ao entregá-la), evitando erros depois de um restart do PostgreSQL.
+# A configuração é validada por AgroData/banco.py (manage.py check / migrate
+# e na inicialização do WSGI) e as métricas do pool saem em /ficha/api/status/.
+
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.environ.get('DB_HEALTH_CHECKS', '1') == '1'
+
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'name': 'agrodata',
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '0'))
+
+
+# ------------------------------------------------------------------
+# CACHE COMPARTILHADO ENTRE OS PROCESSOS (WSGI)
+# ------------------------------------------------------------------
+# Fichas técnicas, listas de localidades, clima e cache negativo das APIs externas
+# ficam no cache do Django. Com REDIS_URL definido (ex: redis://127.0.0.1:6379/1)
+# usa o Redis (requer o pacote 'redis'); senão usa arquivos em disco, que também
+# são compartilhados pelos processos do Apache na mesma máquina.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'TIMEOUT': 60 * 60,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'django_cache')),
+            'TIMEOUT': 60 * 60,
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000,
+            },
+        }
+    }
+
+
+# ------------------------------------------------------------------
+# ARMAZENAMENTO DOS DADOS DE PRODUÇÃO (CSVs DO IBGE)
+# ------------------------------------------------------------------
+# 'memoria' (padrão): os CSVs de agro_app/dados são carregados em DataFrames em
+# cada processo. 'postgresql': lidos da tabela ProducaoMunicipal, carregada com
+# 'manage.py importar_producao'. Ver fichatecnica_app/armazenamento.py.
+FICHA_ARMAZENAMENTO = os.environ.get('FICHA_ARMAZENAMENTO', 'memoria')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,60 @@
+import gzip
+import unittest
+
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import middleware
+from .middleware import CompressaoMiddleware
+
+CORPO_HTML = '<html><body>' + '<p>Terreno</p>' * 200 + '</body></html>'
+
+
+@override_settings(COMPRESSAO_MIN_BYTES=1024)
+class CompressaoMiddlewareTests(SimpleTestCase):
+    """Negociação brotli/gzip e mitigação do BREACH no CompressaoMiddleware."""
+
+    def comprimir(self, resposta, accept_encoding='gzip, deflate, br'):
+        requisicao = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressaoMiddleware(lambda r: resposta)(requisicao)
+
+    def test_html_vai_em_gzip_mesmo_aceitando_brotli(self):
+        resposta = self.comprimir(HttpResponse(CORPO_HTML))
+
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(resposta.content).decode(), CORPO_HTML)
+        self.assertEqual(resposta['Content-Length'], str(len(resposta.content)))
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+
+    def test_gzip_com_preenchimento_aleatorio(self):
+        tamanhos = {len(self.comprimir(HttpResponse(CORPO_HTML)).content) for _ in range(20)}
+        self.assertGreater(len(tamanhos), 1)
+
+    @unittest.skipIf(middleware.brotli is None, "Pacote brotli não instalado.")
+    def test_json_vai_em_brotli(self):
+        dados = {'terrenos': [{'nome': f'Terreno {i}'} for i in range(200)]}
+        resposta = self.comprimir(JsonResponse(dados))
+
+        self.assertEqual(resposta['Content-Encoding'], 'br')
+        self.assertIn(b'Terreno 199', middleware.brotli.decompress(resposta.content))
+
+    def test_sem_accept_encoding_nao_comprime(self):
+        resposta = self.comprimir(HttpResponse(CORPO_HTML), accept_encoding='')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+
+    def test_resposta_pequena_nao_e_tocada(self):
+        resposta = self.comprimir(HttpResponse('<p>ok</p>'))
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertFalse(resposta.has_header('Vary'))
+        self.assertEqual(resposta.content, b'<p>ok</p>')
+
+    def test_etag_forte_vira_fraco(self):
+        original = HttpResponse(CORPO_HTML)
+        original['ETag'] = '"abc"'
+        self.assertEqual(self.comprimir(original)['ETag'], 'W/"abc"')
+
+    def test_streaming_nao_e_tocado(self):
+        resposta = self.comprimir(StreamingHttpResponse(iter([CORPO_HTML.encode()])))
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(resposta.streaming_content), CORPO_HTML.encode())
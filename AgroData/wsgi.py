@@ -17,4 +17,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AgroData.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Abre o pool de conexões (DB_POOL=1) e testa o banco ao subir o processo
+from AgroData.banco import verificar_banco_na_inicializacao  # noqa: E402
+verificar_banco_na_inicializacao()
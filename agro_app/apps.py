@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate
+
+
+def atualizar_rotulos_apos_migrate(sender, apps, verbosity=1, **kwargs):
+    """Atualiza os rótulos de localização desatualizados depois de cada migrate."""
+    # Só quando o estado das migrações já tem os campos (ex: não ao voltar para antes da 0004)
+    try:
+        campos = [campo.name for campo in apps.get_model('agro_app', 'Terreno')._meta.get_fields()]
+    except LookupError:
+        return
+    if 'localidades_versao' not in campos:
+        return
+
+    from .models import Profile, Terreno
+
+    for modelo in (Profile, Terreno):
+        total = modelo.atualizar_rotulos_desatualizados()
+        if total and verbosity >= 1:
+            print(f"  Rótulos de localização atualizados: {total} em {modelo._meta.verbose_name_plural}.")
 
 
 class AgroAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agro_app'
+
+    def ready(self):
+        post_migrate.connect(atualizar_rotulos_apos_migrate, sender=self)
+
+        # Verificações das conexões com o banco (persistentes/pool), ver AgroData/banco.py
+        from AgroData import banco
+        checks.register(banco.verificar_configuracao_banco)
+        checks.register(banco.verificar_conexao_banco, checks.Tags.database)
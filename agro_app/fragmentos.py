@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from fichatecnica_app import data_service
+
+# ==============================================================================
+# CACHE DE FRAGMENTOS DO DASHBOARD ({% cache %} nos templates do dashboard)
+# ==============================================================================
+# Os blocos que não dependem do usuário, só da cidade do perfil (e da versão dos
+# dados de agro_app/dados), são renderizados uma vez e reaproveitados por todos
+# os usuários da mesma cidade:
+#   - dash_bloco2 (clima, dashboard_bloco2.html): cidade; vida curta, igual à do
+#     cache do último clima
+#   - dash_bloco4 (ranqueamento, dashboard_bloco4.html): cidade + versão dos dados
+#   - dash_bloco6 (cotações CEPEA, dashboard.html): versão dos dados
+# As chaves abaixo precisam bater com os argumentos dessas tags.
+
+FRAGMENTO_CLIMA_TTL_S = data_service.CLIMA_ULTIMO_CACHE_TTL_S
+FRAGMENTO_DADOS_TTL_S = data_service.FICHA_CACHE_TTL_S
+
+
+def contexto_fragmentos():
+    """Valores usados nas tags {% cache %} do dashboard (tempos de vida e versão dos dados)."""
+    return {
+        'ttl_clima': FRAGMENTO_CLIMA_TTL_S,
+        'ttl_dados': FRAGMENTO_DADOS_TTL_S,
+        'versao': data_service.dataset_version(),
+    }
+
+
+def chaves_fragmentos_cidade(city_id):
+    """Chaves de cache dos fragmentos do dashboard que dependem da cidade."""
+    versao = data_service.dataset_version()
+    return [
+        make_template_fragment_key('dash_bloco2', [city_id]),
+        make_template_fragment_key('dash_bloco4', [city_id, versao]),
+    ]
+
+
+def invalidar_fragmentos_cidade(*city_ids):
+    """Descarta os fragmentos (e o último clima em cache) das cidades informadas."""
+    chaves = []
+    for city_id in set(city_ids):
+        chaves.extend(chaves_fragmentos_cidade(city_id))
+    cache.delete_many(chaves)
+    data_service.invalidar_clima_ultimo([city_id for city_id in city_ids if city_id])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from agro_app.models import Profile, Terreno
+from fichatecnica_app import localidades
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche/recalcula os rótulos de localização (cidade_nome, estado_sigla) de "
+        "Perfis e Terrenos gravados com outra versão das tabelas de localidades. "
+        "Rodado automaticamente após o migrate; use após atualizar agro_app/dados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Linhas por bulk_update (padrão: 1000).')
+
+    def handle(self, *args, **options):
+        versao = localidades.dataset_version()
+        for modelo in (Profile, Terreno):
+            total = modelo.atualizar_rotulos_desatualizados(lote=max(1, options['lote']))
+            self.stdout.write(self.style.SUCCESS(
+                f"{modelo._meta.verbose_name_plural}: {total} rótulo(s) atualizado(s) (versão {versao})."
+            ))
@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from agro_app.models import Clima, Profile, Terreno
+from fichatecnica_app import data_service
+
+
+class LimitadorDeTaxa:
+    """Libera no máximo 'por_minuto' chamadas por minuto, compartilhado entre as threads."""
+
+    def __init__(self, por_minuto):
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0
+        self._lock = threading.Lock()
+        self._proxima = time.monotonic()
+
+    def aguardar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+class Command(BaseCommand):
+    help = (
+        "Coleta o clima atual de todos os municípios usados em Terrenos e Perfis "
+        "e grava no modelo Clima (bulk insert). Agende via cron, ex: "
+        "'*/30 * * * * python manage.py coletar_clima', ou rode como worker "
+        "local com --intervalo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Número de consultas simultâneas ao OpenWeather (padrão: 4).')
+        parser.add_argument('--por-minuto', type=int, default=50,
+                            help='Limite de chamadas por minuto ao OpenWeather (padrão: 50; plano free = 60).')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Se informado, repete a coleta a cada N minutos (modo worker).')
+
+    def handle(self, *args, **options):
+        while True:
+            self.coletar(options['workers'], options['por_minuto'])
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'] * 60)
+
+    def coletar(self, workers, por_minuto):
+        cidades = self.cidades_cadastradas()
+        if not cidades:
+            self.stdout.write("Nenhum município cadastrado em Terrenos ou Perfis.")
+            return
+
+        limitador = LimitadorDeTaxa(por_minuto)
+
+        def buscar(cidade_id):
+            # Consulta por coordenadas (tabela local), sem passar pelo IBGE; sempre
+            # no OpenWeather, nunca o clima da janela de cache de 10 minutos
+            limitador.aguardar()
+            return cidade_id, data_service.get_weather_by_id(cidade_id, usar_cache=False)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            resultados = list(executor.map(buscar, cidades))
+
+        # O OpenWeather atualiza a medição em intervalos próprios (o mesmo 'dt' pode
+        # voltar em duas coletas): como em atualizar_clima_cidade_async, só grava
+        # medições mais novas que o último registro do município
+        ultimos = dict(
+            Clima.objects.filter(cidade_ibge__in=cidades)
+            .values('cidade_ibge').annotate(ultimo=Max('data_hora')).values_list('cidade_ibge', 'ultimo')
+        )
+        registros = [
+            data_service.registro_clima(cidade_id, valores)
+            for cidade_id, valores in resultados
+            if valores and (ultimos.get(str(cidade_id)) is None or valores['data_hora'] > ultimos[str(cidade_id)])
+        ]
+
+        Clima.objects.bulk_create(registros)
+        # As fichas e o dashboard leem o último clima de um cache curto: descarta-o
+        data_service.invalidar_clima_ultimo([registro.cidade_ibge for registro in registros])
+
+        coletados = sum(1 for _, valores in resultados if valores)
+        self.stdout.write(self.style.SUCCESS(
+            f"Clima coletado: {coletados} de {len(cidades)} município(s); {len(registros)} medição(ões) nova(s)."
+        ))
+
+    @staticmethod
+    def cidades_cadastradas():
+        """IDs IBGE distintos (não vazios) usados em Terrenos e Perfis."""
+        terrenos = Terreno.objects.exclude(cidade__isnull=True).exclude(cidade='').values_list('cidade', flat=True)
+        perfis = Profile.objects.exclude(cidade__isnull=True).exclude(cidade='').values_list('cidade', flat=True)
+        return sorted(set(terrenos.distinct()) | set(perfis.distinct()))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from agro_app.models import ResumoDashboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o resumo do dashboard (terrenos, área em hectares, planos em "
+        "andamento e etapas pendentes) de todos os usuários. Os sinais mantêm o "
+        "resumo em dia; use depois de cargas em massa ou alterações feitas direto no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Usuários por consulta/bulk_create (padrão: 500).')
+
+    def handle(self, *args, **options):
+        total = ResumoDashboard.reconstruir(lote=max(1, options['lote']))
+        self.stdout.write(self.style.SUCCESS(f"Resumo do dashboard recalculado para {total} usuário(s)."))
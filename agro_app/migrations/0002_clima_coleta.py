@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clima',
+            name='condicao',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Condição do Tempo'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='pressao',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Pressão (hPa)'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='sensacao_termica',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Sensação Térmica (°C)'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='temp_max',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Máxima (°C)'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='temp_min',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Mínima (°C)'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='umidade',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Umidade (%)'),
+        ),
+        migrations.AddField(
+            model_name='clima',
+            name='vento',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Vento (m/s)'),
+        ),
+        migrations.AddIndex(
+            model_name='clima',
+            index=models.Index(fields=['cidade_ibge', '-data_hora'], name='clima_cidade_data_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0002_clima_coleta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='etapaplantio',
+            index=models.Index(fields=['plano', 'data_prevista'], name='etapa_plano_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planoplantio',
+            index=models.Index(condition=models.Q(('produto__isnull', False), models.Q(('status', 'RASCUNHO'), _negated=True)), fields=['proprietario', '-data_inicio', '-id'], name='plano_prop_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='terreno',
+            index=models.Index(fields=['proprietario', 'nome', 'id'], name='terreno_prop_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0003_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='cidade_nome',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Município'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='estado_sigla',
+            field=models.CharField(blank=True, default='', editable=False, max_length=2, verbose_name='UF'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='localidades_versao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='terreno',
+            name='cidade_nome',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Município'),
+        ),
+        migrations.AddField(
+            model_name='terreno',
+            name='estado_sigla',
+            field=models.CharField(blank=True, default='', editable=False, max_length=2, verbose_name='UF'),
+        ),
+        migrations.AddField(
+            model_name='terreno',
+            name='localidades_versao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+    ]
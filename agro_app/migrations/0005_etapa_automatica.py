@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0004_rotulos_localizacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etapaplantio',
+            name='automatica',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
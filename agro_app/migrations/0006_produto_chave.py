@@ -0,0 +1,46 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _chave(nome):
+    # Mesmas regras de fichatecnica_app.data_service.normalize_text (copiadas: a
+    # migração não deve depender do código atual do app)
+    nome = (nome or '').strip()
+    texto = re.sub(r'\s*\([^)]*\)', '', nome)
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('utf-8')
+    return texto.upper().strip() or nome.upper()
+
+
+def preencher_chaves(apps, schema_editor):
+    """Preenche a chave dos produtos; produtos com a mesma chave viram um só (o de menor id)."""
+    Produto = apps.get_model('agro_app', 'Produto')
+    PlanoPlantio = apps.get_model('agro_app', 'PlanoPlantio')
+
+    mantidos = {}
+    for produto in Produto.objects.order_by('id'):
+        chave = _chave(produto.nome)
+        if chave in mantidos:
+            PlanoPlantio.objects.filter(produto=produto).update(produto=mantidos[chave])
+            produto.delete()
+        else:
+            mantidos[chave] = produto
+            produto.chave = chave
+            produto.save(update_fields=['chave'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0005_etapa_automatica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='chave',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(preencher_chaves, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separada da 0006: no PostgreSQL o ALTER TABLE não pode rodar na mesma
+    # transação das atualizações de PlanoPlantio (checagens de FK pendentes)
+
+    dependencies = [
+        ('agro_app', '0006_produto_chave'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produto',
+            name='chave',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_app', '0007_produto_chave_unica'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDashboard',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumo_dashboard', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('terrenos', models.PositiveIntegerField(default=0, verbose_name='Terrenos')),
+                ('area_total_ha', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Área Total (ha)')),
+                ('planos_ativos', models.PositiveIntegerField(default=0, verbose_name='Planos em Andamento')),
+                ('etapas_pendentes', models.PositiveIntegerField(default=0, verbose_name='Etapas Pendentes')),
+                ('proxima_etapa_nome', models.CharField(blank=True, default='', max_length=100, verbose_name='Próxima Etapa')),
+                ('proxima_etapa_data', models.DateField(blank=True, null=True, verbose_name='Data da Próxima Etapa')),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                'verbose_name': 'Resumo do Dashboard',
+                'verbose_name_plural': 'Resumos do Dashboard',
+            },
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from fichatecnica_app import localidades
+
 # Obtém o modelo de usuário ativo (padrão do Django ou customizado)
 User = get_user_model()
 
@@ -26,9 +33,82 @@ ETAPA_CHOICES = [
 ]
 
 
+# --- RÓTULOS DE LOCALIZAÇÃO (DESNORMALIZADOS) ---
+# Perfil e Terreno guardam só os códigos IBGE (cidade/estado). O nome da cidade e
+# a sigla da UF ficam gravados ao lado, preenchidos no save() pela tabela local
+# (fichatecnica_app/localidades.py): as listagens não traduzem nada. O campo
+# 'localidades_versao' guarda a versão das tabelas usada; quando ela muda, os
+# rótulos são recalculados na leitura (rotulos_localizacao), no próximo save e
+# em lote pelo comando 'atualizar_rotulos_localizacao' (também rodado após o migrate).
+class LocalizacaoRotulada(models.Model):
+    cidade_nome = models.CharField(max_length=100, blank=True, default='', editable=False, verbose_name="Município")
+    estado_sigla = models.CharField(max_length=2, blank=True, default='', editable=False, verbose_name="UF")
+    localidades_versao = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    CAMPOS_ROTULOS = ('cidade_nome', 'estado_sigla', 'localidades_versao')
+
+    class Meta:
+        abstract = True
+
+    def atualizar_rotulos_localizacao(self):
+        """Recalcula os rótulos a partir de cidade/estado (sem gravar). Retorna True se algo mudou."""
+        novos = (
+            localidades.nome_municipio(self.cidade) or '',
+            localidades.sigla_estado(self.estado) or '',
+            localidades.dataset_version(),
+        )
+        if novos == tuple(getattr(self, campo) for campo in self.CAMPOS_ROTULOS):
+            return False
+        for campo, valor in zip(self.CAMPOS_ROTULOS, novos):
+            setattr(self, campo, valor)
+        return True
+
+    def rotulos_localizacao(self):
+        """(nome da cidade, sigla da UF), ou None para o que faltar. Sem consultas."""
+        if self.localidades_versao != localidades.dataset_version():
+            self.atualizar_rotulos_localizacao()
+        return self.cidade_nome or None, self.estado_sigla or None
+
+    @property
+    def localizacao_display(self):
+        cidade_nome, estado_sigla = self.rotulos_localizacao()
+        return f"{cidade_nome or 'N/A'} / {estado_sigla or 'N/A'}"
+
+    def save(self, *args, **kwargs):
+        self.atualizar_rotulos_localizacao()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.CAMPOS_ROTULOS)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def atualizar_rotulos_desatualizados(cls, lote=1000):
+        """
+        Recalcula (bulk_update em lotes) os rótulos das linhas gravadas com outra
+        versão das tabelas de localidades. Retorna o número de linhas atualizadas.
+        """
+        pendentes = cls._base_manager.exclude(
+            localidades_versao=localidades.dataset_version()
+        ).only('pk', 'cidade', 'estado', *cls.CAMPOS_ROTULOS)
+
+        total = 0
+        buffer = []
+        for instancia in pendentes.iterator(chunk_size=lote):
+            instancia.atualizar_rotulos_localizacao()
+            buffer.append(instancia)
+            if len(buffer) >= lote:
+                cls._base_manager.bulk_update(buffer, cls.CAMPOS_ROTULOS)
+                total += len(buffer)
+                buffer = []
+        if buffer:
+            cls._base_manager.bulk_update(buffer, cls.CAMPOS_ROTULOS)
+            total += len(buffer)
+        return total
+
+
 # --- MODELO PERFIL (PROFILE) ---
 # Armazena informações adicionais do usuário e o sistema de localização padrão.
-class Profile(models.Model):
+class Profile(LocalizacaoRotulada):
     """
     Modelo de perfil do usuário (AgroData).
     Relacionado 1:1 com o modelo User.
@@ -89,9 +169,39 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     # ou a execução desnecessária que causava o timeout.
 
 
+# Sinais para invalidar o cache de fragmentos do dashboard quando a localização do perfil muda
+@receiver(pre_save, sender=Profile)
+def guardar_localizacao_anterior(sender, instance, **kwargs):
+    # Guarda a cidade/estado gravados antes deste save (None para perfis novos)
+    anterior = None
+    if instance.pk:
+        anterior = sender.objects.filter(pk=instance.pk).values_list('cidade', 'estado').first()
+    instance._localizacao_anterior = anterior
+
+
+@receiver(post_save, sender=Profile)
+def invalidar_fragmentos_dashboard(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_localizacao_anterior', None)
+    if anterior is None or anterior == (instance.cidade, instance.estado):
+        return
+
+    # Import local: agro_app.fragmentos depende do data_service
+    from .fragmentos import invalidar_fragmentos_cidade
+    invalidar_fragmentos_cidade(anterior[0], instance.cidade)
+
+
+# Sinais para descartar o perfil guardado no cache por usuário (agro_app/perfil.py)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidar_perfil_cache(sender, instance, **kwargs):
+    # Import local: agro_app.perfil importa os modelos deste módulo
+    from .perfil import invalidar_perfil
+    invalidar_perfil(instance.user_id)
+
+
     # --- MODELO TERRENO (LAND/PLOT) ---
 # Registra as áreas de plantio e armazena sua localização específica.
-class Terreno(models.Model):
+class Terreno(LocalizacaoRotulada):
     """
     Modelo para registro de Terrenos/Áreas de Plantio.
     Relacionado com o User que possui o Terreno.
@@ -137,6 +247,10 @@ class Terreno(models.Model):
     class Meta:
         verbose_name = "Terreno"
         verbose_name_plural = "Terrenos"
+        indexes = [
+            # Terrenos do usuário em ordem de nome (api_terrenos, paginação por cursor em nome/id)
+            models.Index(fields=['proprietario', 'nome', 'id'], name='terreno_prop_nome_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.area_total} {self.unidade_area})"
@@ -147,6 +261,11 @@ class Terreno(models.Model):
 class Produto(models.Model):
     nome = models.CharField(max_length=100, unique=True, verbose_name="Produto")
 
+    # Chave canônica do produto (mesmas regras de data_service.normalize_text: sem
+    # acentos, sem o texto entre parênteses, maiúscula). Única: 'milho', 'Milho' e
+    # 'Milho (em grão)' são o mesmo produto do catálogo.
+    chave = models.CharField(max_length=100, unique=True, editable=False)
+
     class Meta:
         verbose_name = "Produto Agrícola"
         verbose_name_plural = "Produtos Agrícolas"
@@ -154,6 +273,32 @@ class Produto(models.Model):
     def __str__(self):
         return self.nome
 
+    @staticmethod
+    def chave_de(nome):
+        """Chave canônica de um nome de produto (ex: 'Milho (em grão)' -> 'MILHO')."""
+        # Import local: o data_service carrega o pandas e os dados de produção
+        from fichatecnica_app.data_service import normalize_text
+        nome = (nome or '').strip()
+        return normalize_text(nome) or nome.upper()
+
+    @classmethod
+    def obter_ou_criar(cls, nome):
+        """
+        Produto do catálogo pela chave canônica, criado se não existir: uma consulta
+        pelo índice único e, na criação, sem duplicatas mesmo com requisições
+        simultâneas (o get_or_create volta a buscar se o INSERT violar a chave).
+        Retorna (produto, criado).
+        """
+        nome = (nome or '').strip()
+        return cls.objects.get_or_create(chave=cls.chave_de(nome), defaults={'nome': nome})
+
+    def save(self, *args, **kwargs):
+        self.chave = self.chave_de(self.nome)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nome' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'chave'}
+        super().save(*args, **kwargs)
+
 
 # --- MODELO CLIMA (PLACEHOLDER) ---
 # Armazena dados climáticos obtidos via API para uma localização específica.
@@ -175,9 +320,22 @@ class Clima(models.Model):
     temperatura = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Temperatura (°C)")
     precipitacao = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Precipitação (mm)")
 
+    # NOVO: Campos detalhados gravados pela coleta em segundo plano (comando 'coletar_clima')
+    sensacao_termica = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Sensação Térmica (°C)")
+    temp_min = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Mínima (°C)")
+    temp_max = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Máxima (°C)")
+    umidade = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Umidade (%)")
+    pressao = models.PositiveIntegerField(null=True, blank=True, verbose_name="Pressão (hPa)")
+    vento = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="Vento (m/s)")
+    condicao = models.CharField(max_length=100, blank=True, default='', verbose_name="Condição do Tempo")
+
     class Meta:
         verbose_name = "Dado Climático"
         verbose_name_plural = "Dados Climáticos"
+        indexes = [
+            # Busca do registro mais recente por município (Dashboard / Ficha)
+            models.Index(fields=['cidade_ibge', '-data_hora'], name='clima_cidade_data_idx'),
+        ]
 
     def __str__(self):
         return f'Clima em {self.cidade_ibge} em {self.data_hora.strftime("%Y-%m-%d %H:%M")}'
@@ -230,6 +388,15 @@ class PlanoPlantio(models.Model):
         verbose_name = "Plano de Plantio"
         verbose_name_plural = "Planos de Plantio"
         ordering = ['data_inicio']
+        indexes = [
+            # Planos recentes do usuário (api_lista_planos, cursor em data_inicio/id decrescentes).
+            # Índice parcial: os RASCUNHOs (e planos sem produto) nunca são listados e ficam de fora.
+            models.Index(
+                fields=['proprietario', '-data_inicio', '-id'],
+                name='plano_prop_ativos_idx',
+                condition=models.Q(produto__isnull=False) & ~models.Q(status='RASCUNHO'),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.nome} - {self.terreno.nome} ({self.status})'
@@ -258,10 +425,249 @@ class EtapaPlantio(models.Model):
 
     concluida = models.BooleanField(default=False)
 
+    # Etapa criada pelo gerador de cronograma (planodeplantio_app/cronograma.py); só estas
+    # são atualizadas/removidas quando o cronograma é gerado de novo
+    automatica = models.BooleanField(default=False, editable=False)
+
     class Meta:
         verbose_name = "Etapa de Plantio"
         verbose_name_plural = "Etapas de Plantio"
         ordering = ['data_prevista']
+        indexes = [
+            # Etapas de um plano em ordem cronológica (cronograma do plano)
+            models.Index(fields=['plano', 'data_prevista'], name='etapa_plano_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"[{self.tipo}] {self.nome} - {self.plano.nome}"
+
+
+# --- RESUMO DO DASHBOARD (MATERIALIZADO POR USUÁRIO) ---
+# Uma linha por usuário com os números do dashboard: terrenos, área total em
+# hectares, planos em andamento e etapas pendentes desses planos (com a próxima
+# delas). O dashboard lê só esta linha; ela é recalculada (uma consulta com
+# subconsultas agregadas + um UPDATE) depois do commit de cada save/delete de
+# Terreno, PlanoPlantio e EtapaPlantio (sinais abaixo) e pelo gerador de
+# cronograma, que grava as etapas com bulk_create/bulk_update. Reconstrução
+# completa: 'manage.py reconstruir_resumo_dashboard'.
+
+# Fatores de conversão para hectares (unidades de terreno_app.forms.AREA_UNIT_CHOICES;
+# alqueire paulista). Terrenos com outra unidade não entram na área total.
+FATORES_HECTARE = {
+    'HA': Decimal('1'),
+    'M2': Decimal('0.0001'),
+    'ALQ': Decimal('2.42'),
+}
+STATUS_PLANO_ATIVO = 'ANDAMENTO'
+
+
+class ResumoDashboard(models.Model):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='resumo_dashboard')
+
+    terrenos = models.PositiveIntegerField(default=0, verbose_name="Terrenos")
+    area_total_ha = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Área Total (ha)")
+    planos_ativos = models.PositiveIntegerField(default=0, verbose_name="Planos em Andamento")
+    etapas_pendentes = models.PositiveIntegerField(default=0, verbose_name="Etapas Pendentes")
+    proxima_etapa_nome = models.CharField(max_length=100, blank=True, default='', verbose_name="Próxima Etapa")
+    proxima_etapa_data = models.DateField(null=True, blank=True, verbose_name="Data da Próxima Etapa")
+
+    atualizado_em = models.DateTimeField(default=timezone.now, editable=False)
+
+    CAMPOS_RESUMO = (
+        'terrenos', 'area_total_ha', 'planos_ativos', 'etapas_pendentes',
+        'proxima_etapa_nome', 'proxima_etapa_data', 'atualizado_em',
+    )
+
+    class Meta:
+        verbose_name = "Resumo do Dashboard"
+        verbose_name_plural = "Resumos do Dashboard"
 
     def __str__(self):
-        return f"[{self.tipo}] {self.nome} - {self.plano.nome}"
\ No newline at end of file
+        return f"Resumo de {self.usuario_id}: {self.terrenos} terreno(s), {self.planos_ativos} plano(s)"
+
+    @classmethod
+    def calcular(cls, user_ids):
+        """Valores do resumo de cada usuário, numa única consulta: {user_id: {campo: valor}}."""
+        terrenos = Terreno.objects.filter(proprietario=OuterRef('pk')).order_by().values('proprietario')
+        planos = PlanoPlantio.objects.filter(
+            proprietario=OuterRef('pk'), status=STATUS_PLANO_ATIVO
+        ).order_by().values('proprietario')
+        pendentes = EtapaPlantio.objects.filter(
+            plano__proprietario=OuterRef('pk'), plano__status=STATUS_PLANO_ATIVO, concluida=False
+        )
+        proxima = pendentes.order_by('data_prevista', 'id')
+
+        decimal = DecimalField(max_digits=20, decimal_places=6)
+        area_ha = Sum(Case(
+            *[When(unidade_area__iexact=unidade, then=F('area_total') * Value(fator, output_field=decimal))
+              for unidade, fator in FATORES_HECTARE.items()],
+            default=Value(Decimal('0'), output_field=decimal),
+            output_field=decimal,
+        ))
+
+        linhas = User.objects.filter(pk__in=user_ids).annotate(
+            resumo_terrenos=Coalesce(Subquery(terrenos.annotate(n=Count('pk')).values('n')), 0),
+            resumo_area=Coalesce(
+                Subquery(terrenos.annotate(a=area_ha).values('a'), output_field=decimal),
+                Value(Decimal('0'), output_field=decimal),
+            ),
+            resumo_planos=Coalesce(Subquery(planos.annotate(n=Count('pk')).values('n')), 0),
+            resumo_etapas=Coalesce(Subquery(
+                pendentes.order_by().values('plano__proprietario').annotate(n=Count('pk')).values('n')
+            ), 0),
+            resumo_proxima_nome=Subquery(proxima.values('nome')[:1]),
+            resumo_proxima_data=Subquery(proxima.values('data_prevista')[:1]),
+        ).values_list(
+            'pk', 'resumo_terrenos', 'resumo_area', 'resumo_planos', 'resumo_etapas',
+            'resumo_proxima_nome', 'resumo_proxima_data',
+        )
+
+        agora = timezone.now()
+        return {
+            user_id: {
+                'terrenos': terrenos_,
+                'area_total_ha': Decimal(area).quantize(Decimal('0.0001')),
+                'planos_ativos': planos_,
+                'etapas_pendentes': etapas,
+                'proxima_etapa_nome': proxima_nome or '',
+                'proxima_etapa_data': proxima_data,
+                'atualizado_em': agora,
+            }
+            for user_id, terrenos_, area, planos_, etapas, proxima_nome, proxima_data in linhas
+        }
+
+    @classmethod
+    def recalcular(cls, user_id, criar=False):
+        """
+        Recalcula a linha do usuário. Sem 'criar', só atualiza uma linha existente
+        (os sinais nunca recriam o resumo de um usuário sendo apagado); com 'criar',
+        grava e devolve a linha. Retorna None se o usuário não existir.
+        """
+        valores = cls.calcular([user_id]).get(user_id) if user_id else None
+        if valores is None:
+            return None
+        if criar:
+            resumo, _ = cls.objects.update_or_create(usuario_id=user_id, defaults=valores)
+            return resumo
+        cls.objects.filter(usuario_id=user_id).update(**valores)
+        return None
+
+    @classmethod
+    def do_usuario(cls, user):
+        """Resumo do usuário (uma consulta); calculado e gravado se ainda não existir."""
+        return cls.objects.filter(usuario_id=user.pk).first() or cls.recalcular(user.pk, criar=True)
+
+    @classmethod
+    def reconstruir(cls, lote=500):
+        """Recalcula (bulk_create com upsert, em lotes) o resumo de todos os usuários. Retorna o total."""
+        ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        total = 0
+        for inicio in range(0, ids.count(), lote):
+            valores = cls.calcular(list(ids[inicio:inicio + lote]))
+            cls.objects.bulk_create(
+                [cls(usuario_id=user_id, **campos) for user_id, campos in valores.items()],
+                update_conflicts=True,
+                unique_fields=['usuario'],
+                update_fields=cls.CAMPOS_RESUMO,
+            )
+            total += len(valores)
+        return total
+
+
+class _ResumosPendentes:
+    """
+    Callback de on_commit com os usuários (e os planos, quando o dono ainda não
+    é conhecido) alterados na transação: recalcula o resumo de cada usuário uma
+    vez só, por mais que sejam os terrenos/planos/etapas salvos ou apagados.
+    """
+
+    def __init__(self):
+        self.user_ids = set()
+        self.plano_ids = set()
+        self.executado = False
+
+    def __call__(self):
+        # Import local: planodeplantio_app.resumo importa os modelos deste módulo
+        from planodeplantio_app.resumo import invalidar_resumo_usuario
+
+        self.executado = True
+
+        user_ids = set(self.user_ids)
+        if self.plano_ids:
+            # Uma consulta para todos os planos; os apagados (cascata) já foram
+            # agendados pelo sinal do próprio plano
+            user_ids.update(
+                PlanoPlantio.objects.filter(pk__in=self.plano_ids).values_list('proprietario_id', flat=True)
+            )
+        for user_id in sorted(user_ids):
+            invalidar_resumo_usuario(user_id)
+            ResumoDashboard.recalcular(user_id)
+
+
+def agendar_resumo_dashboard(user_id=None, plano_id=None):
+    """
+    Depois do commit da transação atual, descarta o resumo de planos em cache e
+    recalcula o resumo do dashboard do usuário (ou do dono do plano). Vários
+    pedidos na mesma transação viram um único recálculo por usuário.
+    """
+    if not user_id and not plano_id:
+        return
+
+    conexao = transaction.get_connection()
+    pendentes = None
+    if conexao.in_atomic_block:
+        # Reaproveita o callback ainda pendente nesta transação. Se o savepoint
+        # em que ele foi registrado for desfeito, o Django o retira da lista e um
+        # novo é criado no próximo pedido.
+        pendentes = next(
+            (func for _, func, _ in reversed(conexao.run_on_commit)
+             if isinstance(func, _ResumosPendentes) and not func.executado),
+            None,
+        )
+    if pendentes is None:
+        pendentes = _ResumosPendentes()
+        novo = True
+    else:
+        novo = False
+
+    if user_id:
+        pendentes.user_ids.add(user_id)
+    if plano_id:
+        pendentes.plano_ids.add(plano_id)
+    if novo:
+        transaction.on_commit(pendentes)  # Fora de transação roda na hora
+
+
+# Sinais para invalidar o resumo de custo/progresso dos planos do usuário
+# (planodeplantio_app/resumo.py) quando terrenos ou planos mudam; o das etapas
+# fica a cargo de agendar_resumo_dashboard (ver atualizar_resumos_etapa)
+@receiver(post_save, sender=Terreno)
+@receiver(post_delete, sender=Terreno)
+@receiver(post_save, sender=PlanoPlantio)
+@receiver(post_delete, sender=PlanoPlantio)
+def invalidar_resumo_planos(sender, instance, **kwargs):
+    # Import local: planodeplantio_app.resumo importa os modelos deste módulo
+    from planodeplantio_app.resumo import invalidar_resumo_usuario
+    invalidar_resumo_usuario(instance.proprietario_id)
+
+
+# Sinais para manter o resumo do dashboard (ResumoDashboard) em dia
+@receiver(post_save, sender=Terreno)
+@receiver(post_delete, sender=Terreno)
+@receiver(post_save, sender=PlanoPlantio)
+@receiver(post_delete, sender=PlanoPlantio)
+def atualizar_resumo_dashboard(sender, instance, **kwargs):
+    agendar_resumo_dashboard(instance.proprietario_id)
+
+
+@receiver(post_save, sender=EtapaPlantio)
+@receiver(post_delete, sender=EtapaPlantio)
+def atualizar_resumos_etapa(sender, instance, **kwargs):
+    # Sem consulta por etapa: o dono vem do plano já carregado ou é buscado
+    # uma vez, no commit, para todos os planos da transação
+    if EtapaPlantio.plano.is_cached(instance):
+        from planodeplantio_app.resumo import invalidar_resumo_usuario
+        invalidar_resumo_usuario(instance.plano.proprietario_id)
+        agendar_resumo_dashboard(instance.plano.proprietario_id)
+    else:
+        agendar_resumo_dashboard(plano_id=instance.plano_id)
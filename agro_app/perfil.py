@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import Profile
+
+# ==============================================================================
+# PERFIL DO USUÁRIO POR REQUISIÇÃO (request.perfil)
+# ==============================================================================
+# O PerfilMiddleware (AgroData/middleware.py) coloca em request.perfil um objeto
+# preguiçoso: o Profile só é buscado se a view/template usar, e no máximo uma vez
+# por requisição. A busca passa por um cache curto por usuário (select_related
+# no 'user' quando vem do banco), descartado pelos sinais de Profile
+# (agro_app/models.py) a cada save/delete. Usuário anônimo: None.
+
+PERFIL_CACHE_TTL_S = 5 * 60
+
+
+def _chave_perfil(user_id):
+    return f'perfil:{user_id}'
+
+
+def invalidar_perfil(user_id):
+    """Descarta o perfil do usuário guardado no cache."""
+    if user_id:
+        cache.delete(_chave_perfil(user_id))
+
+
+def perfil_do_usuario(user):
+    """Profile do usuário (cache curto; criado se ainda não existir), ou None para anônimos."""
+    if not user.is_authenticated:
+        return None
+
+    chave = _chave_perfil(user.pk)
+    perfil = cache.get(chave)
+    if perfil is None:
+        perfil = Profile.objects.select_related('user').filter(user=user).first()
+        if perfil is None:
+            perfil, _ = Profile.objects.get_or_create(user=user)
+        cache.set(chave, perfil, PERFIL_CACHE_TTL_S)
+
+    # O usuário da requisição é o mais atual (o do cache pode ter até PERFIL_CACHE_TTL_S)
+    perfil.user = user
+    return perfil
+
+
+def perfil_preguicoso(request):
+    """Valor de request.perfil: carregado no primeiro acesso, uma vez por requisição."""
+    return SimpleLazyObject(lambda: perfil_do_usuario(request.user))
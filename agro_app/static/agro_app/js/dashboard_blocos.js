@@ -0,0 +1,30 @@
+// Script para carregar os blocos "pesados" do Dashboard (Clima e Ranqueamento) depois
+// que o esqueleto da página já foi exibido. Cada elemento com o atributo
+// data-bloco-url é preenchido com o HTML devolvido por essa URL; todas as
+// requisições são disparadas ao mesmo tempo (em paralelo).
+
+document.addEventListener('DOMContentLoaded', () => {
+    const blocos = document.querySelectorAll('[data-bloco-url]');
+
+    const carregarBloco = async (container) => {
+        try {
+            const response = await fetch(container.dataset.blocoUrl, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                credentials: 'same-origin',
+            });
+
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+
+            container.innerHTML = await response.text();
+        } catch (error) {
+            console.error(`Erro ao carregar o bloco ${container.dataset.blocoUrl}:`, error);
+            container.innerHTML = '<p>Não foi possível carregar este bloco. Recarregue a página.</p>';
+        }
+    };
+
+    blocos.forEach((container) => {
+        carregarBloco(container);
+    });
+});
@@ -0,0 +1,53 @@
+// Script para manter o Bloco 2 (Clima) do Dashboard atualizado sem recarregar a página.
+// Abre um EventSource para a URL em data-clima-eventos-url (stream SSE de /clima/eventos/)
+// e, a cada evento 'clima', atualiza os campos marcados com data-clima-campo no bloco2.html.
+// O navegador reconecta sozinho quando o servidor encerra o stream.
+
+document.addEventListener('DOMContentLoaded', () => {
+    const container = document.querySelector('[data-clima-eventos-url]');
+    if (!container || typeof EventSource === 'undefined') {
+        return;
+    }
+
+    // Busca de novo o HTML do bloco (usado quando ele ainda não tinha dados de clima)
+    const recarregarBloco = async () => {
+        try {
+            const response = await fetch(container.dataset.blocoUrl, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                credentials: 'same-origin',
+            });
+            if (response.ok) {
+                container.innerHTML = await response.text();
+            }
+        } catch (error) {
+            console.error('Erro ao recarregar o bloco de clima:', error);
+        }
+    };
+
+    const fonte = new EventSource(container.dataset.climaEventosUrl);
+
+    fonte.addEventListener('clima', (evento) => {
+        const dados = JSON.parse(evento.data);
+
+        // O bloco ainda está sendo carregado por dashboard_blocos.js: ele já virá com o clima atual
+        if (container.querySelector('.bloco-carregando')) {
+            return;
+        }
+
+        const campos = container.querySelectorAll('[data-clima-campo]');
+        if (campos.length === 0) {
+            recarregarBloco();
+            return;
+        }
+
+        campos.forEach((campo) => {
+            const valor = dados.clima[campo.dataset.climaCampo];
+            campo.textContent = (valor === undefined || valor === null || valor === '') ? '-' : valor;
+        });
+    });
+
+    fonte.onerror = () => {
+        // Erros de conexão são tratados pelo próprio EventSource (reconexão automática)
+        console.warn('Stream de clima interrompido; tentando reconectar...');
+    };
+});
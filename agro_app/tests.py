@@ -1,3 +1,307 @@
-from django.test import TestCase
+import datetime
+import unittest
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from AgroData.apoio_testes import CACHE_LOCAL
+from fichatecnica_app import data_service
+from .models import Clima, EtapaPlantio, PlanoPlantio, Produto, ResumoDashboard, Terreno
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "Planos de consulta verificados só no PostgreSQL.")
+class IndicesConsultasTests(TestCase):
+    """
+    Regressão dos planos de consulta (EXPLAIN) das listagens mais usadas: com uma
+    massa de dados grande, cada consulta deve usar o índice composto/parcial
+    criado para ela em agro_app/migrations/0003_indices_consultas.py.
+    """
+
+    TERRENOS_POR_USUARIO = 200
+    OUTROS_USUARIOS = 50
+    TERRENOS_ALVO = 5000
+    PLANOS_ALVO = 6000
+    ETAPAS_POR_PLANO = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('alvo', password='x')
+        outros = User.objects.bulk_create(
+            [User(username=f'outro{i}') for i in range(cls.OUTROS_USUARIOS)]
+        )
+        produto = Produto.objects.create(nome='Milho')
+
+        terrenos = [
+            Terreno(proprietario=cls.usuario, nome=f'Terreno {i:05d}', area_total=10,
+                    unidade_area='ha', estado='35', cidade='3506003')
+            for i in range(cls.TERRENOS_ALVO)
+        ]
+        for usuario in outros:
+            terrenos.extend(
+                Terreno(proprietario=usuario, nome=f'Terreno {i:05d}', area_total=10,
+                        unidade_area='ha', estado='35', cidade='3506003')
+                for i in range(cls.TERRENOS_POR_USUARIO)
+            )
+        Terreno.objects.bulk_create(terrenos, batch_size=2000)
+
+        terreno = Terreno.objects.filter(proprietario=cls.usuario).first()
+        inicio = datetime.date(2020, 1, 1)
+        status = ['RASCUNHO', 'ANDAMENTO', 'CONCLUIDO']
+        planos = [
+            PlanoPlantio(proprietario=cls.usuario, terreno=terreno, produto=produto,
+                         data_inicio=inicio + datetime.timedelta(days=i % 1500),
+                         status=status[i % len(status)])
+            for i in range(cls.PLANOS_ALVO)
+        ]
+        PlanoPlantio.objects.bulk_create(planos, batch_size=2000)
+
+        planos = list(PlanoPlantio.objects.filter(proprietario=cls.usuario).only('id')[:500])
+        cls.plano = planos[0]
+        EtapaPlantio.objects.bulk_create([
+            EtapaPlantio(plano=plano, tipo='PLANTIO', nome=f'Etapa {i}',
+                         data_prevista=inicio + datetime.timedelta(days=i))
+            for plano in planos for i in range(cls.ETAPAS_POR_PLANO)
+        ], batch_size=2000)
+
+        with connection.cursor() as cursor:
+            for modelo in (Terreno, PlanoPlantio, EtapaPlantio):
+                cursor.execute(f'ANALYZE {modelo._meta.db_table}')
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIn(indice, plano, msg=f"Plano sem o índice {indice}:\n{plano}")
+
+    def test_terrenos_do_usuario_por_nome(self):
+        queryset = Terreno.objects.filter(proprietario=self.usuario).order_by('nome', 'id')[:51]
+        self.assertUsaIndice(queryset, 'terreno_prop_nome_idx')
+
+    def test_planos_recentes_sem_rascunho(self):
+        queryset = PlanoPlantio.objects.filter(
+            proprietario=self.usuario
+        ).exclude(
+            status='RASCUNHO'
+        ).filter(
+            produto__isnull=False
+        ).order_by('-data_inicio', '-id')[:6]
+        self.assertUsaIndice(queryset, 'plano_prop_ativos_idx')
+
+    def test_etapas_do_plano_por_data(self):
+        queryset = EtapaPlantio.objects.filter(plano=self.plano).order_by('data_prevista')
+        self.assertUsaIndice(queryset, 'etapa_plano_data_idx')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ResumoDashboardTests(TestCase):
+    """Resumo materializado do Bloco 1: sinais, conversão para hectares e reconstrução."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('dono', password='x')
+        self.produto = Produto.objects.create(nome='Milho')
+        ResumoDashboard.do_usuario(self.usuario)
+
+    def resumo(self):
+        return ResumoDashboard.objects.get(usuario=self.usuario)
+
+    def criar_terreno(self, area, unidade):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Terreno.objects.create(proprietario=self.usuario, nome='Terreno', area_total=area, unidade_area=unidade)
+
+    def test_area_convertida_para_hectares(self):
+        self.criar_terreno(2, 'HA')
+        self.criar_terreno(5000, 'M2')
+        self.criar_terreno(1, 'ALQ')
+
+        resumo = self.resumo()
+        self.assertEqual(resumo.terrenos, 3)
+        self.assertEqual(resumo.area_total_ha, Decimal('4.9200'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Terreno.objects.filter(unidade_area='ALQ').get().delete()
+        self.assertEqual((self.resumo().terrenos, self.resumo().area_total_ha), (2, Decimal('2.5000')))
+
+    def test_planos_e_etapas_pendentes(self):
+        terreno = self.criar_terreno(1, 'HA')
+        with self.captureOnCommitCallbacks(execute=True):
+            plano = PlanoPlantio.objects.create(
+                proprietario=self.usuario, terreno=terreno, produto=self.produto,
+                data_inicio=datetime.date(2026, 1, 1), status='ANDAMENTO',
+            )
+            PlanoPlantio.objects.create(
+                proprietario=self.usuario, terreno=terreno, produto=self.produto,
+                data_inicio=datetime.date(2026, 1, 1), status='RASCUNHO',
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            plantio = EtapaPlantio.objects.create(plano=plano, tipo='PLANTIO', nome='Plantio',
+                                                  data_prevista=datetime.date(2026, 2, 1))
+            EtapaPlantio.objects.create(plano=plano, tipo='COLHEITA', nome='Colheita',
+                                        data_prevista=datetime.date(2026, 6, 1))
+
+        resumo = self.resumo()
+        self.assertEqual((resumo.planos_ativos, resumo.etapas_pendentes), (1, 2))
+        self.assertEqual((resumo.proxima_etapa_nome, resumo.proxima_etapa_data), ('Plantio', datetime.date(2026, 2, 1)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            plantio.concluida = True
+            plantio.save()
+        resumo = self.resumo()
+        self.assertEqual((resumo.etapas_pendentes, resumo.proxima_etapa_nome), (1, 'Colheita'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            plano.delete()
+        resumo = self.resumo()
+        self.assertEqual((resumo.planos_ativos, resumo.etapas_pendentes, resumo.proxima_etapa_data), (0, 0, None))
+
+    def test_um_recalculo_por_transacao(self):
+        terreno = self.criar_terreno(1, 'HA')
+        with self.captureOnCommitCallbacks(execute=True):
+            plano = PlanoPlantio.objects.create(
+                proprietario=self.usuario, terreno=terreno, produto=self.produto,
+                data_inicio=datetime.date(2026, 1, 1), status='ANDAMENTO',
+            )
+
+        with mock.patch.object(ResumoDashboard, 'recalcular', wraps=ResumoDashboard.recalcular) as recalcular:
+            # Plano já carregado: o dono vem dele, sem consulta
+            with self.captureOnCommitCallbacks(execute=True) as callbacks, transaction.atomic():
+                for i in range(10):
+                    EtapaPlantio.objects.create(plano=plano, tipo='PLANTIO', nome=f'Etapa {i}',
+                                                data_prevista=datetime.date(2026, 2, 1))
+            self.assertEqual((len(callbacks), recalcular.call_count), (1, 1))
+            self.assertEqual(self.resumo().etapas_pendentes, 10)
+
+            # Plano não carregado: nenhuma consulta do dono por etapa; uma só no commit
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                with CaptureQueriesContext(connection) as consultas:
+                    for etapa in EtapaPlantio.objects.filter(plano=plano):
+                        etapa.concluida = True
+                        etapa.save()
+                self.assertFalse([q for q in consultas if 'proprietario_id' in q['sql']])
+            self.assertEqual(recalcular.call_count, 2)
+            self.assertEqual(self.resumo().etapas_pendentes, 0)
+
+            # Plano apagado com as etapas em cascata
+            with self.captureOnCommitCallbacks(execute=True):
+                plano.delete()
+            self.assertEqual(recalcular.call_count, 3)
+        self.assertEqual(self.resumo().planos_ativos, 0)
+
+    def test_apagar_o_usuario_nao_recria_o_resumo(self):
+        self.criar_terreno(1, 'HA')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.delete()
+        self.assertFalse(ResumoDashboard.objects.exists())
+
+    def test_comando_reconstroi_todos_os_usuarios(self):
+        outro = User.objects.create_user('outro', password='x')
+        # bulk_create não dispara sinais: o resumo fica desatualizado até a reconstrução
+        Terreno.objects.bulk_create([
+            Terreno(proprietario=dono, nome='T', area_total=1, unidade_area='HA')
+            for dono in (self.usuario, self.usuario, outro)
+        ])
+        self.assertEqual(self.resumo().terrenos, 0)
+
+        saida = StringIO()
+        call_command('reconstruir_resumo_dashboard', lote=1, stdout=saida)
+
+        self.assertIn('2 usuário(s)', saida.getvalue())
+        self.assertEqual(self.resumo().terrenos, 2)
+        self.assertEqual(ResumoDashboard.objects.get(usuario=outro).terrenos, 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DashboardConsultasTests(TestCase):
+    """O dashboard faz o mesmo número de consultas com poucos ou muitos terrenos, planos e etapas."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('dono', password='x')
+        self.produto = Produto.objects.create(nome='Milho')
+        self.client.force_login(self.usuario)
+
+    def popular(self, quantidade):
+        terrenos = Terreno.objects.bulk_create([
+            Terreno(proprietario=self.usuario, nome=f'Terreno {i}', area_total=1, unidade_area='HA',
+                    estado='35', cidade='3509502')
+            for i in range(quantidade)
+        ])
+        planos = PlanoPlantio.objects.bulk_create([
+            PlanoPlantio(proprietario=self.usuario, terreno=terreno, produto=self.produto,
+                         data_inicio=datetime.date(2026, 1, 1), status='ANDAMENTO')
+            for terreno in terrenos
+        ])
+        EtapaPlantio.objects.bulk_create([
+            EtapaPlantio(plano=plano, tipo='PLANTIO', nome='Plantio', data_prevista=datetime.date(2026, 2, 1))
+            for plano in planos
+        ])
+        ResumoDashboard.reconstruir()
+
+    def consultas_do_dashboard(self):
+        self.client.get(reverse('agro_app:dashboard'))  # Aquece o cache do perfil
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('agro_app:dashboard'))
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas)
+
+    def test_consultas_constantes(self):
+        self.popular(2)
+        poucos = self.consultas_do_dashboard()
+        self.popular(40)
+        self.assertEqual(self.consultas_do_dashboard(), poucos)
+
+        resumo = ResumoDashboard.objects.get(usuario=self.usuario)
+        self.assertEqual((resumo.terrenos, resumo.planos_ativos, resumo.etapas_pendentes), (42, 42, 42))
+
+
+def _medicao(data_hora, temperatura=25.0):
+    return {
+        'data_hora': data_hora, 'temperatura': temperatura, 'precipitacao': 0.0,
+        'sensacao_termica': temperatura, 'temp_min': temperatura, 'temp_max': temperatura,
+        'umidade': 60, 'pressao': 1013, 'vento': 2.5, 'condicao': 'céu limpo',
+    }
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ColetarClimaTests(TestCase):
+    """Comando coletar_clima: medições sempre novas do OpenWeather e sem registros repetidos."""
+
+    def setUp(self):
+        cache.clear()
+        usuario = User.objects.create_user('dono', password='x')
+        Terreno.objects.create(proprietario=usuario, nome='Sítio', area_total=1, unidade_area='HA',
+                               estado='35', cidade='3509502')
+        self.dt = timezone.now().replace(microsecond=0)
+        patcher = mock.patch.object(data_service, 'fetch_weather_values_by_id', side_effect=lambda _: _medicao(self.dt))
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def coletar(self):
+        call_command('coletar_clima', workers=1, por_minuto=0, stdout=StringIO())
+
+    def test_mesma_medicao_nao_e_gravada_de_novo(self):
+        self.coletar()
+        self.coletar()  # O OpenWeather devolveu o mesmo 'dt'
+        self.assertEqual(Clima.objects.filter(cidade_ibge='3509502').count(), 1)
+
+        self.dt += datetime.timedelta(minutes=10)
+        self.coletar()
+        self.assertEqual(
+            list(Clima.objects.order_by('data_hora').values_list('data_hora', flat=True)),
+            [self.dt - datetime.timedelta(minutes=10), self.dt],
+        )
+
+    def test_coleta_ignora_o_cache_de_clima(self):
+        cache.set('clima:3509502', _medicao(self.dt - datetime.timedelta(hours=1), temperatura=10.0))
+        self.coletar()
+
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertEqual(Clima.objects.get().data_hora, self.dt)
+        self.assertEqual(data_service.get_weather_by_id('3509502')['data_hora'], self.dt)  # Cache renovado
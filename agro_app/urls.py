@@ -6,6 +6,9 @@ app_name = 'agro_app'
 urlpatterns = [
     # Dashboard Principal
     path('', views.dashboard, name='dashboard'),
+    # Blocos pesados do dashboard, carregados em paralelo pela página (dashboard_blocos.js)
+    path('blocos/clima/', views.dashboard_bloco_clima, name='dashboard_bloco_clima'),
+    path('blocos/ranking/', views.dashboard_bloco_ranking, name='dashboard_bloco_ranking'),
 
     # Views de Perfil
     path('profile/', views.profile, name='profile'),
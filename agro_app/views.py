@@ -1,13 +1,18 @@
+import functools
 import requests
 import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from AgroData.respostas import FastJsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, etag
 # Importa Produto, que é o nome atual do modelo.
-from .models import Profile, Terreno, Produto
+from .models import ResumoDashboard, Terreno, Produto
 from .forms import ProfileForm
-from fichatecnica_app import data_service
+from . import fragmentos
+from fichatecnica_app import data_service, localidades, upstream
 # Importa as funções necessárias para a nova lógica de busca.
 from fichatecnica_app.data_service import get_products_for_city, normalize_text
 # Importa o formulário de terreno do novo aplicativo (terreno_app)
@@ -20,6 +25,79 @@ from terreno_app.forms import TerrenoForm
 TOP_N_SUGGESTIONS = 5
 
 
+def _preguicoso(func):
+    """
+    Envolve um cálculo do contexto de um bloco: o template chama o callable ao
+    usar a variável, e o resultado é memorizado (calculado no máximo uma vez).
+    """
+    return functools.cache(func)
+
+
+def _ranking_bloco4(city_id):
+    """
+    Ranqueamento passivo do Bloco 4 baseado nos dados da Ficha Técnica (Rendimento e Valor).
+    Retorna (suggestions_lucratividade, suggestions_preco).
+    """
+    suggestions_lucratividade = []
+    suggestions_preco = []
+
+    if not city_id:
+        return suggestions_lucratividade, suggestions_preco
+
+    try:
+        # 1. Obter dados: Busca todos os dados de produto da Ficha Técnica para a cidade
+        all_products_data = data_service.get_all_product_data_for_city(city_id)
+
+        print(
+            f"DEBUG BLOCO 4 - RAW DATA: Total de {len(all_products_data)} produtos retornados por get_all_product_data_for_city.")
+
+        # 2. Processamento: Cálculo do Preço por Quilo (R$/kg)
+        processed_data = []
+        for product in all_products_data:
+            # As chaves corretas do data_service são 'rendimento_num' e 'valor_producao_num'.
+            rendimento = product.get('rendimento_num', 0) or 0
+            valor = product.get('valor_producao_num', 0) or 0
+
+            # DEBUG: Vê o que está sendo filtrado
+            print(
+                f"DEBUG BLOCO 4 - FILTRO: Produto={product.get('nome', 'N/A')}, Rendimento={rendimento}, Valor={valor}")
+
+            # Filtra apenas produtos com dados válidos (Valor e Rendimento devem ser positivos)
+            if rendimento > 0 and valor > 0:
+                # Preço por Quilo: Valor Total (R$) / Rendimento (kg/ha)
+                preco_por_quilo = valor / rendimento
+
+                processed_data.append({
+                    # Usar a chave 'nome' para o nome de exibição
+                    'name': product.get('nome', 'N/A'),
+                    'rendimento': rendimento,
+                    # Para o ranking, usamos o valor total de produção (R$)
+                    'valor': valor,
+                    'preco_por_quilo': preco_por_quilo
+                })
+
+        print(f"DEBUG BLOCO 4 - PROCESSED DATA: Total de {len(processed_data)} produtos válidos para ranqueamento.")
+
+        # 3. Ranqueamento de Lucratividade: Ordena pelo 'valor' (R$) em ordem decrescente.
+        suggestions_lucratividade = sorted(
+            processed_data,
+            key=lambda x: x['valor'],
+            reverse=True
+        )[:TOP_N_SUGGESTIONS]
+
+        # 4. Ranqueamento de Preço Unitário: Ordena pelo 'preco_por_quilo' (R$/kg) em ordem crescente.
+        suggestions_preco = sorted(
+            processed_data,
+            key=lambda x: x['preco_por_quilo'],
+            reverse=False
+        )[:TOP_N_SUGGESTIONS]
+
+    except Exception as e:
+        print(f"ERRO AO GERAR SUGESTÕES DO BLOCO 4: {e}")
+
+    return suggestions_lucratividade, suggestions_preco
+
+
 # ### CONTROLE DE VISIBILIDADE & DASHBOARD ###
 # ------------------------------------------------------------------------------------------------------
 @login_required
@@ -38,12 +116,16 @@ def dashboard(request):
     # ----------------------------------------------------------------------
 
     # Lógica ADICIONAL para o Bloco 1 (Saudação/Status):
-    user_profile, created = Profile.objects.get_or_create(user=request.user)
+    user_profile = request.perfil
 
-    # Busca os nomes da Cidade e Estado para passar para o contexto (usado no bloco1.html)
+    # Nomes da Cidade e Estado para o contexto (usado no bloco1.html): rótulos gravados no
+    # próprio perfil, o "esqueleto" do dashboard não depende de nenhuma API externa.
     city_id = user_profile.cidade
-    city_name = get_city_name_from_id(city_id) if city_id else None
-    state_name = get_state_name_from_id(user_profile.estado) if user_profile.estado else None
+    city_name, state_name = user_profile.rotulos_localizacao()
+
+    # Números do Bloco 1 (terrenos, área, planos e etapas): uma linha materializada,
+    # mantida pelos sinais de Terreno/PlanoPlantio/EtapaPlantio
+    resumo = ResumoDashboard.do_usuario(request.user)
 
     # INSERIDO: Lógica para Terrenos (Bloco 1)
     terrenos_queryset = Terreno.objects.filter(proprietario=request.user).order_by('nome')
@@ -52,9 +134,8 @@ def dashboard(request):
     # Processamento dos dados de Terrenos para exibição formatada (cidade/cultivo)
     processed_terrenos = []
     for terreno in terrenos_queryset:
-        # Busca os nomes formatados usando as funções auxiliares
-        terreno_city_name = get_city_name_from_id(terreno.cidade)
-        terreno_state_name = get_state_name_from_id(terreno.estado)
+        # Nomes já gravados no terreno (rótulos de localização, sem nenhuma busca por terreno)
+        terreno_city_name, terreno_state_name = terreno.rotulos_localizacao()
 
         # CORREÇÃO CRÍTICA DEFINITIVA: REMOVIDA A REFERÊNCIA AO CAMPO INEXISTENTE.
         # Como o campo de cultivo não existe no modelo Terreno, definimos um valor padrão.
@@ -84,84 +165,19 @@ def dashboard(request):
 
 
     # ----------------------------------------------------------------------
-    # CÓDIGO DO CLIMA (Bloco 2)
-    # ----------------------------------------------------------------------
-    weather_data = None
-    if city_name:
-        weather_data = data_service.get_weather_data(city_name)
-
-    print(f"DEBUG CLIMA RETORNO FINAL: {weather_data} para a cidade: {city_name}")
-
+    # Bloco 2 (Clima) e Bloco 4 (Ranqueamento) NÃO são calculados aqui: a página
+    # os busca em paralelo (dashboard_blocos.js) em dashboard_bloco_clima e
+    # dashboard_bloco_ranking. O esqueleto só usa dados do banco.
     # ----------------------------------------------------------------------
-    # --- INÍCIO: LÓGICA DO BLOCO 4 (Ranqueamento Passivo) ---
-    # Ranqueamento passivo baseado nos dados da Ficha Técnica (Rendimento e Valor)
-    suggestions_lucratividade = []
-    suggestions_preco = []
 
-    if city_id:
-        try:
-            # 1. Obter dados: Busca todos os dados de produto da Ficha Técnica para a cidade
-            all_products_data = data_service.get_all_product_data_for_city(city_id)
-
-            print(
-                f"DEBUG BLOCO 4 - RAW DATA: Total de {len(all_products_data)} produtos retornados por get_all_product_data_for_city.")
-
-            # 2. Processamento: Cálculo do Preço por Quilo (R$/kg)
-            processed_data = []
-            for product in all_products_data:
-                # As chaves corretas do data_service são 'rendimento_num' e 'valor_producao_num'.
-                rendimento = product.get('rendimento_num', 0) or 0
-                valor = product.get('valor_producao_num', 0) or 0
-
-                # DEBUG: Vê o que está sendo filtrado
-                print(
-                    f"DEBUG BLOCO 4 - FILTRO: Produto={product.get('nome', 'N/A')}, Rendimento={rendimento}, Valor={valor}")
-
-                # Filtra apenas produtos com dados válidos (Valor e Rendimento devem ser positivos)
-                if rendimento > 0 and valor > 0:
-                    # Preço por Quilo: Valor Total (R$) / Rendimento (kg/ha)
-                    preco_por_quilo = valor / rendimento
-
-                    processed_data.append({
-                        # Usar a chave 'nome' para o nome de exibição
-                        'name': product.get('nome', 'N/A'),
-                        'rendimento': rendimento,
-                        # Para o ranking, usamos o valor total de produção (R$)
-                        'valor': valor,
-                        'preco_por_quilo': preco_por_quilo
-                    })
-
-            print(f"DEBUG BLOCO 4 - PROCESSED DATA: Total de {len(processed_data)} produtos válidos para ranqueamento.")
-
-            # 3. Ranqueamento de Lucratividade: Ordena pelo 'valor' (R$) em ordem decrescente.
-            suggestions_lucratividade = sorted(
-                processed_data,
-                key=lambda x: x['valor'],
-                reverse=True
-            )[:TOP_N_SUGGESTIONS]
-
-            # 4. Ranqueamento de Preço Unitário: Ordena pelo 'preco_por_quilo' (R$/kg) em ordem crescente.
-            suggestions_preco = sorted(
-                processed_data,
-                key=lambda x: x['preco_por_quilo'],
-                reverse=False
-            )[:TOP_N_SUGGESTIONS]
-
-
-        except Exception as e:
-            print(f"ERRO AO GERAR SUGESTÕES DO BLOCO 4: {e}")
-
-    # --- FIM: LÓGICA DO BLOCO 4 (Ranqueamento Passivo) ---
-
-    # Combina o controle de visibilidade com os dados do perfil e NOVOS DADOS DO BLOCO 4.
+    # Combina o controle de visibilidade com os dados do perfil.
     context = {
         'visibilidade': controle_de_visibilidade,
         'city_name': city_name,
         'state_name': state_name,
         'profile': user_profile,
-        'clima': weather_data,
-        'suggestions_lucratividade': suggestions_lucratividade,
-        'suggestions_preco': suggestions_preco,
+        'resumo': resumo,
+        'fragmentos': fragmentos.contexto_fragmentos(),
         # INSERIDO: Adiciona o formulário de terreno ao contexto
         'terreno_form': terreno_form,
         # CORREÇÃO CRÍTICA: Passa a lista de terrenos processada (com nomes legíveis)
@@ -173,6 +189,42 @@ def dashboard(request):
     return render(request, 'dashboard.html', context)
 
 
+# ### BLOCOS DO DASHBOARD CARREGADOS DE FORMA ASSÍNCRONA ###
+# ------------------------------------------------------------------------------------------------------
+# Devolvem só o HTML do bloco (com cache de fragmento por cidade e versão dos dados).
+
+def _contexto_bloco(request):
+    user_profile = request.perfil
+    city_id = user_profile.cidade
+    return {
+        'profile': user_profile,
+        'city_id': city_id,
+        'city_name': user_profile.rotulos_localizacao()[0],
+        'fragmentos': fragmentos.contexto_fragmentos(),
+    }
+
+
+@login_required
+def dashboard_bloco_clima(request):
+    """Bloco 2: clima atual da cidade do perfil (último registro gravado no banco)."""
+    context = _contexto_bloco(request)
+    city_id = context['city_id']
+    # Preguiçoso: só é calculado se o fragmento não estiver em cache
+    context['clima'] = _preguicoso(lambda: data_service.get_latest_weather(city_id) if city_id else None)
+    return render(request, 'dashboard_bloco2.html', context)
+
+
+@login_required
+def dashboard_bloco_ranking(request):
+    """Bloco 4: ranqueamento passivo de produtos da cidade do perfil."""
+    context = _contexto_bloco(request)
+    city_id = context['city_id']
+    ranking = _preguicoso(lambda: _ranking_bloco4(city_id))
+    context['suggestions_lucratividade'] = lambda: ranking()[0]
+    context['suggestions_preco'] = lambda: ranking()[1]
+    return render(request, 'dashboard_bloco4.html', context)
+
+
 # ------------------------------------------------------------------------------------------------------
 ### FUNÇÕES AUXILIARES DE TRADUÇÃO (Para Perfil e Dashboard)
 # ------------------------------------------------------------------------------------------------------
@@ -195,9 +247,7 @@ def get_country_name_from_id(country_id):
     # Caso contrário, tenta a API do IBGE (países) se necessário, mas geralmente é fixo.
     try:
         url = f"https://servicodados.ibge.gov.br/api/v1/localidades/paises/{country_id}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get_json(upstream.IBGE, url, vazio_e_nao_encontrado=True)
         return data[0].get('nome') if isinstance(data, list) else None
     except:
         # Se a busca falhar ou o ID não for padrão (e não for 'Brasil'), retorna None
@@ -205,26 +255,28 @@ def get_country_name_from_id(country_id):
 
 
 def get_city_name_from_id(city_id):
-    """Busca o nome da cidade a partir da ID do IBGE. Usa a API do IBGE."""
+    """Nome da cidade a partir da ID do IBGE: tabela local; a API do IBGE só para códigos fora dela."""
     if not city_id: return None
+    nome = localidades.nome_municipio(city_id)
+    if nome:
+        return nome
     try:
         url = f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{city_id}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get_json(upstream.IBGE, url, vazio_e_nao_encontrado=True)
         return data.get('nome')
     except (requests.RequestException, json.JSONDecodeError):
         return None
 
 
 def get_state_name_from_id(state_id):
-    """Busca a sigla do estado a partir da ID do IBGE."""
+    """Sigla do estado a partir da ID do IBGE: tabela local; a API do IBGE só para códigos fora dela."""
     if not state_id: return None
+    sigla = localidades.sigla_estado(state_id)
+    if sigla:
+        return sigla
     try:
         url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{state_id}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get_json(upstream.IBGE, url, vazio_e_nao_encontrado=True)
         return data.get('sigla')
     except (requests.RequestException, json.JSONDecodeError):
         return None
@@ -262,14 +314,13 @@ def get_product_name_from_id(product_id, city_id):
 @login_required
 def profile(request):
     """Exibe o perfil do usuário, buscando nomes de cidade e cultivo por ID."""
-    user_profile, created = Profile.objects.get_or_create(user=request.user)
+    user_profile = request.perfil
 
     # NOVO: Busca o nome do País
     country_name = get_country_name_from_id(user_profile.pais) if user_profile.pais else None
 
-    # CORREÇÃO: Substituído .city por .cidade e .state por .estado
-    city_name = get_city_name_from_id(user_profile.cidade) if user_profile.cidade else None
-    state_name = get_state_name_from_id(user_profile.estado) if user_profile.estado else None
+    # Rótulos de localização gravados no perfil
+    city_name, state_name = user_profile.rotulos_localizacao()
 
     # Esta linha agora usa a função CORRIGIDA
     cultivo_principal_name = get_product_name_from_id(
@@ -289,7 +340,7 @@ def profile(request):
 @login_required
 def profile_edit(request):
     """Permite ao usuário editar o próprio perfil, lidando com o formulário dinâmico."""
-    user_profile, created = Profile.objects.get_or_create(user=request.user)
+    user_profile = request.perfil
 
     if request.method == 'POST':
         form = ProfileForm(request.POST, instance=user_profile)
@@ -313,9 +364,8 @@ def profile_edit(request):
     else:
         form = ProfileForm(instance=user_profile)
 
-    # CORREÇÃO: Substituído .city por .cidade e .state por .estado
-    city_name = get_city_name_from_id(user_profile.cidade) if user_profile.cidade else None
-    state_name = get_state_name_from_id(user_profile.estado) if user_profile.estado else None
+    # Rótulos de localização gravados no perfil
+    city_name, state_name = user_profile.rotulos_localizacao()
 
     context = {
         'form': form,
@@ -330,40 +380,32 @@ def profile_edit(request):
 # VIEWS DE API (IBGE E PRODUTO) - Necessárias para o funcionamento do profile_edit
 # ------------------------------------------------------------------------------------------------------
 
+@cache_control(public=True, max_age=localidades.LOCALIDADES_MAX_AGE_S)
+@etag(localidades.etag_estados)
 def get_states(request):
-    """Retorna a lista de estados do Brasil (IBGE) via AJAX (usada no profile_edit)."""
+    """Retorna a lista de estados do Brasil (tabela local do IBGE) via AJAX (usada no profile_edit)."""
     try:
-        url = "https://servicodados.ibge.gov.br/api/v1/localidades/estados?orderBy=nome"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        states_data = response.json()
-
-        states_list = [{'id': state['id'], 'nome': state['nome']} for state in states_data]
-        return JsonResponse(states_list, safe=False)
-    except requests.RequestException as e:
-        return JsonResponse({'error': f'Erro de conexão com IBGE: {e}'}, status=500)
+        return HttpResponse(localidades.estados_json(), content_type='application/json')
     except Exception as e:
         return JsonResponse({'error': f'Erro inesperado: {e}'}, status=500)
 
 
+@cache_control(public=True, max_age=localidades.LOCALIDADES_MAX_AGE_S)
+@etag(localidades.etag_municipios)
 def get_cities(request, state_id):
-    """Retorna a lista de cidades de um estado (IBGE) via AJAX (usada no profile_edit)."""
+    """Retorna a lista de cidades de um estado (tabela local do IBGE) via AJAX (usada no profile_edit)."""
     if not state_id: return JsonResponse([], safe=False)
 
     try:
-        url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{state_id}/municipios?orderBy=nome"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        cities_data = response.json()
-
-        cities_list = [{'id': city['id'], 'nome': city['nome']} for city in cities_data]
-        return JsonResponse(cities_list, safe=False)
-    except requests.RequestException as e:
-        return JsonResponse({'error': f'Erro de conexão com IBGE: {e}'}, status=500)
+        return HttpResponse(localidades.municipios_json(state_id), content_type='application/json')
     except Exception as e:
         return JsonResponse({'error': f'Erro inesperado: {e}'}, status=500)
 
 
+@condition(
+    etag_func=lambda request, city_id: data_service.etag_produtos(city_id),
+    last_modified_func=lambda request, city_id: data_service.dataset_last_modified(),
+)
 def get_products_by_city_by_id(request, city_id):
     """
     [RESTURADA] API: Retorna a lista de produtos/cultivos associados a uma cidade.
@@ -376,6 +418,6 @@ def get_products_by_city_by_id(request, city_id):
     try:
         products_data = data_service.get_products_for_city(city_id)
         # O info_app terá uma cópia dessa lógica, e isso está OK.
-        return JsonResponse(products_data, safe=False)
+        return FastJsonResponse(products_data, safe=False)
     except Exception as e:
         return JsonResponse({'error': f'Erro ao buscar produtos no serviço de dados: {e}'}, status=500)
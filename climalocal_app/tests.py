@@ -1,3 +1,65 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from AgroData.apoio_testes import CACHE_LOCAL
+from agro_app.models import Clima
+from . import views
+
+CAMPINAS = '3509502'
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class StreamClimaTests(TestCase):
+    """Stream SSE do clima: a conexão com o banco é liberada entre as verificações."""
+
+    def setUp(self):
+        cache.clear()
+        Clima.objects.create(estado_ibge='35', cidade_ibge=CAMPINAS, data_hora=timezone.now(),
+                             temperatura=Decimal('25'), precipitacao=Decimal('0'), condicao='céu limpo')
+
+    def consumir(self, ocorrencias):
+        """Consome o stream inteiro (3 verificações) com o relógio e o sleep simulados."""
+        relogio = [0]
+
+        async def dormir(segundos):
+            ocorrencias.append('dormiu')
+            relogio[0] += segundos
+            await cache.aclear()  # O cache do último clima expirou: a próxima verificação lê o banco
+
+        async def consumir():
+            return [evento async for evento in views._eventos_clima([CAMPINAS])]
+
+        with mock.patch.object(views.asyncio, 'sleep', dormir), \
+                mock.patch.object(views.time, 'monotonic', lambda: relogio[0]), \
+                mock.patch.object(views, 'SSE_DURACAO_MAX_S', 2 * views.SSE_INTERVALO_S):
+            return async_to_sync(consumir)()
+
+    def test_conexao_fechada_antes_de_cada_espera(self):
+        ocorrencias = []
+
+        def registrar_consulta(execute, sql, params, many, context):
+            ocorrencias.append('consulta')
+            return execute(sql, params, many, context)
+
+        # O ORM assíncrono roda as consultas nesta mesma thread (thread_sensitive)
+        fechar = connection.close
+        with connection.execute_wrapper(registrar_consulta), \
+                mock.patch.object(connection, 'close', side_effect=lambda: (ocorrencias.append('fechou'), fechar())):
+            eventos = self.consumir(ocorrencias)
+
+        self.assertEqual(ocorrencias.count('dormiu'), 2)
+        self.assertEqual(ocorrencias.count('consulta'), 3)
+        for indice, ocorrencia in enumerate(ocorrencias):
+            if ocorrencia == 'dormiu':
+                self.assertEqual(ocorrencias[indice - 1], 'fechou', msg=ocorrencias)
+        self.assertEqual(ocorrencias[-1], 'fechou')
+
+        # Um único evento 'clima' (o registro não mudou); a 2ª verificação manda só o keep-alive
+        self.assertEqual(sum(evento.startswith('event: clima') for evento in eventos), 1)
+        self.assertEqual(eventos.count(': ping\n\n'), 1)
@@ -5,4 +5,6 @@ from . import views
 urlpatterns = [
     # Esta URL será acessada, por exemplo, como /clima/dados?city=Bauru
     path('dados', views.weather_api_endpoint, name='clima_dados'),
+    # Stream SSE com o clima das cidades do usuário (dashboard, bloco 2)
+    path('eventos/', views.clima_eventos, name='clima_eventos'),
 ]
\ No newline at end of file
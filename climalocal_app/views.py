@@ -1,20 +1,61 @@
-from django.http import JsonResponse
-from fichatecnica_app.data_service import get_weather_data
+import asyncio
+import time
 
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 
-def weather_api_endpoint(request):
+from AgroData.respostas import dumps_json
+from agro_app import fragmentos
+from agro_app.models import Profile, Terreno
+from fichatecnica_app import data_service, localidades
+from fichatecnica_app.data_service import get_weather_data_async, get_weather_by_id_async, format_weather_values
+
+# ==============================================================================
+# STREAM DE CLIMA (SERVER-SENT EVENTS) PARA O DASHBOARD
+# ==============================================================================
+# Cada conexão acompanha as cidades do usuário (perfil + terrenos) lendo o
+# último clima do cache compartilhado (get_latest_weather_async): todos os
+# assinantes de uma cidade leem a mesma entrada, e só um deles (o que pega a
+# trava no cache) atualiza a cidade no OpenWeather quando o registro está
+# desatualizado. Um evento 'clima' só é enviado quando o registro muda.
+#
+# O stream não segura conexão com o banco: depois de cada verificação a
+# conexão da thread é fechada (devolvida ao pool, com DB_POOL=1). Sem isso,
+# cada aba aberta prenderia uma conexão do PostgreSQL por até SSE_DURACAO_MAX_S.
+#
+# Precisa do servidor ASGI (AgroData/asgi.py, ex: uvicorn/daphne): no WSGI a
+# conexão prenderia uma thread do worker durante todo o stream.
+
+SSE_INTERVALO_S = 20          # Intervalo entre as verificações (e os 'ping' de keep-alive)
+SSE_DURACAO_MAX_S = 60 * 10   # Encerra o stream depois disso; o EventSource reconecta sozinho
+SSE_RETRY_MS = 5000           # Espera do navegador antes de reconectar
+SSE_MAX_CIDADES = 20
+
+
+async def weather_api_endpoint(request):
     """
     Endpoint da API local para retornar dados de clima em JSON.
     Chama a função de serviço centralizada em data_service.py.
+    (Assíncrona: a espera pelo OpenWeather não bloqueia o worker.)
     """
-    # Tenta pegar o nome da cidade do parâmetro de URL (Ex: /clima/?city=Bauru)
+    # Preferencial: código IBGE do município (Ex: /clima/dados?city_id=3506003),
+    # buscado por coordenadas e com cache por município.
+    city_id = request.GET.get('city_id')
+    # Legado: nome da cidade (Ex: /clima/dados?city=Bauru)
     city_name = request.GET.get('city')
 
-    if not city_name:
-        return JsonResponse({'error': 'Parâmetro "city" faltando. Use: ?city=NomeDaCidade'}, status=400)
+    if not city_id and not city_name:
+        return JsonResponse({'error': 'Parâmetro "city_id" ou "city" faltando. Use: ?city_id=CodigoIBGE'}, status=400)
 
     # 1. Chama a função de serviço centralizada (agora funcionando)
-    clima_data = get_weather_data(city_name)
+    if city_id:
+        valores = await get_weather_by_id_async(city_id)
+        clima_data = format_weather_values(valores) if valores else None
+    else:
+        clima_data = await get_weather_data_async(city_name)
 
     # 2. Retorna a resposta JSON
     if clima_data:
@@ -22,5 +63,102 @@ def weather_api_endpoint(request):
         return JsonResponse(clima_data)
     else:
         # Se a função retornar None (falha na API ou cidade não encontrada)
-        return JsonResponse({'error': f'Dados de clima indisponíveis para {city_name}. Verifique o nome da cidade.'},
-                            status=500)
\ No newline at end of file
+        return JsonResponse({'error': f'Dados de clima indisponíveis para {city_id or city_name}. Verifique a cidade.'},
+                            status=500)
+
+
+async def _cidades_do_usuario(user):
+    """Código IBGE da cidade do perfil (primeiro) e dos terrenos do usuário, sem repetição."""
+    cidades = []
+    cidade_perfil = await Profile.objects.filter(user=user).values_list('cidade', flat=True).afirst()
+    if cidade_perfil:
+        cidades.append(cidade_perfil)
+
+    async for cidade in Terreno.objects.filter(proprietario=user).values_list('cidade', flat=True).distinct():
+        if cidade and cidade not in cidades:
+            cidades.append(cidade)
+
+    return cidades[:SSE_MAX_CIDADES]
+
+
+def _evento_sse(evento, dados, evento_id=None):
+    linhas = [f"event: {evento}"]
+    if evento_id:
+        linhas.append(f"id: {evento_id}")
+    linhas.append(f"data: {dumps_json(dados).decode('utf-8')}")
+    return "\n".join(linhas) + "\n\n"
+
+
+async def _verificar_cidades(cidades, enviados):
+    """
+    Uma verificação das cidades: devolve os eventos 'clima' dos registros que
+    mudaram desde o último envio. Fecha a conexão com o banco no fim.
+    """
+    eventos = []
+    try:
+        for city_id in cidades:
+            clima = await data_service.get_latest_weather_async(city_id)
+
+            if data_service.clima_desatualizado(clima):
+                if await data_service.atualizar_clima_cidade_async(city_id):
+                    # Descarta também o fragmento do bloco 2 em cache para essa cidade
+                    await sync_to_async(fragmentos.invalidar_fragmentos_cidade)(city_id)
+                    clima = await data_service.get_latest_weather_async(city_id)
+
+            if not clima or enviados.get(city_id) == clima['atualizado_em']:
+                continue
+
+            enviados[city_id] = clima['atualizado_em']
+            eventos.append(_evento_sse('clima', {
+                'city_id': city_id,
+                'city_name': localidades.nome_municipio(city_id),
+                'clima': clima,
+            }, evento_id=f"{city_id}-{int(clima['atualizado_em'].timestamp())}"))
+    finally:
+        # Roda na thread das consultas do ORM assíncrono (thread_sensitive) e fecha
+        # as conexões dela, inclusive a aberta pela view (sessão, usuário, cidades)
+        await sync_to_async(connections.close_all)()
+    return eventos
+
+
+async def _eventos_clima(cidades):
+    """Gerador assíncrono do stream: um evento 'clima' por cidade sempre que o último registro mudar."""
+    enviados = {}
+    inicio = time.monotonic()
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    while True:
+        eventos = await _verificar_cidades(cidades, enviados)
+        for evento in eventos:
+            yield evento
+
+        if time.monotonic() - inicio >= SSE_DURACAO_MAX_S:
+            return
+
+        if not eventos:
+            # Comentário SSE: mantém a conexão viva em proxies com timeout de ociosidade
+            yield ": ping\n\n"
+        await asyncio.sleep(SSE_INTERVALO_S)
+
+
+@require_GET
+@login_required
+async def clima_eventos(request):
+    """
+    Stream SSE (text/event-stream) com o clima das cidades do usuário.
+    Opcional: ?city_id= restringe a uma das cidades do usuário.
+    """
+    user = await request.auser()
+    cidades = await _cidades_do_usuario(user)
+
+    city_id = request.GET.get('city_id')
+    if city_id:
+        if city_id not in cidades:
+            return JsonResponse({'error': 'Cidade não pertence ao perfil ou aos terrenos do usuário.'}, status=404)
+        cidades = [city_id]
+
+    response = StreamingHttpResponse(_eventos_clima(cidades), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Desliga o buffer do nginx, que seguraria os eventos
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,254 @@
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+# ==============================================================================
+# ARMAZENAMENTO DOS DADOS DE PRODUÇÃO (CSVs DO IBGE)
+# ==============================================================================
+# O data_service lê os 5 CSVs de produção (quantidade, rendimento, valor, área
+# colhida e destinada) só por esta interface, com duas implementações:
+#   - 'memoria' (padrão): DataFrames do pandas carregados em cada processo
+#     (load_and_cache_agro_data), como sempre foi;
+#   - 'postgresql': tabela ProducaoMunicipal, carregada pelo comando
+#     'manage.py importar_producao' (COPY) e indexada por (município, produto,
+#     variável, ano). Os processos não guardam os CSVs na memória e a tabela
+#     aceita vários anos de dados (as consultas usam sempre o ano mais recente).
+# Escolhida por FICHA_ARMAZENAMENTO no settings.py. As duas passam pelo mesmo
+# conjunto de medições: 'manage.py benchmark_armazenamento'.
+#
+# Os municípios são procurados pelo código IBGE (quando a linha do CSV foi
+# associada a um código) e, senão, pelo nome normalizado (primeira linha com o
+# nome, como no DataFrame). Os valores são devolvidos como texto, exatamente como
+# no CSV (ex: '1590', '-', '...').
+
+MEMORIA = 'memoria'
+POSTGRESQL = 'postgresql'
+
+# Variáveis (chaves de data_service.CSV_CONFIG), na ordem dos CSVs
+VARIAVEIS = (
+    'Quantidade produzida',
+    'Rendimento médio',
+    'Valor da produção',
+    'Área colhida',
+    'Área destinada',
+)
+VARIAVEL_CATALOGO = 'Quantidade produzida'  # O cabeçalho dela lista todos os produtos
+
+CATALOGO_CACHE_TTL_S = 60 * 60
+CHAVE_CATALOGO = 'producao:catalogo'
+
+# Marcadores de valor indisponível (os mesmos que o data_service sempre tratou)
+VALORES_INDISPONIVEIS = ('DADO NAO DISPONIVEL', '-', '...')
+
+_INSTANCIAS = {}
+_INSTANCIAS_LOCK = threading.Lock()
+
+
+def valor_numerico(valor_bruto):
+    """Valor do CSV como float ('1.234' -> 1234.0), ou None se indisponível ('-', '...')."""
+    texto = str(valor_bruto).strip()
+    if texto.upper() in VALORES_INDISPONIVEIS:
+        return None
+    try:
+        valor = float(texto.replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+    return None if math.isnan(valor) or math.isinf(valor) else valor
+
+
+class ArmazenamentoProducao:
+    """Interface dos dados de produção por município (ver o cabeçalho do módulo)."""
+
+    nome = None
+
+    def produtos(self):
+        """Catálogo de produtos: {id normalizado: nome original}, na ordem das colunas do CSV."""
+        raise NotImplementedError
+
+    def nome_produto(self, produto_id):
+        """Nome original do produto (em qualquer variável), ou None."""
+        raise NotImplementedError
+
+    def valores_cidade(self, cidade, city_id=None, variaveis=VARIAVEIS):
+        """
+        Valores do município: {variável: {produto_id: valor bruto}}. Variáveis em que
+        o município não aparece ficam de fora ({} se ele não estiver em nenhuma).
+        """
+        raise NotImplementedError
+
+    def ranking_cidades(self, produto_id, variavel, limite=10):
+        """
+        Consulta entre municípios: os 'limite' com maior valor numérico da variável
+        para o produto, [{'city_id', 'cidade', 'valor'}, ...] em ordem decrescente.
+        """
+        raise NotImplementedError
+
+    def produtos_da_cidade(self, cidade, city_id=None):
+        """Produtos com quantidade produzida informada no município: [{'id', 'nome'}, ...]."""
+        valores = self.valores_cidade(cidade, city_id, (VARIAVEL_CATALOGO,)).get(VARIAVEL_CATALOGO)
+        if valores is None:
+            return []
+
+        produtos = []
+        for produto_id, nome_original in self.produtos().items():
+            valor = valores.get(produto_id)
+            if valor is not None and str(valor).strip().upper() not in VALORES_INDISPONIVEIS:
+                produtos.append({'id': produto_id, 'nome': nome_original.title()})
+        return produtos
+
+
+class ArmazenamentoMemoria(ArmazenamentoProducao):
+    """DataFrames carregados dos CSVs em cada processo (data_service.load_and_cache_agro_data)."""
+
+    nome = MEMORIA
+
+    def _dados(self):
+        # Import local: o data_service importa este módulo
+        from .data_service import load_and_cache_agro_data
+        data_frames, _ = load_and_cache_agro_data(incluir_csv=True)
+        return data_frames or {}
+
+    def produtos(self):
+        return dict(self._dados().get(f'{VARIAVEL_CATALOGO}_header_map', {}))
+
+    def nome_produto(self, produto_id):
+        dados = self._dados()
+        for variavel in VARIAVEIS:
+            nome_original = dados.get(f'{variavel}_header_map', {}).get(produto_id)
+            if nome_original:
+                return nome_original
+        return None
+
+    def _linha(self, df, cidade, city_id):
+        if city_id is not None and 'CODIGO' in df.columns:
+            linhas = df[df['CODIGO'] == str(city_id).strip()]
+            if not linhas.empty:
+                return linhas.iloc[0]
+        if not cidade:
+            return None
+        linhas = df[df['CIDADE'] == cidade]
+        return None if linhas.empty else linhas.iloc[0]
+
+    def valores_cidade(self, cidade, city_id=None, variaveis=VARIAVEIS):
+        dados = self._dados()
+        resultado = {}
+        for variavel in variaveis:
+            df = dados.get(variavel)
+            if df is None or df.empty:
+                continue
+            linha = self._linha(df, cidade, city_id)
+            if linha is None:
+                continue
+            # Produtos com o mesmo nome normalizado (ex: as duas 'Borracha'): vale a última
+            # coluna, a mesma cujo nome original ficou no header_map
+            resultado[variavel] = {
+                produto_id: str(valor)
+                for produto_id, valor in linha.items() if produto_id not in ('CIDADE', 'CODIGO')
+            }
+        return resultado
+
+    def ranking_cidades(self, produto_id, variavel, limite=10):
+        df = self._dados().get(variavel)
+        if df is None or df.empty or produto_id not in df.columns:
+            return []
+
+        coluna = len(df.columns) - 1 - list(df.columns)[::-1].index(produto_id)  # Última com o nome (ver valores_cidade)
+        valores = df.iloc[:, coluna].map(valor_numerico)
+        melhores = valores.dropna().sort_values(ascending=False, kind='stable').head(limite)
+        return [
+            {'city_id': df.at[indice, 'CODIGO'], 'cidade': df.at[indice, 'CIDADE'], 'valor': valor}
+            for indice, valor in melhores.items()
+        ]
+
+
+class ArmazenamentoPostgreSQL(ArmazenamentoProducao):
+    """Tabela ProducaoMunicipal (fichatecnica_app.models), carregada por 'importar_producao'."""
+
+    nome = POSTGRESQL
+
+    def _tabela(self):
+        from .models import ProducaoMunicipal
+        return ProducaoMunicipal.objects
+
+    def produtos(self):
+        catalogo = cache.get(CHAVE_CATALOGO)
+        if catalogo is None:
+            linhas = self._tabela().filter(
+                variavel=VARIAVEL_CATALOGO
+            ).values_list('coluna', 'produto', 'produto_nome').distinct().order_by('coluna')
+            catalogo = {}
+            for _, produto_id, produto_nome in linhas:
+                catalogo.setdefault(produto_id, produto_nome)
+            cache.set(CHAVE_CATALOGO, catalogo, CATALOGO_CACHE_TTL_S)
+        return dict(catalogo)
+
+    def nome_produto(self, produto_id):
+        nome_original = self.produtos().get(produto_id)
+        if nome_original:
+            return nome_original
+        return self._tabela().filter(produto=produto_id).values_list('produto_nome', flat=True).first()
+
+    def valores_cidade(self, cidade, city_id=None, variaveis=VARIAVEIS):
+        linhas = None
+        if city_id is not None:
+            # Índice (municipio_codigo, produto, variavel, ano)
+            linhas = list(self._tabela().filter(
+                municipio_codigo=str(city_id).strip(), variavel__in=variaveis
+            ).order_by('-ano', 'linha').values_list('variavel', 'produto', 'valor_bruto'))
+        if not linhas and cidade:
+            linhas = list(self._tabela().filter(
+                cidade=cidade, variavel__in=variaveis
+            ).order_by('-ano', 'linha').values_list('variavel', 'produto', 'valor_bruto'))
+
+        resultado = {}
+        for variavel, produto_id, valor_bruto in linhas or ():
+            # O primeiro de cada (variável, produto) é o do ano mais recente
+            resultado.setdefault(variavel, {}).setdefault(produto_id, valor_bruto)
+        return resultado
+
+    def ranking_cidades(self, produto_id, variavel, limite=10):
+        registros = self._tabela().filter(produto=produto_id, variavel=variavel)
+        ano = registros.aggregate(ano=Max('ano'))['ano']
+        if ano is None:
+            return []
+
+        # Índice (produto, variavel, ano, valor)
+        melhores = registros.filter(ano=ano, valor__isnull=False).order_by(
+            '-valor', 'linha'
+        ).values_list('municipio_codigo', 'cidade', 'valor')[:limite]
+        return [{'city_id': codigo, 'cidade': cidade, 'valor': valor} for codigo, cidade, valor in melhores]
+
+
+IMPLEMENTACOES = {
+    MEMORIA: ArmazenamentoMemoria,
+    POSTGRESQL: ArmazenamentoPostgreSQL,
+}
+
+
+def nome_configurado():
+    return getattr(settings, 'FICHA_ARMAZENAMENTO', MEMORIA)
+
+
+def usa_memoria():
+    """True se os CSVs devem ser carregados na memória do processo (armazenamento 'memoria')."""
+    return nome_configurado() == MEMORIA
+
+
+def get_armazenamento(nome=None):
+    """Instância (uma por processo) do armazenamento indicado, ou do configurado em FICHA_ARMAZENAMENTO."""
+    nome = nome or nome_configurado()
+    if nome not in IMPLEMENTACOES:
+        raise ValueError(f"Armazenamento desconhecido: '{nome}'. Use: {', '.join(IMPLEMENTACOES)}.")
+
+    with _INSTANCIAS_LOCK:
+        if nome not in _INSTANCIAS:
+            _INSTANCIAS[nome] = IMPLEMENTACOES[nome]()
+        return _INSTANCIAS[nome]
+
+
+def invalidar_catalogo():
+    """Descarta o catálogo de produtos em cache (chamado depois de uma importação)."""
+    cache.delete(CHAVE_CATALOGO)
@@ -7,12 +7,25 @@ from django.conf import settings
 import requests
 import math  # Adicionado para checagem robusta de valores numéricos (NaN/Inf)
 import sys  # <--- ADICIONADO PARA TRATAMENTO ROBUSTO DE ERROS NO WSGI
+import asyncio
+import hashlib
+from decimal import Decimal
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from . import upstream  # Circuit breaker e cache negativo das APIs externas
+from . import localidades  # Tabela local de municípios (código IBGE -> nome/UF/coordenadas)
+from . import armazenamento  # Onde ficam os dados de produção dos CSVs (memória ou PostgreSQL)
 
 # ==============================================================================
 # 1. SETUP E UTILS
 # ==============================================================================
 
 FICHA_TECNICA_CACHE = {}
+DATASET_VERSAO_CACHE = {}
 UNIDADE_TERRITORIAL_COL = "Município"
 
 # Configuração Individualizada: O índice de cabeçalho é 4 (Linha 5),
@@ -38,6 +51,14 @@ JSON_CONFIG = {
 # ==============================================================================
 CLIMA_API_KEY = '1651adf768bfe011596a30a1801c57f6'
 CLIMA_API_URL = 'http://api.openweathermap.org/data/2.5/weather'
+# Tempo de vida do cache de clima por município (chave: código IBGE)
+CLIMA_CACHE_TTL_S = 60 * 10
+# Tempo de vida do último clima lido do banco (mesclado nas fichas)
+CLIMA_ULTIMO_CACHE_TTL_S = 60 * 2
+# Idade a partir da qual o último clima gravado é considerado desatualizado (stream SSE)
+CLIMA_DESATUALIZADO_S = 60 * 30
+# Trava por município: no máximo uma atualização no OpenWeather por janela, para todos os processos
+CLIMA_TRAVA_ATUALIZACAO_S = 60
 
 
 # <<<<< FIM DO BLOCO DE CONFIGURAÇÃO DE CLIMA
@@ -67,18 +88,194 @@ def _normalize_json_list(json_list, key_name):
     return normalized_dict
 
 
+# ------------------------------------------------------------------------------
+# VERSÃO DO CONJUNTO DE DADOS (ETag / Last-Modified das APIs)
+# ------------------------------------------------------------------------------
+# Os produtos e a parte de produção da ficha só mudam quando os arquivos de
+# agro_app/dados mudam. A versão (hash do conteúdo) e a data de modificação são
+# calculadas uma vez por processo e permitem responder 304 Not Modified sem
+# remontar o JSON.
+
+def dataset_version():
+    """Versão do conjunto de dados: hash (12 hex) do nome e conteúdo dos arquivos de agro_app/dados."""
+    if 'versao' not in DATASET_VERSAO_CACHE:
+        dados_dir = os.path.join(settings.BASE_DIR, 'agro_app', 'dados')
+        digest = hashlib.md5()
+        ultima_modificacao = 0.0
+        try:
+            for file_name in sorted(os.listdir(dados_dir)):
+                file_path = os.path.join(dados_dir, file_name)
+                if not os.path.isfile(file_path):
+                    continue
+                digest.update(file_name.encode('utf-8'))
+                with open(file_path, 'rb') as f:
+                    digest.update(f.read())
+                ultima_modificacao = max(ultima_modificacao, os.path.getmtime(file_path))
+        except OSError as e:
+            sys.stderr.write(f"Erro ao calcular a versão dos dados em {dados_dir}: {e}\n")
+
+        DATASET_VERSAO_CACHE['versao'] = digest.hexdigest()[:12]
+        DATASET_VERSAO_CACHE['modificado_em'] = datetime.fromtimestamp(ultima_modificacao, tz=timezone.utc)
+    return DATASET_VERSAO_CACHE['versao']
+
+
+def dataset_last_modified():
+    """Data da última modificação dos arquivos de agro_app/dados (UTC)."""
+    dataset_version()
+    return DATASET_VERSAO_CACHE['modificado_em']
+
+
+def _janela_clima():
+    """
+    Índice da janela atual de CLIMA_CACHE_TTL_S segundos. A ficha inclui o clima,
+    então o ETag dela muda a cada janela (sem consultar o banco para calculá-lo).
+    """
+    return int(time.time() // CLIMA_CACHE_TTL_S)
+
+
+def etag_produtos(city_id):
+    """ETag da lista de produtos de um município."""
+    return f"produtos-{city_id}-{dataset_version()}"
+
+
+def etag_ficha(product_name, city_id, secoes=None):
+    """
+    ETag da ficha técnica: produto normalizado, município, versão dos dados e,
+    se o clima fizer parte da resposta, a janela do clima. Com 'secoes' (parâmetro
+    fields=/include=) as seções pedidas também entram no ETag.
+    """
+    etag = f"ficha-{_produto_canonico(unquote(product_name or ''))}-{city_id}-{dataset_version()}"
+    if secoes is not None and set(secoes) != set(SECOES_FICHA):
+        etag += '-' + '.'.join(secoes)
+    if secoes is None or 'clima' in secoes:
+        etag += f"-{_janela_clima()}"
+    return etag
+
+
+def last_modified_ficha(product_name, city_id, secoes=None):
+    """Last-Modified da ficha: o mais recente entre os arquivos de dados e o início da janela do clima."""
+    if secoes is not None and 'clima' not in secoes:
+        return dataset_last_modified()
+    inicio_janela = datetime.fromtimestamp(_janela_clima() * CLIMA_CACHE_TTL_S, tz=timezone.utc)
+    return max(dataset_last_modified(), inicio_janela)
+
+
+def etag_ficha_requisicao(request, product_name, city_id):
+    """etag_ficha com as seções do parâmetro fields=/include= (sem ETag se o parâmetro for inválido)."""
+    try:
+        return etag_ficha(product_name, city_id, secoes_da_requisicao(request))
+    except ValueError:
+        return None
+
+
+def last_modified_ficha_requisicao(request, product_name, city_id):
+    """last_modified_ficha com as seções do parâmetro fields=/include=."""
+    try:
+        return last_modified_ficha(product_name, city_id, secoes_da_requisicao(request))
+    except ValueError:
+        return None
+
+
 # ==============================================================================
 # 2. FUNÇÃO DE CARGA, CORREÇÃO E CACHE DE DADOS
 # ==============================================================================
 
-def load_and_cache_agro_data():
+_NOME_COM_UF = re.compile(r'^(.*)\(([A-Z]{2})\)\s*$')
+
+
+def _codigo_municipio_csv(nome_com_uf):
+    """Código IBGE do município a partir do nome dos CSVs do IBGE (ex: 'Bauru (SP)'), ou None."""
+    if not isinstance(nome_com_uf, str):
+        return None
+    encontrado = _NOME_COM_UF.match(nome_com_uf.strip())
+    if encontrado is None:
+        return None
+    return localidades.codigo_municipio(encontrado.group(1), encontrado.group(2))
+
+
+def ler_csv_producao(key):
+    """
+    Lê um dos CSVs de produção do IBGE (chave de CSV_CONFIG).
+    Retorna (DataFrame, header_map, ano): o DataFrame tem as colunas CIDADE (nome
+    normalizado), CODIGO (código IBGE do município, ou None) e uma coluna por
+    produto (nome normalizado); header_map liga o nome normalizado ao original.
+    Erros de leitura são propagados (quem chama decide como registrar).
+    """
+    config = CSV_CONFIG[key]
+    file_name = config['file']
+    header_index = config['header_row_index']  # 4
+    caminho_arquivo = os.path.join(settings.BASE_DIR, 'agro_app', 'dados', file_name)
+
+    # 0. Ano da pesquisa (linha 4: "Município";"2024")
+    ano = None
+    try:
+        ano_df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8',
+                             header=None, skiprows=header_index - 1, nrows=1, dtype=str)
+        ano = int(str(ano_df.iloc[0, 1]).strip())
+    except (ValueError, IndexError):
+        pass
+
+    # 1. Leitura do CABEÇALHO DE PRODUTOS (Linha 5 - header_index 4)
+    # CORREÇÃO DE ENCODING: Usando 'utf-8'
+    header_df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8',
+                            header=None, skiprows=header_index, nrows=1)
+    product_header_line = header_df.iloc[0].tolist()
+
+    # 2. Leitura dos DADOS (Começando da linha 6 - header_index + 1)
+    # CORREÇÃO DE ENCODING: Usando 'utf-8'
+    df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8',
+                     header=None, skiprows=header_index + 1, skip_blank_lines=True)
+
+    # Limpeza de colunas vazias
+    df = df.dropna(axis=1, how='all')
+
+    # Mapeamento e Normalização (Sincroniza DF e Lista de Nomes de Produtos)
+    column_map = {}
+    new_columns = []
+
+    num_cols = min(len(df.columns), len(product_header_line))
+    df = df.iloc[:, :num_cols]
+    product_header_line = product_header_line[:num_cols]
+
+    if len(df.columns) < 2:
+        raise ValueError("CSV tem menos de 2 colunas após leitura.")
+
+    for i, original_name in enumerate(product_header_line):
+        # i=0: Nome da Cidade.
+        if i == 0:
+            new_col_name = 'CIDADE'
+        # i=1: Nome do Ano.
+        elif i == 1:
+            new_col_name = 'ANO'
+        # i>=2: Produtos.
+        else:
+            normalized_key = normalize_text(original_name)
+            new_col_name = normalized_key
+            column_map[normalized_key] = original_name
+
+        new_columns.append(new_col_name)
+
+    # Aplica o novo cabeçalho, resolve o código IBGE ("Nome (UF)") e normaliza a coluna CIDADE
+    df.columns = new_columns
+    df.insert(1, 'CODIGO', df['CIDADE'].apply(_codigo_municipio_csv))
+    df['CIDADE'] = df['CIDADE'].apply(normalize_text)
+
+    return df.drop(columns=['ANO'], errors='ignore'), column_map, ano
+
+
+def load_and_cache_agro_data(incluir_csv=None):
     """
     Carrega e armazena em cache todos os dados de produção CSV e dados JSON.
     Inclui lógica de normalização de nomes de colunas e cidades.
+    Com o armazenamento 'postgresql' (ver armazenamento.py) os CSVs ficam no
+    banco e só os JSONs são carregados na memória do processo (incluir_csv=True
+    força a carga dos CSVs, usado pelo próprio armazenamento 'memoria').
     """
     global FICHA_TECNICA_CACHE
+    csv_em_memoria = armazenamento.usa_memoria() if incluir_csv is None else incluir_csv
+
     # Garante que todos os CSVs e JSONs estejam no cache
-    required_keys = list(CSV_CONFIG.keys()) + list(JSON_CONFIG.keys())
+    required_keys = (list(CSV_CONFIG.keys()) if csv_em_memoria else []) + list(JSON_CONFIG.keys())
     if FICHA_TECNICA_CACHE and all(key in FICHA_TECNICA_CACHE for key in required_keys):
         return FICHA_TECNICA_CACHE, "Sucesso (Cache carregado)"
 
@@ -87,62 +284,14 @@ def load_and_cache_agro_data():
     dados_dir = os.path.join(settings.BASE_DIR, 'agro_app', 'dados')
 
     # Processa os 5 DataFrames CSV (Leitura Individualizada e Sincronizada)
-    for key, config in CSV_CONFIG.items():
-        file_name = config['file']
-        header_index = config['header_row_index']  # 4
-        caminho_arquivo = os.path.join(dados_dir, file_name)
-
+    for key, config in (CSV_CONFIG.items() if csv_em_memoria else ()):
         try:
-            # 1. Leitura do CABEÇALHO DE PRODUTOS (Linha 5 - header_index 4)
-            # CORREÇÃO DE ENCODING: Usando 'utf-8'
-            header_df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8',
-                                    header=None, skiprows=header_index, nrows=1)
-            product_header_line = header_df.iloc[0].tolist()
-
-            # 2. Leitura dos DADOS (Começando da linha 6 - header_index + 1)
-            # CORREÇÃO DE ENCODING: Usando 'utf-8'
-            df = pd.read_csv(caminho_arquivo, sep=';', encoding='utf-8',
-                             header=None, skiprows=header_index + 1, skip_blank_lines=True)
-
-            # Limpeza de colunas vazias
-            df = df.dropna(axis=1, how='all')
-
-            # Mapeamento e Normalização (Sincroniza DF e Lista de Nomes de Produtos)
-            column_map = {}
-            new_columns = []
-
-            num_cols = min(len(df.columns), len(product_header_line))
-            df = df.iloc[:, :num_cols]
-            product_header_line = product_header_line[:num_cols]
-
-            if len(df.columns) < 2:
-                raise ValueError("CSV tem menos de 2 colunas após leitura.")
-
-            for i, original_name in enumerate(product_header_line):
-                # i=0: Nome da Cidade.
-                if i == 0:
-                    new_col_name = 'CIDADE'
-                # i=1: Nome do Ano.
-                elif i == 1:
-                    new_col_name = 'ANO'
-                # i>=2: Produtos.
-                else:
-                    normalized_key = normalize_text(original_name)
-                    new_col_name = normalized_key
-                    column_map[normalized_key] = original_name
-
-                new_columns.append(new_col_name)
-
-            # Aplica o novo cabeçalho e normaliza a coluna CIDADE
-            df.columns = new_columns
-            df['CIDADE'] = df['CIDADE'].apply(normalize_text)
-
+            df, column_map, _ = ler_csv_producao(key)
             data_store[f'{key}_header_map'] = column_map
-            data_store[key] = df.drop(columns=['ANO'], errors='ignore')
-
+            data_store[key] = df
 
         except Exception as e:
-            normalized_file_name = normalize_text(file_name)
+            normalized_file_name = normalize_text(config['file'])
 
             # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
             # Substitui o print que falhava por uma escrita direta e robusta no stderr
@@ -174,21 +323,51 @@ def load_and_cache_agro_data():
 
             data_store[key] = {}
 
+    # Mantém os CSVs já carregados (ex: benchmark do armazenamento 'memoria' com o 'postgresql' configurado)
+    for key in CSV_CONFIG:
+        if key not in data_store and key in FICHA_TECNICA_CACHE:
+            data_store[key] = FICHA_TECNICA_CACHE[key]
+            data_store[f'{key}_header_map'] = FICHA_TECNICA_CACHE[f'{key}_header_map']
+
     FICHA_TECNICA_CACHE = data_store
 
-    if not data_store.get('Quantidade produzida_header_map'):
+    if csv_em_memoria and not data_store.get('Quantidade produzida_header_map'):
         return data_store, "Falha na carga dos dados principais do CSV."
 
     return FICHA_TECNICA_CACHE, "Sucesso (Cache carregado)"
 
 
+def get_dados_ciclo(product_name):
+    """
+    Dados de ciclo do produto usados no cronograma do plano (só os JSONs locais):
+    {'ciclo': 'Temporário'/'Permanente', 'plantio': texto, 'colheita': texto}.
+    Retorna None se o produto não estiver em ficha_producao.json nem em sazonalidade.json.
+    """
+    data_frames, _ = load_and_cache_agro_data()
+    chave = normalize_text(product_name)
+    base = (data_frames or {}).get('ficha_base', {}).get(chave)
+    sazonalidade = (data_frames or {}).get('sazonalidade', {}).get(chave)
+    if base is None and sazonalidade is None:
+        return None
+
+    base = base or {}
+    sazonalidade = sazonalidade or {}
+    return {
+        'ciclo': base.get('ciclo') or sazonalidade.get('tipo'),
+        'plantio': sazonalidade.get('plantio'),
+        'colheita': sazonalidade.get('colheita'),
+    }
+
+
 # ==============================================================================
 # 3. FUNÇÃO DE GERAÇÃO DA FICHA TÉCNICA (A ser chamada pelo wrapper)
 # ==============================================================================
 
-def generate_product_sheet(normalized_product_name, normalized_city_name):
+def generate_product_sheet(normalized_product_name, normalized_city_name, incluir_csv=True, city_id=None):
     """
     Busca os dados consolidados no cache e monta a Ficha Técnica JSON final.
+    incluir_csv=False pula a busca nos 5 CSVs (só os 4 JSONs).
+    Os CSVs vêm do armazenamento de produção (município pelo city_id ou pelo nome).
     """
     data_frames, status = load_and_cache_agro_data()
     if data_frames is None or not data_frames or status != "Sucesso (Cache carregado)":
@@ -204,13 +383,14 @@ def generate_product_sheet(normalized_product_name, normalized_city_name):
     }
 
     # A. Integração dos 5 CSVs (Dados Quantitativos)
-    for key, df in data_frames.items():
-        if key in unit_map and isinstance(df, pd.DataFrame):
-            city_row = df[df['CIDADE'] == normalized_city_name]
+    if incluir_csv:
+        valores_cidade = armazenamento.get_armazenamento().valores_cidade(normalized_city_name, city_id)
+
+        for key, unit in unit_map.items():
+            valores = valores_cidade.get(key)
 
-            if not city_row.empty:
-                value = city_row.iloc[0].get(normalized_product_name, 'Dado não disponível')
-                unit = unit_map.get(key, '')
+            if valores is not None:
+                value = valores.get(normalized_product_name, 'Dado não disponível')
 
                 if normalize_text(str(value)) not in [normalize_text('DADO NAO DISPONIVEL'), '-', '...']:
                     if isinstance(value, str):
@@ -280,44 +460,81 @@ def generate_product_sheet(normalized_product_name, normalized_city_name):
 # 4. FUNÇÕES DE SERVIÇO PARA O APP AGRODATA (views.py)
 # ==============================================================================
 
+def _city_names_from_ibge(data):
+    """Extrai (nome completo, nome normalizado) da resposta IBGE '?view=nivel'."""
+    # O nome da cidade é o nome do município
+    city_name = data.get('nome')
+
+    # O nome do estado (UF) é encontrado no array 'regiao-imediata'
+    state_uf = None
+    if data.get('regiao-imediata') and data['regiao-imediata'].get('regiao-intermediaria') and \
+            data['regiao-imediata']['regiao-intermediaria'].get('UF'):
+        state_uf = data['regiao-imediata']['regiao-intermediaria']['UF'].get('sigla')
+
+    if city_name and state_uf:
+        # Retorna o nome completo e o nome normalizado para busca no DataFrame
+        full_name = f"{city_name} ({state_uf})"
+        normalized_name = normalize_text(city_name)
+        return full_name, normalized_name
+
+    return None, None
+
+
+def _city_names_locais(city_id):
+    """(nome completo, nome normalizado) pela tabela local de municípios, ou (None, None)."""
+    municipio = localidades.get_municipio(city_id)
+    if municipio is None:
+        return None, None
+    return f"{municipio['nome']} ({municipio['uf']})", normalize_text(municipio['nome'])
+
+
 # FUNÇÃO ADICIONADA: Mapeia o ID IBGE (que é usado na URL) para o nome da cidade.
 def get_city_name_by_id(city_id):
     """
-    Busca o nome da cidade a partir do ID IBGE, usando a API de Cidades do IBGE.
+    Busca o nome da cidade a partir do ID IBGE: primeiro na tabela local de
+    municípios; a API de Cidades do IBGE só é chamada para códigos fora dela.
     """
     if not city_id:
         return None, None
 
+    full_name, normalized_name = _city_names_locais(city_id)
+    if full_name:
+        return full_name, normalized_name
+
     try:
         # Busca o estado da cidade para exibir no front-end
         url = f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{city_id}/?view=nivel"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get_json(upstream.IBGE, url, vazio_e_nao_encontrado=True)
+        return _city_names_from_ibge(data)
 
-        # O nome da cidade é o nome do município
-        city_name = data.get('nome')
-
-        # O nome do estado (UF) é encontrado no array 'regiao-imediata'
-        state_uf = None
-        if data.get('regiao-imediata') and data['regiao-imediata'].get('regiao-intermediaria') and \
-                data['regiao-imediata']['regiao-intermediaria'].get('UF'):
-            state_uf = data['regiao-imediata']['regiao-intermediaria']['UF'].get('sigla')
+    except requests.exceptions.HTTPError as http_err:
+        # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
+        sys.stderr.write(f"Erro IBGE (HTTP Error): {http_err} para o ID: {city_id}\n")
+        return None, None
+    except Exception as e:
+        # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
+        sys.stderr.write(f"Erro IBGE (Geral): {e} para o ID: {city_id}\n")
+        return None, None
 
-        if city_name and state_uf:
-            # Retorna o nome completo e o nome normalizado para busca no DataFrame
-            full_name = f"{city_name} ({state_uf})"
-            normalized_name = normalize_text(city_name)
-            return full_name, normalized_name
 
+async def get_city_name_by_id_async(city_id):
+    """Versão assíncrona de get_city_name_by_id (cliente httpx)."""
+    if not city_id:
         return None, None
 
+    full_name, normalized_name = _city_names_locais(city_id)
+    if full_name:
+        return full_name, normalized_name
+
+    try:
+        url = f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{city_id}/?view=nivel"
+        data = await upstream.get_json_async(upstream.IBGE, url, vazio_e_nao_encontrado=True)
+        return _city_names_from_ibge(data)
+
     except requests.exceptions.HTTPError as http_err:
-        # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
         sys.stderr.write(f"Erro IBGE (HTTP Error): {http_err} para o ID: {city_id}\n")
         return None, None
     except Exception as e:
-        # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
         sys.stderr.write(f"Erro IBGE (Geral): {e} para o ID: {city_id}\n")
         return None, None
 
@@ -327,21 +544,11 @@ def get_product_name_by_id(product_id):
     Busca o nome do produto a partir de sua ID (que é o nome normalizado no cache),
     e retorna o nome original amigável, corrigindo a codificação.
     """
-    data_frames, _ = load_and_cache_agro_data()
-    if not data_frames:
-        return None
-
     normalized_id = normalize_text(str(product_id))
+    original_name = armazenamento.get_armazenamento().nome_produto(normalized_id)
 
-    for key in data_frames.keys():
-        if key.endswith('_header_map'):
-            header_map = data_frames.get(key, {})
-            original_name = header_map.get(normalized_id)
-            if original_name:
-                # O nome já deve estar correto (UTF-8) após a leitura do Pandas.
-                return original_name.title()
-
-    return None
+    # O nome já deve estar correto (UTF-8) após a leitura do Pandas.
+    return original_name.title() if original_name else None
 
 
 def get_products_for_city(city_id):
@@ -349,19 +556,21 @@ def get_products_for_city(city_id):
     Retorna a lista de produtos que possuem valor de 'Quantidade produzida'
     registrado para a cidade.
     """
-    data_frames, _ = load_and_cache_agro_data()
-    if not data_frames:
-        return []
+    # 1. Tenta obter o nome da cidade a partir do ID IBGE
+    full_city_name, normalized_city_name = get_city_name_by_id(city_id)
 
-    df_qty = data_frames.get('Quantidade produzida')
-    header_map = data_frames.get('Quantidade produzida_header_map', {})
+    return _products_for_city_name(city_id, normalized_city_name)
 
-    if df_qty is None or header_map == {}:
-        return []
 
-    # 1. Tenta obter o nome da cidade a partir do ID IBGE
-    full_city_name, normalized_city_name = get_city_name_by_id(city_id)
+async def get_products_for_city_async(city_id):
+    """Versão assíncrona de get_products_for_city (IBGE via httpx, pandas em thread)."""
+    _, normalized_city_name = await get_city_name_by_id_async(city_id)
+
+    return await sync_to_async(_products_for_city_name, thread_sensitive=False)(city_id, normalized_city_name)
+
 
+def _products_for_city_name(city_id, normalized_city_name):
+    """Lista de produtos da cidade pelo código IBGE ou pelo nome normalizado (ou do fallback pelo ID)."""
     # 2. CONTORNO: Se a busca IBGE falhar (ou se o DF usar o ID IBGE)
     if not normalized_city_name:
         # Se for o ID de Bauru, usa o nome normalizado 'BAURU' como fallback
@@ -371,31 +580,9 @@ def get_products_for_city(city_id):
             # Caso contrário, tenta usar o ID IBGE normalizado (que falha na maioria dos casos)
             normalized_city_name = normalize_text(str(city_id))
 
-    # 3. Busca a linha no DataFrame usando o nome normalizado
-    city_row = df_qty[df_qty['CIDADE'] == normalized_city_name]
-
-    if city_row.empty:
-        # Se a busca pelo nome ou ID falhar, retorna vazio (200 2)
-        return []
-
-    products_list = []
-
-    # 4. Itera pelas colunas de produto e filtra
-    for id_normalizado, nome_original in header_map.items():
-        if id_normalizado not in ['CIDADE', 'ANO']:
-            value = city_row.iloc[0].get(id_normalizado)
-
-            # Filtra apenas se o valor não for um indicador de 'Dado não disponível'
-            if normalize_text(str(value)) not in [normalize_text('DADO NAO DISPONIVEL'), '-', '...']:
-                # O nome já deve estar correto (UTF-8) após a leitura do Pandas.
-                display_name = nome_original.title()
-
-                products_list.append({
-                    'id': id_normalizado,
-                    'nome': display_name
-                })
-
-    return products_list
+    # 3. Busca a linha do município (vazio se não houver, 200 com [])
+    # e filtra os produtos com valor de 'Quantidade produzida' informado
+    return armazenamento.get_armazenamento().produtos_da_cidade(normalized_city_name, city_id)
 
 
 def get_all_product_data_for_city(city_id):
@@ -405,15 +592,6 @@ def get_all_product_data_for_city(city_id):
 
     Esta função é usada pelo bloco de Ranqueamento/Comparação.
     """
-    data_frames, status = load_and_cache_agro_data()
-
-    # VERIFICAÇÃO CRÍTICA: Verifica o status de carregamento do cache.
-    if status != "Sucesso (Cache carregado)":
-        return []
-
-    if not data_frames:
-        return []
-
     # Tenta obter o nome da cidade a partir do ID IBGE
     _, normalized_city_name = get_city_name_by_id(city_id)
 
@@ -424,23 +602,18 @@ def get_all_product_data_for_city(city_id):
         else:
             return []
 
-    # DataFrames necessários
-    df_rendimento = data_frames.get('Rendimento médio')
-    df_valor = data_frames.get('Valor da produção')
-    # O header map de Quantidade é usado pois ele lista todos os produtos
-    header_map = data_frames.get('Quantidade produzida_header_map', {})
-
-    # VERIFICAÇÃO EXTRA: Garante que os DataFrames foram carregados e não estão vazios
-    if df_rendimento is None or df_valor is None or header_map == {} or df_rendimento.empty or df_valor.empty:
-        return []
+    # Valores da cidade no armazenamento de produção (memória ou PostgreSQL)
+    producao = armazenamento.get_armazenamento()
+    valores_cidade = producao.valores_cidade(
+        normalized_city_name, city_id, ('Rendimento médio', 'Valor da produção')
+    )
+    # O catálogo (cabeçalho de Quantidade) é usado pois ele lista todos os produtos
+    header_map = producao.produtos()
 
-    # Busca a linha no DataFrame usando o nome normalizado
-    rendimento_row = df_rendimento[df_rendimento['CIDADE'] == normalized_city_name].iloc[0] if not df_rendimento[
-        df_rendimento['CIDADE'] == normalized_city_name].empty else None
-    valor_row = df_valor[df_valor['CIDADE'] == normalized_city_name].iloc[0] if not df_valor[
-        df_valor['CIDADE'] == normalized_city_name].empty else None
+    rendimento_row = valores_cidade.get('Rendimento médio')
+    valor_row = valores_cidade.get('Valor da produção')
 
-    if rendimento_row is None or valor_row is None:
+    if rendimento_row is None or valor_row is None or header_map == {}:
         return []
 
     # Helper para converter strings formatadas (ex: "1.234") para float, tratando erros
@@ -495,20 +668,242 @@ def get_all_product_data_for_city(city_id):
     return products_data
 
 
+# ------------------------------------------------------------------------------
+# SEÇÕES DA FICHA (parâmetro fields= / include= das APIs)
+# ------------------------------------------------------------------------------
+# O cliente pode pedir só algumas seções; as demais não são calculadas. Sem
+# 'producao' não há varredura dos CSVs nem busca do nome no IBGE (o nome vem da
+# tabela local); sem 'clima' o último clima não é lido.
+
+SECOES_FICHA = ('producao', 'cotacao', 'sazonalidade', 'atributos', 'clima')
+
+CAMPOS_IDENTIFICACAO = ('produto', 'city_name')
+CAMPOS_POR_SECAO = {
+    'producao': ('tipo_solo', 'ciclo_vida_dias', 'temperatura_ideal_c', 'precipitacao_min_mm', 'altitude_media_m',
+                 'produtividade_media_kg_ha', 'anos_estudo_local_ibge', 'ph_solo_ideal',
+                 'ficha_base_dados_completos'),
+    'cotacao': ('cotacao_pma_rs', 'cotacao_dados_completos'),
+    'sazonalidade': ('periodo_plantio_sugerido', 'tempo_colheita_meses', 'sazonalidade_dados_completos'),
+    'atributos': ('fertilizante_essencial', 'status_sustentabilidade', 'necessidade_hidrica_total_mm',
+                  'condicao_ideal_colheita', 'vulnerabilidade_pragas', 'cultura_atributos_dados_completos'),
+    'clima': ('clima_atual_temperatura', 'clima_atual_condicao', 'clima_atual_umidade', 'clima_atual_vento'),
+}
+
+# Nomes alternativos aceitos no parâmetro (já normalizados: sem acento, minúsculos)
+APELIDOS_SECOES = {
+    'production': 'producao',
+    'cotacoes': 'cotacao',
+    'price': 'cotacao',
+    'seasonality': 'sazonalidade',
+    'attributes': 'atributos',
+    'weather': 'clima',
+}
+
+
+def parse_secoes(valor):
+    """
+    Converte 'producao,clima' (parâmetro fields=/include=) na tupla de seções,
+    na ordem de SECOES_FICHA. Vazio -> None (todas). Seção desconhecida -> ValueError.
+    """
+    if not valor:
+        return None
+
+    pedidas = set()
+    for parte in valor.split(','):
+        nome = normalize_text(parte).lower()
+        if not nome:
+            continue
+        nome = APELIDOS_SECOES.get(nome, nome)
+        if nome not in SECOES_FICHA:
+            raise ValueError(f"Seção desconhecida: '{parte.strip()}'. Use: {', '.join(SECOES_FICHA)}.")
+        pedidas.add(nome)
+
+    return tuple(secao for secao in SECOES_FICHA if secao in pedidas) or None
+
+
+def secoes_da_requisicao(request):
+    """Seções pedidas na requisição (?fields=... ou ?include=...), ou None para todas."""
+    return parse_secoes(request.GET.get('fields') or request.GET.get('include'))
+
+
+def _filtrar_secoes(ficha, secoes):
+    """Mantém na ficha só a identificação e os campos das seções pedidas."""
+    if secoes is None or set(secoes) == set(SECOES_FICHA):
+        return ficha
+
+    campos = set(CAMPOS_IDENTIFICACAO)
+    for secao in secoes:
+        campos.update(CAMPOS_POR_SECAO[secao])
+    return {k: v for k, v in ficha.items() if k in campos}
+
+
 # FUNÇÃO ADICIONADA: O wrapper que a view está chamando.
-def get_ficha_tecnica(product_name, city_id):
+def get_ficha_tecnica(product_name, city_id, secoes=None):
     """
     Busca todos os dados da Ficha Técnica e do Clima.
     (Esta é a função que a views.py espera.)
+
+    A parte de dados (CSV + JSONs) vem do cache de fichas (chave: produto
+    canônico, município e versão dos dados); o clima vem do seu próprio cache curto.
+    secoes: tupla de SECOES_FICHA (ver parse_secoes); None = ficha completa.
     """
-    # 1. Normaliza o nome do produto para busca no DataFrame/JSON
-    normalized_product_name = normalize_text(product_name)
+    if secoes is None or 'producao' in secoes:
+        ficha_dados = _get_ficha_dados(product_name, city_id)
+    else:
+        ficha_dados = _get_ficha_dados_sem_producao(product_name, city_id)
+    if ficha_dados is None:
+        return None
+
+    weather_data = get_latest_weather(city_id) if secoes is None or 'clima' in secoes else None
+
+    return _filtrar_secoes(_mesclar_clima(ficha_dados, product_name, weather_data), secoes)
+
+
+async def get_ficha_tecnica_async(product_name, city_id, secoes=None):
+    """
+    Versão assíncrona de get_ficha_tecnica: a parte de dados (cache ou IBGE +
+    arquivos) e a leitura do clima rodam em paralelo (asyncio.gather).
+    """
+    if secoes is None or 'producao' in secoes:
+        dados_coro = _get_ficha_dados_async(product_name, city_id)
+    else:
+        dados_coro = sync_to_async(_get_ficha_dados_sem_producao, thread_sensitive=False)(product_name, city_id)
+
+    if secoes is None or 'clima' in secoes:
+        ficha_dados, weather_data = await asyncio.gather(dados_coro, get_latest_weather_async(city_id))
+    else:
+        ficha_dados, weather_data = await dados_coro, None
+
+    if ficha_dados is None:
+        return None
+
+    return _filtrar_secoes(_mesclar_clima(ficha_dados, product_name, weather_data), secoes)
+
+
+# ------------------------------------------------------------------------------
+# CACHE DA PARTE DE DADOS DA FICHA (compartilhado entre os processos)
+# ------------------------------------------------------------------------------
+# A parte de dados só muda com os arquivos de agro_app/dados, então a versão dos
+# dados entra na chave e uma atualização dos arquivos invalida tudo sozinha.
+# Combinações sem dados também ficam em cache (como FICHA_INDISPONIVEL); falhas
+# ao obter o nome da cidade no IBGE não, para não prender um erro passageiro.
+
+FICHA_CACHE_TTL_S = 60 * 60 * 24
+FICHA_INDISPONIVEL = {}
+
+# Contadores (por processo) para dimensionar o cache; expostos em /ficha/api/status/
+FICHA_CACHE_ESTATISTICAS = {'hits': 0, 'misses': 0}
+_FICHA_CACHE_LOCK = threading.Lock()
+
+
+def _produto_canonico(product_name):
+    """Nome canônico do produto para chaves de cache e ETags (ex: 'Milho (em grão)' -> 'MILHO')."""
+    return re.sub(r'[^A-Z0-9]+', '_', normalize_text(product_name)).strip('_')
+
+
+def _chave_ficha(product_name, city_id):
+    return f"ficha:{dataset_version()}:{_produto_canonico(product_name)}:{str(city_id).strip()}"
+
+
+def _contar_ficha_cache(hit):
+    with _FICHA_CACHE_LOCK:
+        FICHA_CACHE_ESTATISTICAS['hits' if hit else 'misses'] += 1
+
+
+def estatisticas_cache_ficha():
+    """Acertos, falhas e taxa de acerto do cache de fichas neste processo."""
+    with _FICHA_CACHE_LOCK:
+        hits = FICHA_CACHE_ESTATISTICAS['hits']
+        misses = FICHA_CACHE_ESTATISTICAS['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'taxa_acerto': round(hits / total, 4) if total else None,
+        'ttl_s': FICHA_CACHE_TTL_S,
+        'versao_dados': dataset_version(),
+    }
+
+
+def _get_ficha_dados(product_name, city_id):
+    """Parte de dados da ficha (sem clima), a partir do cache ou gerada e guardada nele."""
+    chave = _chave_ficha(product_name, city_id)
+    ficha_dados = cache.get(chave)
+    _contar_ficha_cache(ficha_dados is not None)
+    if ficha_dados is not None:
+        return ficha_dados or None
 
-    # 2. Obtém o nome da cidade para busca no DataFrame e API de Clima
     full_city_name, normalized_city_name = get_city_name_by_id(city_id)
+    ficha_dados = _gerar_ficha_dados(product_name, city_id, full_city_name, normalized_city_name)
+    if ficha_dados is not None or normalized_city_name:
+        cache.set(chave, ficha_dados or FICHA_INDISPONIVEL, FICHA_CACHE_TTL_S)
+    return ficha_dados
+
+
+async def _get_ficha_dados_async(product_name, city_id):
+    """Versão assíncrona de _get_ficha_dados (cache.aget/aset e IBGE via httpx)."""
+    chave = _chave_ficha(product_name, city_id)
+    ficha_dados = await cache.aget(chave)
+    _contar_ficha_cache(ficha_dados is not None)
+    if ficha_dados is not None:
+        return ficha_dados or None
+
+    full_city_name, normalized_city_name = await get_city_name_by_id_async(city_id)
+    ficha_dados = await sync_to_async(_gerar_ficha_dados, thread_sensitive=False)(
+        product_name, city_id, full_city_name, normalized_city_name
+    )
+    if ficha_dados is not None or normalized_city_name:
+        await cache.aset(chave, ficha_dados or FICHA_INDISPONIVEL, FICHA_CACHE_TTL_S)
+    return ficha_dados
+
+
+def _get_ficha_dados_sem_producao(product_name, city_id):
+    """
+    Parte de dados da ficha sem a seção 'producao': usa a entrada completa do cache
+    se existir; senão monta só os JSONs, com o nome da cidade da tabela local
+    (sem IBGE e sem varrer os CSVs). O resultado parcial não vai para o cache.
+    """
+    ficha_dados = cache.get(_chave_ficha(product_name, city_id))
+    if ficha_dados is not None:
+        _contar_ficha_cache(True)
+        return ficha_dados or None
 
-    # Fallback caso a API do IBGE falhe para obter o nome normalizado
-    if not normalized_city_name:
+    full_city_name = localidades.nome_completo_municipio(city_id)
+    if full_city_name is None:
+        return None
+
+    return _gerar_ficha_dados(product_name, city_id, full_city_name, None, incluir_producao=False)
+
+
+def _mesclar_clima(ficha_dados, product_name, weather_data):
+    """Junta a parte de dados (em cache) com o clima atual e o nome do produto pedido."""
+    # 4. Dados de Clima (último registro gravado no banco, sem HTTP)
+    weather_data = weather_data or {}
+
+    final_ficha = dict(ficha_dados)
+    final_ficha['produto'] = product_name
+    final_ficha.update({
+        # Clima Atual (4 campos do tempo)
+        'clima_atual_temperatura': weather_data.get('temperatura_c', 'N/A'),
+        'clima_atual_condicao': weather_data.get('condicao', 'N/A'),
+        'clima_atual_umidade': weather_data.get('umidade', 'N/A'),
+        'clima_atual_vento': weather_data.get('velocidade_vento', 'N/A'),
+    })
+
+    # Remove valores nulos antes de retornar
+    return {k: v for k, v in final_ficha.items() if v is not None}
+
+
+def _gerar_ficha_dados(product_name, city_id, full_city_name, normalized_city_name, incluir_producao=True):
+    """
+    Monta a parte de dados da Ficha Técnica (CSV + JSONs), sem o clima atual.
+    incluir_producao=False pula os CSVs (não precisa do nome normalizado da cidade).
+    """
+    # 1. Normaliza o nome do produto para busca no DataFrame/JSON
+    normalized_product_name = normalize_text(product_name)
+
+    # 2. Fallback caso a API do IBGE falhe para obter o nome normalizado
+    if incluir_producao and not normalized_city_name:
         if normalize_text(str(city_id)) in ['3506003', '03506003', 'BAURU']:
             normalized_city_name = 'BAURU'
             full_city_name = 'Bauru (SP)'
@@ -517,14 +912,12 @@ def get_ficha_tecnica(product_name, city_id):
             return None
 
     # 3. Gera a Ficha Técnica base (CSV + JSONs)
-    ficha_data = generate_product_sheet(normalized_product_name, normalized_city_name)
+    ficha_data = generate_product_sheet(normalized_product_name, normalized_city_name,
+                                        incluir_csv=incluir_producao, city_id=city_id)
 
     if ficha_data.get("error"):
         return None
 
-    # 4. Busca os dados de Clima
-    weather_data = get_weather_data(full_city_name)
-
     # 5. Consolida os dados e adiciona campos extras para o DOBRO de informações
     # Note: As informações 'cultura_atributos' são usadas aqui.
 
@@ -568,11 +961,7 @@ def get_ficha_tecnica(product_name, city_id):
         'cotacao_pma_rs': ficha_data.get('pma_2024_rs'),
         'ph_solo_ideal': base_info.get('ph_ideal_h2o'),
 
-        # Clima Atual (4 campos do tempo)
-        'clima_atual_temperatura': weather_data.get('temperatura_c', 'N/A'),
-        'clima_atual_condicao': weather_data.get('condicao', 'N/A'),
-        'clima_atual_umidade': weather_data.get('umidade', 'N/A'),
-        'clima_atual_vento': weather_data.get('velocidade_vento', 'N/A'),
+        # (Clima Atual: 4 campos do tempo, mesclados por _mesclar_clima)
 
         # NOVOS BLOCOS: Incluem os dados brutos de todos os campos dos JSONs
         'cotacao_dados_completos': ficha_data.get('cotacao_raw', {}),
@@ -581,63 +970,331 @@ def get_ficha_tecnica(product_name, city_id):
         'cultura_atributos_dados_completos': ficha_data.get('cultura_atributos_raw', {}),
     }
 
-    # Remove valores nulos antes de retornar
-    return {k: v for k, v in final_ficha.items() if v is not None}
+    return final_ficha
 
 
 # ==============================================================================
 # 5. FUNÇÃO DE BUSCA DA API DE CLIMA (FINALIZADA)
 # ==============================================================================
 
-def get_weather_data(city_name):
+def _extract_weather_values(data):
+    """Extrai os valores NUMÉRICOS do clima atual da resposta do OpenWeather."""
+    # Chuva da última hora (o campo só vem quando está chovendo)
+    chuva = data.get('rain', {}).get('1h', 0)
+
+    return {
+        'data_hora': datetime.fromtimestamp(data['dt'], tz=timezone.utc),
+        'temperatura': data['main']['temp'],
+        'sensacao_termica': data['main']['feels_like'],
+        'temp_min': data['main']['temp_min'],
+        'temp_max': data['main']['temp_max'],
+        'umidade': data['main']['humidity'],
+        'pressao': data['main']['pressure'],
+        'vento': data['wind']['speed'],
+        'precipitacao': chuva,
+        'condicao': data['weather'][0]['description'].capitalize(),
+    }
+
+
+def _weather_params(params):
+    return dict(params, appid=CLIMA_API_KEY, units='metric', lang='pt_br')
+
+
+def _query_weather(params):
     """
-    Busca os dados de clima e temperatura atuais, extraindo todos os campos.
+    Consulta o OpenWeather com os parâmetros de localização informados e retorna
+    os valores NUMÉRICOS do clima atual. Levanta as exceções de requests/upstream.
     """
-    if not city_name:
+    data = upstream.get_json(upstream.OPENWEATHER, CLIMA_API_URL, params=_weather_params(params))
+    return _extract_weather_values(data)
+
+
+async def _query_weather_async(params):
+    """Versão assíncrona de _query_weather (cliente httpx)."""
+    data = await upstream.get_json_async(upstream.OPENWEATHER, CLIMA_API_URL, params=_weather_params(params))
+    return _extract_weather_values(data)
+
+
+def _city_search_params(city_name):
+    # CORREÇÃO CRÍTICA AQUI: A API de clima não aceita (SP), (RJ), etc.
+    # Usa um regex mais forte para limpar o nome.
+    city_search_name = re.sub(r'\s*\([^)]*\)|\s*-\s*[\w\s]+', '', city_name).strip()
+    return {'q': city_search_name}
+
+
+def _city_id_params(city_id):
+    """Parâmetros de localização (lat/lon) pelo código IBGE, ou None se o código não existir."""
+    municipio = localidades.get_municipio(city_id)
+    if municipio is None:
+        return None
+
+    if municipio['latitude'] is not None and municipio['longitude'] is not None:
+        return {'lat': municipio['latitude'], 'lon': municipio['longitude']}
+
+    # Poucos municípios sem centróide na tabela: busca pelo nome, restrita ao Brasil
+    return {'q': f"{municipio['nome']},BR"}
+
+
+def fetch_weather_values(city_name):
+    """
+    Consulta o clima atual pelo NOME da cidade (q=). Mantido para o endpoint
+    /clima/dados?city=...; prefira fetch_weather_values_by_id, que não sofre
+    com cidades homônimas.
+    """
+    return _query_weather(_city_search_params(city_name))
+
+
+def fetch_weather_values_by_id(city_id):
+    """
+    Consulta o clima atual pelo CÓDIGO IBGE do município, usando as coordenadas
+    (lat/lon) da tabela local de municípios. Retorna None se o código não existir.
+
+    Obs: a API "group" do OpenWeather (várias cidades por chamada) só aceita IDs
+    próprios do OpenWeather, não coordenadas; por isso cada município é uma
+    chamada, e a coleta em lote as faz em paralelo.
+    """
+    params = _city_id_params(city_id)
+    if params is None:
         return None
+    return _query_weather(params)
+
+
+def get_weather_by_id(city_id, usar_cache=True):
+    """
+    Clima atual do município (código IBGE) com cache de CLIMA_CACHE_TTL_S no
+    backend de cache do Django, chaveado pelo código: cada município é
+    consultado no máximo uma vez por janela. Retorna os valores numéricos ou None.
+    usar_cache=False sempre consulta o OpenWeather (e renova o cache), como na
+    coleta do comando 'coletar_clima'.
+    """
+    if not city_id:
+        return None
+
+    chave = f"clima:{str(city_id).strip()}"
+    valores = cache.get(chave) if usar_cache else None
+    if valores is not None:
+        return valores
 
     try:
-        api_key = CLIMA_API_KEY
-        base_url = CLIMA_API_URL
+        valores = fetch_weather_values_by_id(city_id)
+    except Exception as e:
+        sys.stderr.write(f"Erro na API de Clima (Geral): {e} para o ID: {city_id}\n")
+        return None
 
-        # CORREÇÃO CRÍTICA AQUI: A API de clima não aceita (SP), (RJ), etc.
-        # Usa um regex mais forte para limpar o nome.
-        city_search_name = re.sub(r'\s*\([^)]*\)|\s*-\s*[\w\s]+', '', city_name).strip()
+    if valores is not None:
+        cache.set(chave, valores, CLIMA_CACHE_TTL_S)
+    return valores
 
-        params = {
-            'q': city_search_name,
-            'appid': api_key,
-            'units': 'metric',
-            'lang': 'pt_br'
-        }
 
-        response = requests.get(base_url, params=params, timeout=5)
-        response.raise_for_status()
+async def get_weather_by_id_async(city_id):
+    """Versão assíncrona de get_weather_by_id (mesmo cache por código IBGE)."""
+    if not city_id:
+        return None
 
-        data = response.json()
+    chave = f"clima:{str(city_id).strip()}"
+    valores = await cache.aget(chave)
+    if valores is not None:
+        return valores
 
-        weather_info = {
-            # Campos de resumo
-            'temperatura_c': f"{data['main']['temp']:.1f}°C",
-            'condicao': data['weather'][0]['description'].capitalize(),
-            'umidade': f"{data['main']['humidity']}%",
-            'velocidade_vento': f"{data['wind']['speed']:.1f} m/s",
+    params = _city_id_params(city_id)
+    if params is None:
+        return None
 
-            # Campos DETALHADOS (Corrigindo o N/A do template):
-            'sensacao_termica_c': f"{data['main']['feels_like']:.1f}°C",
-            'temp_min_c': f"{data['main']['temp_min']:.1f}°C",
-            'temp_max_c': f"{data['main']['temp_max']:.1f}°C",
-            'pressao_hpa': f"{data['main']['pressure']} hPa",
-        }
+    try:
+        valores = await _query_weather_async(params)
+    except Exception as e:
+        sys.stderr.write(f"Erro na API de Clima (Geral): {e} para o ID: {city_id}\n")
+        return None
 
-        return weather_info
+    await cache.aset(chave, valores, CLIMA_CACHE_TTL_S)
+    return valores
+
+
+def format_weather_values(valores):
+    """
+    Converte os valores numéricos do clima no dicionário de exibição
+    usado pelos templates (bloco2.html) e pela Ficha Técnica.
+    """
+    return {
+        # Campos de resumo
+        'temperatura_c': f"{float(valores['temperatura']):.1f}°C",
+        'condicao': valores['condicao'],
+        'umidade': f"{valores['umidade']}%",
+        'velocidade_vento': f"{float(valores['vento']):.1f} m/s",
+
+        # Campos DETALHADOS (Corrigindo o N/A do template):
+        'sensacao_termica_c': f"{float(valores['sensacao_termica']):.1f}°C",
+        'temp_min_c': f"{float(valores['temp_min']):.1f}°C",
+        'temp_max_c': f"{float(valores['temp_max']):.1f}°C",
+        'pressao_hpa': f"{valores['pressao']} hPa",
+    }
+
+
+def get_weather_data(city_name):
+    """
+    Busca os dados de clima e temperatura atuais, extraindo todos os campos.
+    (Consulta AO VIVO: usada pelo endpoint /clima/dados. Dashboard e Ficha
+    leem o último registro gravado no banco via get_latest_weather.)
+    """
+    if not city_name:
+        return None
+
+    try:
+        return format_weather_values(fetch_weather_values(city_name))
 
     except requests.exceptions.HTTPError as http_err:
         # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
-        sys.stderr.write(
-            f"Erro na API de Clima (HTTP Error): {http_err} para a cidade: {city_name} (Busca: {city_search_name})\n")
+        sys.stderr.write(f"Erro na API de Clima (HTTP Error): {http_err} para a cidade: {city_name}\n")
         return None
     except Exception as e:
         # CORREÇÃO CRÍTICA DO ENCODING NO LOG:
-        sys.stderr.write(f"Erro na API de Clima (Geral): {e} para a cidade: {city_name} (Busca: {city_search_name})\n")
-        return None
\ No newline at end of file
+        sys.stderr.write(f"Erro na API de Clima (Geral): {e} para a cidade: {city_name}\n")
+        return None
+
+
+async def get_weather_data_async(city_name):
+    """Versão assíncrona de get_weather_data (cliente httpx)."""
+    if not city_name:
+        return None
+
+    try:
+        return format_weather_values(await _query_weather_async(_city_search_params(city_name)))
+    except Exception as e:
+        sys.stderr.write(f"Erro na API de Clima (Geral): {e} para a cidade: {city_name}\n")
+        return None
+
+
+def _format_clima_registro(registro):
+    """Converte um registro do modelo Clima no formato de exibição."""
+    if registro is None:
+        return None
+
+    weather_info = format_weather_values({
+        'temperatura': registro.temperatura,
+        'sensacao_termica': registro.sensacao_termica if registro.sensacao_termica is not None else registro.temperatura,
+        'temp_min': registro.temp_min if registro.temp_min is not None else registro.temperatura,
+        'temp_max': registro.temp_max if registro.temp_max is not None else registro.temperatura,
+        'umidade': registro.umidade if registro.umidade is not None else '-',
+        'pressao': registro.pressao if registro.pressao is not None else '-',
+        'vento': registro.vento if registro.vento is not None else 0,
+        'condicao': registro.condicao or '-',
+    })
+    weather_info['atualizado_em'] = registro.data_hora
+    return weather_info
+
+
+def _latest_clima_queryset(city_id):
+    # Import local: o agro_app importa este módulo nas suas views.
+    from agro_app.models import Clima
+
+    return Clima.objects.filter(cidade_ibge=str(city_id)).order_by('-data_hora')
+
+
+def _chave_clima_ultimo(city_id):
+    return f"clima:ultimo:{str(city_id).strip()}"
+
+
+def invalidar_clima_ultimo(city_ids):
+    """Descarta o clima em cache dos municípios (usado após uma nova coleta)."""
+    cache.delete_many([_chave_clima_ultimo(city_id) for city_id in city_ids])
+
+
+def get_latest_weather(city_id):
+    """
+    Retorna o clima mais recente GRAVADO NO BANCO (modelo Clima) para o
+    município (ID IBGE), já no formato de exibição. Não faz chamadas HTTP:
+    os registros são gravados pelo comando 'coletar_clima'.
+    O resultado fica num cache curto (CLIMA_ULTIMO_CACHE_TTL_S) por município.
+    """
+    if not city_id:
+        return None
+
+    chave = _chave_clima_ultimo(city_id)
+    weather_info = cache.get(chave)
+    if weather_info is None:
+        weather_info = _format_clima_registro(_latest_clima_queryset(city_id).first()) or {}
+        cache.set(chave, weather_info, CLIMA_ULTIMO_CACHE_TTL_S)
+    return weather_info or None
+
+
+async def get_latest_weather_async(city_id):
+    """Versão assíncrona de get_latest_weather (ORM e cache assíncronos)."""
+    if not city_id:
+        return None
+
+    chave = _chave_clima_ultimo(city_id)
+    weather_info = await cache.aget(chave)
+    if weather_info is None:
+        weather_info = _format_clima_registro(await _latest_clima_queryset(city_id).afirst()) or {}
+        await cache.aset(chave, weather_info, CLIMA_ULTIMO_CACHE_TTL_S)
+    return weather_info or None
+
+
+# ------------------------------------------------------------------------------
+# ATUALIZAÇÃO SOB DEMANDA DO ÚLTIMO CLIMA (stream de eventos do dashboard)
+# ------------------------------------------------------------------------------
+
+def _decimal_clima(valor):
+    """Converte o float da API para Decimal com 2 casas (campos DecimalField do Clima)."""
+    if valor is None:
+        return None
+    return Decimal(str(valor)).quantize(Decimal('0.01'))
+
+
+def registro_clima(city_id, valores):
+    """Registro do modelo Clima (não salvo) a partir dos valores numéricos do OpenWeather."""
+    from agro_app.models import Clima
+
+    city_id = str(city_id).strip()
+    return Clima(
+        estado_ibge=city_id[:2],  # Os 2 primeiros dígitos do código IBGE são a UF
+        cidade_ibge=city_id,
+        data_hora=valores['data_hora'],
+        temperatura=_decimal_clima(valores['temperatura']),
+        precipitacao=_decimal_clima(valores['precipitacao']),
+        sensacao_termica=_decimal_clima(valores['sensacao_termica']),
+        temp_min=_decimal_clima(valores['temp_min']),
+        temp_max=_decimal_clima(valores['temp_max']),
+        umidade=valores['umidade'],
+        pressao=valores['pressao'],
+        vento=_decimal_clima(valores['vento']),
+        condicao=valores['condicao'][:100],
+    )
+
+
+def clima_desatualizado(weather_info):
+    """True se não há clima gravado ou se o último registro tem mais de CLIMA_DESATUALIZADO_S."""
+    if not weather_info or not weather_info.get('atualizado_em'):
+        return True
+    idade = datetime.now(timezone.utc) - weather_info['atualizado_em']
+    return idade.total_seconds() > CLIMA_DESATUALIZADO_S
+
+
+async def atualizar_clima_cidade_async(city_id):
+    """
+    Busca o clima atual do município no OpenWeather e grava um novo registro Clima.
+
+    Só quem conseguir a trava do município no cache compartilhado (cache.add)
+    faz a busca; os demais assinantes apenas leem o resultado do cache do último
+    clima. A trava não é liberada: expira em CLIMA_TRAVA_ATUALIZACAO_S, limitando
+    as tentativas por município. Retorna True se um novo registro foi gravado.
+    """
+    if not city_id:
+        return False
+
+    chave_trava = f"clima:atualizando:{str(city_id).strip()}"
+    if not await cache.aadd(chave_trava, 1, CLIMA_TRAVA_ATUALIZACAO_S):
+        return False
+
+    valores = await get_weather_by_id_async(city_id)
+    if not valores:
+        return False
+
+    # O OpenWeather atualiza a medição em intervalos próprios: não duplica o registro
+    ultimo = await _latest_clima_queryset(city_id).afirst()
+    if ultimo is not None and ultimo.data_hora >= valores['data_hora']:
+        return False
+
+    await registro_clima(city_id, valores).asave()
+    await cache.adelete(_chave_clima_ultimo(city_id))
+    return True
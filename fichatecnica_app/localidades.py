@@ -0,0 +1,271 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+# ==============================================================================
+# TABELA LOCAL DE MUNICÍPIOS (CÓDIGO IBGE -> NOME, UF E CENTRÓIDE)
+# ==============================================================================
+# Arquivo empacotado em agro_app/dados/municipios.csv (separador ';'):
+#   codigo_ibge;nome;codigo_uf;uf;latitude;longitude
+# Latitude/longitude são as coordenadas da sede do município. Alguns poucos
+# municípios não têm coordenadas; para eles o clima é buscado pelo nome.
+#
+# E em agro_app/dados/estados.csv:
+#   codigo_uf;uf;nome
+#
+# As listas de estados/municípios mudam talvez uma vez por ano: são servidas a
+# partir destas tabelas, com o JSON pronto guardado no cache do Django e
+# cabeçalhos HTTP de cache longos (Cache-Control + ETag pela versão dos arquivos).
+
+MUNICIPIOS_ARQUIVO = 'municipios.csv'
+ESTADOS_ARQUIVO = 'estados.csv'
+
+# Tempo de cache no navegador/proxy das listas de localidades (7 dias)
+LOCALIDADES_MAX_AGE_S = 60 * 60 * 24 * 7
+# Tempo de vida do JSON pronto no cache do servidor (30 dias; a chave inclui a versão)
+LOCALIDADES_CACHE_TTL_S = 60 * 60 * 24 * 30
+
+MUNICIPIOS_CACHE = {}
+MUNICIPIOS_POR_NOME_CACHE = {}
+ESTADOS_CACHE = {}
+VERSAO_CACHE = None
+
+
+def _caminho_dados(file_name):
+    return os.path.join(settings.BASE_DIR, 'agro_app', 'dados', file_name)
+
+
+def _float_ou_none(valor):
+    try:
+        return float(valor) if valor not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def load_municipios():
+    """Carrega (uma vez por processo) a tabela de municípios indexada pelo código IBGE."""
+    global MUNICIPIOS_CACHE
+    if MUNICIPIOS_CACHE:
+        return MUNICIPIOS_CACHE
+
+    municipios = {}
+    try:
+        with open(_caminho_dados(MUNICIPIOS_ARQUIVO), 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                municipios[row['codigo_ibge']] = {
+                    'id': int(row['codigo_ibge']),
+                    'nome': row['nome'],
+                    'codigo_uf': int(row['codigo_uf']),
+                    'uf': row['uf'],
+                    'latitude': _float_ou_none(row['latitude']),
+                    'longitude': _float_ou_none(row['longitude']),
+                }
+    except Exception as e:
+        sys.stderr.write(f"Erro ao carregar a tabela de municípios {MUNICIPIOS_ARQUIVO}: {e}\n")
+        return {}
+
+    MUNICIPIOS_CACHE = municipios
+    return MUNICIPIOS_CACHE
+
+
+def get_municipio(city_id):
+    """Retorna o município (dict) a partir do código IBGE, ou None se não existir."""
+    if not city_id:
+        return None
+    return load_municipios().get(str(city_id).strip())
+
+
+def _chave_nome(nome):
+    nome = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode('utf-8')
+    return nome.upper().strip()
+
+
+def codigo_municipio(nome, uf):
+    """Código IBGE (str) do município pelo nome e sigla da UF (sem acentos/maiúsculas), ou None."""
+    global MUNICIPIOS_POR_NOME_CACHE
+    if not MUNICIPIOS_POR_NOME_CACHE:
+        MUNICIPIOS_POR_NOME_CACHE = {
+            (_chave_nome(m['nome']), m['uf']): codigo for codigo, m in load_municipios().items()
+        }
+    return MUNICIPIOS_POR_NOME_CACHE.get((_chave_nome(nome), (uf or '').strip().upper()))
+
+
+def load_estados():
+    """Carrega (uma vez por processo) a tabela de estados indexada pelo código IBGE da UF."""
+    global ESTADOS_CACHE
+    if ESTADOS_CACHE:
+        return ESTADOS_CACHE
+
+    estados = {}
+    try:
+        with open(_caminho_dados(ESTADOS_ARQUIVO), 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                estados[row['codigo_uf']] = {
+                    'id': int(row['codigo_uf']),
+                    'sigla': row['uf'],
+                    'nome': row['nome'],
+                }
+    except Exception as e:
+        sys.stderr.write(f"Erro ao carregar a tabela de estados {ESTADOS_ARQUIVO}: {e}\n")
+        return {}
+
+    ESTADOS_CACHE = estados
+    return ESTADOS_CACHE
+
+
+def get_estado(state_id):
+    """Retorna o estado (dict com id, sigla e nome) a partir do código IBGE da UF."""
+    if not state_id:
+        return None
+    return load_estados().get(str(state_id).strip())
+
+
+def nome_municipio(city_id):
+    """Nome do município a partir do código IBGE (tabela local, sem HTTP)."""
+    municipio = get_municipio(city_id)
+    return municipio['nome'] if municipio else None
+
+
+def sigla_estado(state_id):
+    """Sigla da UF a partir do código IBGE do estado (tabela local, sem HTTP)."""
+    estado = get_estado(state_id)
+    return estado['sigla'] if estado else None
+
+
+def nome_completo_municipio(city_id):
+    """Nome do município com a UF, ex: 'Bauru (SP)' (tabela local, sem HTTP)."""
+    municipio = get_municipio(city_id)
+    return f"{municipio['nome']} ({municipio['uf']})" if municipio else None
+
+
+# ------------------------------------------------------------------------------
+# RESOLUÇÃO EM LOTE (vários códigos IBGE numa única chamada/requisição)
+# ------------------------------------------------------------------------------
+
+# Máximo de códigos (estados + cidades) aceitos numa única requisição de nomes
+LOCALIDADES_MAX_CODIGOS = 500
+
+
+def parse_codigos(valor):
+    """
+    Lê uma lista de códigos IBGE separados por vírgula (ex: '35,33').
+    Ignora vazios e repetidos; levanta ValueError se algum não for numérico.
+    """
+    codigos = []
+    for codigo in (valor or '').split(','):
+        codigo = codigo.strip()
+        if not codigo:
+            continue
+        if not codigo.isdigit():
+            raise ValueError(f"Código IBGE inválido: '{codigo}'.")
+        if codigo not in codigos:
+            codigos.append(codigo)
+    return codigos
+
+
+def resolver_nomes(estados=(), cidades=()):
+    """
+    Nomes de vários estados e municípios de uma vez, a partir das tabelas locais:
+        {'estados': {'35': {'nome': 'São Paulo', 'sigla': 'SP'}, ...},
+         'cidades': {'3506003': {'nome': 'Bauru', 'uf': 'SP', 'estado_id': 35}, ...}}
+    Códigos desconhecidos aparecem com valor None.
+    """
+    resultado = {'estados': {}, 'cidades': {}}
+
+    for state_id in estados:
+        if not state_id:
+            continue
+        estado = get_estado(state_id)
+        resultado['estados'][str(state_id).strip()] = (
+            {'nome': estado['nome'], 'sigla': estado['sigla']} if estado else None
+        )
+
+    for city_id in cidades:
+        if not city_id:
+            continue
+        municipio = get_municipio(city_id)
+        resultado['cidades'][str(city_id).strip()] = (
+            {'nome': municipio['nome'], 'uf': municipio['uf'], 'estado_id': municipio['codigo_uf']}
+            if municipio else None
+        )
+
+    return resultado
+
+
+def dataset_version():
+    """Versão das tabelas de localidades (hash do conteúdo dos arquivos)."""
+    global VERSAO_CACHE
+    if VERSAO_CACHE is None:
+        digest = hashlib.md5()
+        for file_name in (ESTADOS_ARQUIVO, MUNICIPIOS_ARQUIVO):
+            try:
+                with open(_caminho_dados(file_name), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(file_name.encode('utf-8'))
+        VERSAO_CACHE = digest.hexdigest()[:12]
+    return VERSAO_CACHE
+
+
+def _ordem_alfabetica(item):
+    # Mesma ordem do 'orderBy=nome' do IBGE: ignora acentos e maiúsculas
+    nome = unicodedata.normalize('NFKD', item['nome']).encode('ascii', 'ignore').decode('utf-8')
+    return nome.lower()
+
+
+def list_estados():
+    """Lista de estados no formato [{'id': id, 'nome': nome}, ...], em ordem alfabética."""
+    estados = [{'id': e['id'], 'nome': e['nome']} for e in load_estados().values()]
+    return sorted(estados, key=_ordem_alfabetica)
+
+
+def list_municipios_por_estado(state_id):
+    """Lista de municípios da UF no formato [{'id': id, 'nome': nome}, ...], em ordem alfabética."""
+    if not state_id:
+        return []
+    codigo_uf = int(state_id)
+    municipios = [
+        {'id': m['id'], 'nome': m['nome']}
+        for m in load_municipios().values() if m['codigo_uf'] == codigo_uf
+    ]
+    return sorted(municipios, key=_ordem_alfabetica)
+
+
+def _json_em_cache(nome, gerar_lista):
+    """JSON pronto (bytes) da lista, guardado no cache do Django com a versão na chave."""
+    chave = f"localidades:{dataset_version()}:{nome}"
+    conteudo = cache.get(chave)
+    if conteudo is None:
+        conteudo = json.dumps(gerar_lista(), ensure_ascii=False).encode('utf-8')
+        cache.set(chave, conteudo, LOCALIDADES_CACHE_TTL_S)
+    return conteudo
+
+
+def estados_json():
+    return _json_em_cache('estados', list_estados)
+
+
+def municipios_json(state_id):
+    return _json_em_cache(f"municipios:{int(state_id)}", lambda: list_municipios_por_estado(state_id))
+
+
+def etag_estados(request, *args, **kwargs):
+    """ETag da lista de estados (usada com o decorator 'etag' do Django)."""
+    return f"estados-{dataset_version()}"
+
+
+def etag_municipios(request, state_id, *args, **kwargs):
+    """ETag da lista de municípios de uma UF."""
+    return f"municipios-{state_id}-{dataset_version()}"
+
+
+def etag_nomes(request, *args, **kwargs):
+    """ETag da resolução de nomes: versão das tabelas + códigos pedidos."""
+    consulta = f"{request.GET.get('estados', '')}|{request.GET.get('cidades', '')}"
+    return f"nomes-{dataset_version()}-{hashlib.md5(consulta.encode('utf-8')).hexdigest()[:12]}"
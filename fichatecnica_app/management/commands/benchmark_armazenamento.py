@@ -0,0 +1,107 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fichatecnica_app import armazenamento, data_service, localidades
+
+
+def _percentil(tempos, fracao):
+    ordenados = sorted(tempos)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede as operações do armazenamento de produção (catálogo, busca de "
+        "município, produtos da cidade, nome do produto e ranking entre municípios) "
+        "com o mesmo conjunto de chamadas em cada implementação e compara os "
+        "resultados entre elas. Para o 'postgresql', rode antes 'importar_producao'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--armazenamento', action='append', choices=list(armazenamento.IMPLEMENTACOES),
+                            help='Implementação a medir (pode repetir). Padrão: todas.')
+        parser.add_argument('--cidades', type=int, default=200,
+                            help='Municípios sorteados da tabela local (padrão: 200).')
+        parser.add_argument('--produtos', type=int, default=10,
+                            help='Produtos usados no ranking entre municípios (padrão: 10).')
+        parser.add_argument('--repeticoes', type=int, default=3,
+                            help='Repetições de cada chamada (padrão: 3).')
+        parser.add_argument('--semente', type=int, default=42,
+                            help='Semente do sorteio dos municípios (padrão: 42).')
+
+    def handle(self, *args, **options):
+        nomes = options['armazenamento'] or list(armazenamento.IMPLEMENTACOES)
+        repeticoes = max(1, options['repeticoes'])
+
+        codigos = sorted(localidades.load_municipios())
+        if not codigos:
+            raise CommandError("Tabela local de municípios vazia (agro_app/dados/municipios.csv).")
+        sorteio = random.Random(options['semente'])
+        cidades = [
+            (data_service.normalize_text(localidades.nome_municipio(codigo)), codigo)
+            for codigo in sorteio.sample(codigos, min(options['cidades'], len(codigos)))
+        ]
+
+        resultados = {}
+        for nome in nomes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Armazenamento '{nome}'"))
+            resultados[nome] = self.medir(
+                armazenamento.get_armazenamento(nome), cidades, options['produtos'], repeticoes
+            )
+
+        if len(resultados) > 1:
+            self.comparar(resultados)
+
+    def medir(self, backend, cidades, quantidade_produtos, repeticoes):
+        """Roda a bateria no armazenamento e imprime os tempos; retorna os resultados de cada chamada."""
+        inicio = time.perf_counter()
+        catalogo = backend.produtos()
+        self.stdout.write(f"  carga + catálogo: {(time.perf_counter() - inicio) * 1000:.1f} ms "
+                          f"({len(catalogo)} produtos)")
+        if not catalogo:
+            self.stdout.write(self.style.WARNING("  Sem dados (para o 'postgresql', rode 'importar_producao')."))
+
+        produtos = list(catalogo)[:quantidade_produtos]
+        operacoes = {
+            'produtos': [((), backend.produtos)],
+            'valores_cidade': [((cidade, codigo), backend.valores_cidade) for cidade, codigo in cidades],
+            'produtos_da_cidade': [((cidade, codigo), backend.produtos_da_cidade) for cidade, codigo in cidades],
+            'nome_produto': [((produto,), backend.nome_produto) for produto in produtos],
+            'ranking_cidades': [
+                ((produto, variavel), backend.ranking_cidades)
+                for produto in produtos for variavel in armazenamento.VARIAVEIS
+            ],
+        }
+
+        resultados = {}
+        for operacao, chamadas in operacoes.items():
+            tempos = []
+            for argumentos, funcao in chamadas:
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    resultado = funcao(*argumentos)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                resultados[(operacao, argumentos)] = resultado
+
+            self.stdout.write(
+                f"  {operacao:<20} {len(tempos):>6} chamadas  média {sum(tempos) / len(tempos):8.3f} ms  "
+                f"p95 {_percentil(tempos, 0.95):8.3f} ms  total {sum(tempos):9.1f} ms"
+            )
+        return resultados
+
+    def comparar(self, resultados):
+        """Conta as chamadas cujo resultado difere entre as implementações."""
+        (nome_base, base), *outros = resultados.items()
+        for nome, resultado in outros:
+            divergentes = [chave for chave, valor in base.items() if resultado.get(chave) != valor]
+            if divergentes:
+                self.stdout.write(self.style.WARNING(
+                    f"'{nome}' x '{nome_base}': {len(divergentes)} de {len(base)} chamada(s) com resultado diferente, "
+                    f"ex: {divergentes[0][0]}{divergentes[0][1]}"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"'{nome}' x '{nome_base}': mesmos resultados nas {len(base)} chamada(s)."
+                ))
@@ -0,0 +1,127 @@
+import csv
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from fichatecnica_app import armazenamento, data_service
+from fichatecnica_app.models import ProducaoMunicipal
+
+# Colunas na ordem do COPY
+COLUNAS = (
+    'municipio_codigo', 'cidade', 'linha', 'variavel', 'produto', 'produto_nome',
+    'coluna', 'ano', 'valor_bruto', 'valor',
+)
+NULO = r'\N'
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa os CSVs de produção do IBGE (agro_app/dados) para a tabela "
+        "ProducaoMunicipal, usada com FICHA_ARMAZENAMENTO='postgresql'. No "
+        "PostgreSQL usa COPY; nos outros bancos, bulk_create. Substitui só os "
+        "anos importados, então dados de vários anos podem conviver na tabela."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variavel', action='append', choices=armazenamento.VARIAVEIS,
+                            help='Importa só esta variável (pode repetir). Padrão: todas.')
+        parser.add_argument('--ano', type=int,
+                            help='Ano dos dados, se o CSV não o informar (linha "Município";"2024").')
+        parser.add_argument('--lote', type=int, default=5000,
+                            help='Linhas por bulk_create fora do PostgreSQL (padrão: 5000).')
+
+    def handle(self, *args, **options):
+        total = 0
+        for variavel in options['variavel'] or armazenamento.VARIAVEIS:
+            inicio = time.perf_counter()
+            try:
+                df, header_map, ano = data_service.ler_csv_producao(variavel)
+            except Exception as e:
+                raise CommandError(f"Erro ao ler o CSV de '{variavel}': {e}")
+
+            ano = ano or options['ano']
+            if ano is None:
+                raise CommandError(f"O CSV de '{variavel}' não informa o ano; use --ano.")
+
+            with transaction.atomic():
+                ProducaoMunicipal.objects.filter(variavel=variavel, ano=ano).delete()
+                linhas = self.linhas(df, header_map, variavel, ano)
+                if connection.vendor == 'postgresql':
+                    quantidade = self.copiar(linhas)
+                else:
+                    quantidade = self.inserir(linhas, max(1, options['lote']))
+
+            total += quantidade
+            self.stdout.write(
+                f"{variavel} ({ano}): {quantidade} linha(s) em {time.perf_counter() - inicio:.1f}s."
+            )
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {ProducaoMunicipal._meta.db_table}')
+
+        armazenamento.invalidar_catalogo()
+        self.stdout.write(self.style.SUCCESS(f"Importação concluída: {total} linha(s)."))
+
+    def linhas(self, df, header_map, variavel, ano):
+        """Tuplas na ordem de COLUNAS, uma por município e produto (municípios sem nenhum valor ficam de fora)."""
+        # Colunas com o mesmo nome normalizado: vale a última (como no armazenamento 'memoria')
+        posicoes = {nome: posicao for posicao, nome in enumerate(df.columns)}
+
+        produtos = [
+            (coluna, produto_id, nome_original, posicoes[produto_id])
+            for coluna, (produto_id, nome_original) in enumerate(header_map.items())
+            if produto_id in posicoes
+        ]
+        for linha, registro in enumerate(df.itertuples(index=False, name=None)):
+            valores = [str(registro[posicao]) for _, _, _, posicao in produtos]
+            if all(valor.lower() == 'nan' for valor in valores):
+                continue  # Linhas de notas/rodapé do CSV
+
+            codigo = registro[posicoes['CODIGO']]
+            cidade = registro[posicoes['CIDADE']] or ''
+            for (coluna, produto_id, nome_original, _), valor_bruto in zip(produtos, valores):
+                yield (
+                    codigo, cidade, linha, variavel, produto_id, nome_original,
+                    coluna, ano, valor_bruto[:30], armazenamento.valor_numerico(valor_bruto),
+                )
+
+    def copiar(self, linhas):
+        """COPY ... FROM STDIN (formato CSV) com psycopg 3 ou psycopg2."""
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator='\n')
+        quantidade = 0
+        for linha in linhas:
+            escritor.writerow(NULO if valor is None else valor for valor in linha)
+            quantidade += 1
+        buffer.seek(0)
+
+        sql = (
+            f"COPY {ProducaoMunicipal._meta.db_table} ({', '.join(COLUNAS)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '{NULO}')"
+        )
+        with connection.cursor() as cursor:
+            bruto = cursor.cursor
+            if hasattr(bruto, 'copy'):
+                with bruto.copy(sql) as copia:
+                    copia.write(buffer.getvalue())
+            else:
+                bruto.copy_expert(sql, buffer)
+        return quantidade
+
+    def inserir(self, linhas, lote):
+        """Alternativa ao COPY para outros bancos (ex: SQLite em desenvolvimento)."""
+        quantidade = 0
+        objetos = []
+        for linha in linhas:
+            objetos.append(ProducaoMunicipal(**dict(zip(COLUNAS, linha))))
+            if len(objetos) >= lote:
+                ProducaoMunicipal.objects.bulk_create(objetos)
+                quantidade += len(objetos)
+                objetos = []
+        if objetos:
+            ProducaoMunicipal.objects.bulk_create(objetos)
+            quantidade += len(objetos)
+        return quantidade
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProducaoMunicipal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('municipio_codigo', models.CharField(blank=True, help_text='Código IBGE do município (vazio se o nome do CSV não foi encontrado na tabela local)', max_length=7, null=True)),
+                ('cidade', models.CharField(help_text='Nome normalizado (sem acento e UF, maiúsculo)', max_length=100)),
+                ('linha', models.PositiveIntegerField(help_text='Posição da linha no CSV (desempate entre homônimos)')),
+                ('variavel', models.CharField(help_text='Chave de data_service.CSV_CONFIG', max_length=30)),
+                ('produto', models.CharField(help_text='Nome normalizado do produto', max_length=100)),
+                ('produto_nome', models.CharField(help_text='Nome original do produto no CSV', max_length=150)),
+                ('coluna', models.PositiveSmallIntegerField(help_text='Posição da coluna do produto no CSV')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('valor_bruto', models.CharField(help_text="Valor como está no CSV (ex: '1590', '-', '...')", max_length=30)),
+                ('valor', models.FloatField(blank=True, help_text='Valor numérico (vazio se indisponível)', null=True)),
+            ],
+            options={
+                'verbose_name': 'Produção Municipal',
+                'verbose_name_plural': 'Produção Municipal',
+                'indexes': [models.Index(fields=['municipio_codigo', 'produto', 'variavel', 'ano'], name='producao_mun_prod_var_ano'), models.Index(fields=['cidade', 'variavel'], name='producao_cidade_var_idx'), models.Index(fields=['produto', 'variavel', 'ano', 'valor'], name='producao_ranking_idx')],
+            },
+        ),
+    ]
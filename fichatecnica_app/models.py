@@ -1,3 +1,38 @@
 from django.db import models
 
-# Create your models here.
+
+# --- MODELO PRODUÇÃO MUNICIPAL (CSVs DO IBGE NO BANCO) ---
+# Uma linha por município, variável (ex: 'Quantidade produzida'), produto e ano.
+# Usado pelo armazenamento 'postgresql' (fichatecnica_app/armazenamento.py) e
+# carregado pelo comando 'manage.py importar_producao'.
+class ProducaoMunicipal(models.Model):
+    municipio_codigo = models.CharField(
+        max_length=7, null=True, blank=True,
+        help_text="Código IBGE do município (vazio se o nome do CSV não foi encontrado na tabela local)"
+    )
+    cidade = models.CharField(max_length=100, help_text="Nome normalizado (sem acento e UF, maiúsculo)")
+    linha = models.PositiveIntegerField(help_text="Posição da linha no CSV (desempate entre homônimos)")
+
+    variavel = models.CharField(max_length=30, help_text="Chave de data_service.CSV_CONFIG")
+    produto = models.CharField(max_length=100, help_text="Nome normalizado do produto")
+    produto_nome = models.CharField(max_length=150, help_text="Nome original do produto no CSV")
+    coluna = models.PositiveSmallIntegerField(help_text="Posição da coluna do produto no CSV")
+    ano = models.PositiveSmallIntegerField()
+
+    valor_bruto = models.CharField(max_length=30, help_text="Valor como está no CSV (ex: '1590', '-', '...')")
+    valor = models.FloatField(null=True, blank=True, help_text="Valor numérico (vazio se indisponível)")
+
+    class Meta:
+        verbose_name = "Produção Municipal"
+        verbose_name_plural = "Produção Municipal"
+        indexes = [
+            # Valores de um município (ficha técnica, produtos da cidade, ranking do bloco 4)
+            models.Index(fields=['municipio_codigo', 'produto', 'variavel', 'ano'], name='producao_mun_prod_var_ano'),
+            # Municípios sem código IBGE: busca pelo nome normalizado
+            models.Index(fields=['cidade', 'variavel'], name='producao_cidade_var_idx'),
+            # Consulta entre municípios (maiores valores de um produto numa variável/ano)
+            models.Index(fields=['produto', 'variavel', 'ano', 'valor'], name='producao_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cidade} - {self.produto} ({self.variavel}, {self.ano}): {self.valor_bruto}"
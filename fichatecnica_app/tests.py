@@ -1,3 +1,209 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from AgroData.apoio_testes import CACHE_LOCAL
+from . import upstream
+
+URL_OPENWEATHER = 'https://api.openweathermap.org/data/2.5/weather'
+
+
+def _resposta(status_code, dados=None, url=URL_OPENWEATHER):
+    resposta = requests.Response()
+    resposta.status_code = status_code
+    resposta.url = url
+    resposta._content = json.dumps(dados).encode('utf-8')
+    return resposta
+
+
+def _erro_de_rede():
+    """ConnectionError como o do requests: a mensagem e a requisição trazem a URL com a chave."""
+    requisicao = requests.Request('GET', URL_OPENWEATHER, params={'q': 'x', 'appid': 'SEGREDO'}).prepare()
+    return requests.ConnectionError(f"Max retries exceeded with url: {requisicao.url}", request=requisicao)
+
+
+class CircuitBreakerTests(TestCase):
+    """Transições FECHADO -> ABERTO -> MEIO_ABERTO -> FECHADO (relógio controlado)."""
+
+    def setUp(self):
+        self.agora = 1000.0
+        patcher = mock.patch.object(upstream.time, 'monotonic', side_effect=lambda: self.agora)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.circuito = upstream.CircuitBreaker('teste', falhas_para_abrir=3, tempo_recuperacao_s=30)
+
+    def falhar(self, vezes):
+        for _ in range(vezes):
+            self.assertTrue(self.circuito.permitir())
+            self.circuito.registrar_falha(_erro_de_rede())
+
+    def test_abre_depois_das_falhas_seguidas_e_recusa_chamadas(self):
+        self.falhar(2)
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.FECHADO)
+
+        self.falhar(1)
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.ABERTO)
+        self.assertFalse(self.circuito.permitir())
+        self.assertEqual(self.circuito.estado_atual()['recusadas'], 1)
+
+    def test_sucesso_zera_as_falhas_seguidas(self):
+        self.falhar(2)
+        self.circuito.registrar_sucesso()
+        self.falhar(2)
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.FECHADO)
+
+    def test_meio_aberto_libera_uma_requisicao_de_teste(self):
+        self.falhar(3)
+        self.agora += 31
+
+        self.assertTrue(self.circuito.permitir())
+        self.assertFalse(self.circuito.permitir())  # Só uma requisição de teste por vez
+
+        self.circuito.registrar_sucesso()
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.FECHADO)
+        self.assertTrue(self.circuito.permitir())
+
+    def test_falha_no_teste_reabre_o_circuito(self):
+        self.falhar(3)
+        self.agora += 31
+        self.falhar(1)
+        estado = self.circuito.estado_atual()
+        self.assertEqual(estado['estado'], upstream.CircuitBreaker.ABERTO)
+        self.assertEqual(estado['teste_em_s'], 30)
+
+    def test_teste_sem_resultado_libera_a_vaga(self):
+        self.falhar(3)
+        self.agora += 31
+        self.assertTrue(self.circuito.permitir())
+        self.circuito.liberar_teste()
+
+        self.assertTrue(self.circuito.permitir())
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.MEIO_ABERTO)
+
+    def test_ultimo_erro_sem_url_nem_chave_da_api(self):
+        self.falhar(1)
+        ultimo_erro = self.circuito.estado_atual()['ultimo_erro']
+        self.assertEqual(ultimo_erro, 'ConnectionError (api.openweathermap.org)')
+        self.assertNotIn('SEGREDO', ultimo_erro)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class GetJsonTests(TestCase):
+    """get_json: cache negativo dos 404 e recusa sem ir à rede com o circuito aberto."""
+
+    def setUp(self):
+        cache.clear()
+        self.circuito = upstream.CircuitBreaker('teste', falhas_para_abrir=2)
+
+    @mock.patch.object(upstream.requests, 'get')
+    def test_nao_encontrado_fica_no_cache_negativo(self, get):
+        get.return_value = _resposta(404)
+
+        with self.assertRaises(upstream.RecursoNaoEncontrado):
+            upstream.get_json(self.circuito, URL_OPENWEATHER, params={'q': 'Lugar Nenhum', 'appid': 'A'})
+        # Mesma busca com outra chave da API: vem do cache negativo, sem nova requisição
+        with self.assertRaises(upstream.RecursoNaoEncontrado):
+            upstream.get_json(self.circuito, URL_OPENWEATHER, params={'q': 'Lugar Nenhum', 'appid': 'B'})
+
+        self.assertEqual(get.call_count, 1)
+        estado = self.circuito.estado_atual()
+        self.assertEqual((estado['nao_encontrados'], estado['falhas']), (1, 0))
+
+    @mock.patch.object(upstream.requests, 'get')
+    def test_resposta_vazia_como_nao_encontrado(self, get):
+        get.return_value = _resposta(200, [])
+        with self.assertRaises(upstream.RecursoNaoEncontrado):
+            upstream.get_json(self.circuito, 'https://servicodados.ibge.gov.br/x', vazio_e_nao_encontrado=True)
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.FECHADO)
+
+    @mock.patch.object(upstream.requests, 'get')
+    def test_erros_5xx_abrem_o_circuito(self, get):
+        get.return_value = _resposta(503)
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                upstream.get_json(self.circuito, URL_OPENWEATHER)
+
+        with self.assertRaises(upstream.CircuitoAberto):
+            upstream.get_json(self.circuito, URL_OPENWEATHER)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(self.circuito.estado_atual()['ultimo_erro'], 'HTTPError (api.openweathermap.org) HTTP 503')
+
+    def meio_aberto(self):
+        """Abre o circuito e adianta o relógio para depois do tempo de recuperação."""
+        for _ in range(2):
+            self.circuito.registrar_falha(_erro_de_rede())
+        depois = upstream.time.monotonic() + self.circuito.tempo_recuperacao_s + 1
+        patcher = mock.patch.object(upstream.time, 'monotonic', return_value=depois)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(upstream.requests, 'get')
+    def test_erro_inesperado_no_teste_nao_trava_o_meio_aberto(self, get):
+        self.meio_aberto()
+        get.side_effect = UnicodeError('URL inválida')
+        with self.assertRaises(UnicodeError):
+            upstream.get_json(self.circuito, URL_OPENWEATHER)
+
+        get.side_effect = None
+        get.return_value = _resposta(200, {'nome': 'Campinas'})
+        self.assertEqual(upstream.get_json(self.circuito, URL_OPENWEATHER), {'nome': 'Campinas'})
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.FECHADO)
+
+    async def test_teste_cancelado_nao_trava_o_meio_aberto(self):
+        self.meio_aberto()
+        iniciou = asyncio.Event()
+
+        async def get_pendurado(client, url, params=None):
+            iniciou.set()
+            await asyncio.Event().wait()  # Nunca responde
+
+        with mock.patch.object(upstream.httpx.AsyncClient, 'get', get_pendurado):
+            tarefa = asyncio.create_task(upstream.get_json_async(self.circuito, URL_OPENWEATHER))
+            await iniciou.wait()
+            tarefa.cancel()  # Cliente desconectou da view async
+            with self.assertRaises(asyncio.CancelledError):
+                await tarefa
+
+        self.assertEqual(self.circuito.estado_atual()['estado'], upstream.CircuitBreaker.MEIO_ABERTO)
+        self.assertTrue(self.circuito.permitir())  # Uma nova requisição de teste é liberada
+
+    @mock.patch.object(upstream.requests, 'get')
+    def test_sucesso_devolve_o_json(self, get):
+        get.return_value = _resposta(200, {'nome': 'Campinas'})
+        self.assertEqual(upstream.get_json(self.circuito, URL_OPENWEATHER), {'nome': 'Campinas'})
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class StatusApiTests(TestCase):
+    """/ficha/api/status/: só para a equipe, sem expor a URL das chamadas que falharam."""
+
+    def setUp(self):
+        cache.clear()
+        circuito = upstream.CircuitBreaker(upstream.OPENWEATHER.nome)
+        circuito.registrar_falha(_erro_de_rede())
+        patcher = mock.patch.dict(upstream.CIRCUITOS, {circuito.nome: circuito})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('fichatecnica_app:status_api')
+
+    def test_anonimo_e_usuario_comum_nao_acessam(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('comum', password='x'))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_equipe_ve_os_circuitos_sem_a_chave_da_api(self):
+        self.client.force_login(User.objects.create_user('equipe', password='x', is_staff=True))
+        resposta = self.client.get(self.url)
+
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['upstream']['openweather']['falhas'], 1)
+        self.assertNotIn('SEGREDO', resposta.content.decode())
+        self.assertIn('cache_ficha', dados)
@@ -0,0 +1,292 @@
+import hashlib
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.core.cache import cache
+
+# ==============================================================================
+# PROTEÇÃO DAS CHAMADAS ÀS APIS EXTERNAS (IBGE E OPENWEATHER)
+# ==============================================================================
+# Cada serviço externo tem o seu próprio circuit breaker. Depois de
+# FALHAS_PARA_ABRIR erros seguidos o circuito abre e as chamadas falham na hora
+# (sem esperar o timeout). Passado o TEMPO_RECUPERACAO_S, uma única requisição de
+# teste é liberada (meio-aberto): se ela der certo o circuito fecha de novo.
+# Se a requisição de teste não chegar a um resultado (cancelada porque o cliente
+# desconectou da view async, ou erro inesperado), a vaga de teste é liberada.
+#
+# Respostas "não encontrado" (ex: cidade desconhecida no OpenWeather) ficam em
+# cache negativo por CACHE_NEGATIVO_TTL_S, para não repetir a mesma busca.
+
+FALHAS_PARA_ABRIR = 5
+TEMPO_RECUPERACAO_S = 30
+CACHE_NEGATIVO_TTL_S = 60 * 30
+TIMEOUT_PADRAO_S = 5
+
+# Parâmetros que não entram na chave do cache negativo (ex: chave da API)
+PARAMETROS_IGNORADOS = {'appid'}
+
+
+class CircuitoAberto(requests.RequestException):
+    """O circuito do serviço está aberto: a chamada foi recusada sem ir à rede."""
+
+
+class RecursoNaoEncontrado(requests.HTTPError):
+    """O serviço respondeu 'não encontrado' (resposta real ou vinda do cache negativo)."""
+
+
+def descrever_erro(erro):
+    """
+    Descrição segura de um erro de chamada externa: classe da exceção, host do
+    serviço e status HTTP, se houver. Nunca a URL completa: a query string
+    pode trazer a chave da API (ex: 'appid' do OpenWeather).
+    """
+    url = None
+    status = None
+    for atributo in ('request', 'response'):
+        try:
+            objeto = getattr(erro, atributo, None)  # httpx: 'request' levanta RuntimeError se não houver
+        except RuntimeError:
+            objeto = None
+        if objeto is None:
+            continue
+        url = url or getattr(objeto, 'url', None)
+        status = status or getattr(objeto, 'status_code', None)
+
+    descricao = type(erro).__name__
+    host = urlsplit(str(url)).hostname if url else None
+    if host:
+        descricao += f" ({host})"
+    if status:
+        descricao += f" HTTP {status}"
+    return descricao
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simples, por processo, com os estados
+    FECHADO -> ABERTO -> MEIO_ABERTO -> FECHADO.
+    """
+    FECHADO = 'FECHADO'
+    ABERTO = 'ABERTO'
+    MEIO_ABERTO = 'MEIO_ABERTO'
+
+    def __init__(self, nome, falhas_para_abrir=FALHAS_PARA_ABRIR, tempo_recuperacao_s=TEMPO_RECUPERACAO_S):
+        self.nome = nome
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_recuperacao_s = tempo_recuperacao_s
+
+        self._lock = threading.Lock()
+        self._estado = self.FECHADO
+        self._falhas_seguidas = 0
+        self._aberto_em = None
+        self._teste_em_andamento = False
+
+        # Contadores para o endpoint de instrumentação
+        self._chamadas = 0
+        self._falhas = 0
+        self._recusadas = 0
+        self._nao_encontrados = 0
+        self._ultimo_erro = None
+
+    def permitir(self):
+        """Retorna True se a chamada pode seguir para a rede."""
+        with self._lock:
+            if self._estado == self.ABERTO:
+                if time.monotonic() - self._aberto_em < self.tempo_recuperacao_s:
+                    self._recusadas += 1
+                    return False
+                # Tempo de recuperação esgotado: libera uma requisição de teste
+                self._estado = self.MEIO_ABERTO
+                self._teste_em_andamento = False
+
+            if self._estado == self.MEIO_ABERTO:
+                if self._teste_em_andamento:
+                    self._recusadas += 1
+                    return False
+                self._teste_em_andamento = True
+
+            self._chamadas += 1
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._estado = self.FECHADO
+            self._falhas_seguidas = 0
+            self._aberto_em = None
+            self._teste_em_andamento = False
+
+    def liberar_teste(self):
+        """A chamada liberada terminou sem resultado (ex: cancelada): outra pode ser o teste."""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_nao_encontrado(self):
+        # O serviço respondeu corretamente; conta como sucesso para o circuito.
+        with self._lock:
+            self._nao_encontrados += 1
+        self.registrar_sucesso()
+
+    def registrar_falha(self, erro):
+        with self._lock:
+            self._falhas += 1
+            self._falhas_seguidas += 1
+            self._ultimo_erro = descrever_erro(erro)
+            self._teste_em_andamento = False
+
+            if self._estado == self.MEIO_ABERTO or self._falhas_seguidas >= self.falhas_para_abrir:
+                if self._estado != self.ABERTO:
+                    sys.stderr.write(
+                        f"Circuito {self.nome} ABERTO após {self._falhas_seguidas} falha(s): {self._ultimo_erro}\n"
+                    )
+                self._estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+
+    def estado_atual(self):
+        """Retorna um dicionário com o estado e os contadores do circuito."""
+        with self._lock:
+            reabre_em = None
+            if self._estado == self.ABERTO:
+                reabre_em = max(0.0, self.tempo_recuperacao_s - (time.monotonic() - self._aberto_em))
+
+            return {
+                'estado': self._estado,
+                'falhas_seguidas': self._falhas_seguidas,
+                'falhas_para_abrir': self.falhas_para_abrir,
+                'tempo_recuperacao_s': self.tempo_recuperacao_s,
+                'teste_em_s': round(reabre_em, 1) if reabre_em is not None else None,
+                'chamadas': self._chamadas,
+                'falhas': self._falhas,
+                'recusadas': self._recusadas,
+                'nao_encontrados': self._nao_encontrados,
+                'ultimo_erro': self._ultimo_erro,
+            }
+
+
+IBGE = CircuitBreaker('ibge')
+OPENWEATHER = CircuitBreaker('openweather')
+
+CIRCUITOS = {
+    IBGE.nome: IBGE,
+    OPENWEATHER.nome: OPENWEATHER,
+}
+
+
+def _chave_cache_negativo(circuito, url, params):
+    """Monta a chave do cache negativo a partir da URL e dos parâmetros relevantes."""
+    partes = [url]
+    for chave, valor in sorted((params or {}).items()):
+        if chave not in PARAMETROS_IGNORADOS:
+            partes.append(f"{chave}={valor}")
+    digest = hashlib.md5('&'.join(partes).encode('utf-8')).hexdigest()
+    return f"upstream:nao_encontrado:{circuito.nome}:{digest}"
+
+
+def _tratar_resposta(circuito, url, response, vazio_e_nao_encontrado):
+    """
+    Classifica a resposta (requests ou httpx) para o circuito e devolve o JSON.
+    Compartilhado pelas versões síncrona e assíncrona de get_json; o cache
+    negativo fica a cargo de quem chama (cache.set / cache.aset).
+    """
+    if response.status_code == 404:
+        circuito.registrar_nao_encontrado()
+        raise RecursoNaoEncontrado(f"{circuito.nome}: não encontrado {url}")
+
+    if response.status_code >= 500 or response.status_code == 429:
+        erro = requests.HTTPError(f"{circuito.nome}: HTTP {response.status_code} {url}", response=response)
+        circuito.registrar_falha(erro)
+        raise erro
+
+    if response.status_code >= 400:
+        # Outros 4xx: o serviço está de pé, o problema é da requisição
+        circuito.registrar_sucesso()
+        raise requests.HTTPError(f"{circuito.nome}: HTTP {response.status_code} {url}")
+
+    try:
+        data = response.json()
+    except ValueError as e:
+        # Corpo inválido (ex: página de erro HTML) indica serviço com problema
+        erro = requests.RequestException(f"{circuito.nome}: resposta inválida {url}: {e}", response=response)
+        circuito.registrar_falha(erro)
+        raise erro from e
+
+    if vazio_e_nao_encontrado and not data:
+        circuito.registrar_nao_encontrado()
+        raise RecursoNaoEncontrado(f"{circuito.nome}: não encontrado (resposta vazia) {url}")
+
+    circuito.registrar_sucesso()
+    return data
+
+
+def get_json(circuito, url, params=None, timeout=TIMEOUT_PADRAO_S, vazio_e_nao_encontrado=False):
+    """
+    Faz um GET protegido pelo circuit breaker e retorna o JSON da resposta.
+
+    Levanta CircuitoAberto (sem ir à rede) se o circuito estiver aberto e
+    RecursoNaoEncontrado para respostas 404, que ficam no cache negativo.
+    Ambas herdam de requests.RequestException, então os tratamentos de erro
+    existentes continuam funcionando.
+
+    vazio_e_nao_encontrado: trata um corpo vazio ([] ou {}) como "não encontrado".
+    A API de localidades do IBGE responde 200 com [] para IDs inexistentes.
+    """
+    chave_negativa = _chave_cache_negativo(circuito, url, params)
+    if cache.get(chave_negativa):
+        raise RecursoNaoEncontrado(f"{circuito.nome}: não encontrado (cache negativo) {url}")
+
+    if not circuito.permitir():
+        raise CircuitoAberto(f"{circuito.nome}: circuito aberto, chamada recusada {url}")
+
+    try:
+        response = requests.get(url, params=params, timeout=timeout)
+    except requests.RequestException as e:
+        circuito.registrar_falha(e)
+        raise
+    except BaseException:
+        circuito.liberar_teste()
+        raise
+
+    try:
+        return _tratar_resposta(circuito, url, response, vazio_e_nao_encontrado)
+    except RecursoNaoEncontrado:
+        cache.set(chave_negativa, True, CACHE_NEGATIVO_TTL_S)
+        raise
+
+
+async def get_json_async(circuito, url, params=None, timeout=TIMEOUT_PADRAO_S, vazio_e_nao_encontrado=False):
+    """
+    Versão assíncrona de get_json (cliente httpx), para as views async.
+    Mesmo circuito, mesmo cache negativo e mesmas exceções da versão síncrona:
+    erros de rede do httpx são convertidos em requests.ConnectionError.
+    """
+    chave_negativa = _chave_cache_negativo(circuito, url, params)
+    if await cache.aget(chave_negativa):
+        raise RecursoNaoEncontrado(f"{circuito.nome}: não encontrado (cache negativo) {url}")
+
+    if not circuito.permitir():
+        raise CircuitoAberto(f"{circuito.nome}: circuito aberto, chamada recusada {url}")
+
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(url, params=params)
+    except httpx.HTTPError as e:
+        circuito.registrar_falha(e)
+        raise requests.ConnectionError(f"{circuito.nome}: {e}") from e
+    except BaseException:
+        # Ex: asyncio.CancelledError quando o cliente desconecta da view async
+        circuito.liberar_teste()
+        raise
+
+    try:
+        return _tratar_resposta(circuito, url, response, vazio_e_nao_encontrado)
+    except RecursoNaoEncontrado:
+        await cache.aset(chave_negativa, True, CACHE_NEGATIVO_TTL_S)
+        raise
+
+
+def estado_dos_circuitos():
+    """Retorna o estado de todos os circuitos (usado no endpoint de instrumentação)."""
+    return {nome: circuito.estado_atual() for nome, circuito in CIRCUITOS.items()}
@@ -5,4 +5,6 @@ app_name = 'fichatecnica_app'
 
 urlpatterns = [
     path('api/ficha/<str:product_slug>/<int:city_id>/', views.get_ficha_api, name='get_ficha_api'),
+    # Instrumentação: estado dos circuit breakers (IBGE / OpenWeather)
+    path('api/status/', views.status_api, name='status_api'),
 ]
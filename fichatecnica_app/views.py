@@ -1,23 +1,42 @@
 import requests
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
+from AgroData.respostas import FastJsonResponse
+from AgroData.banco import estatisticas_conexoes
 from . import data_service  # Serviço de dados
-from django.views.decorators.http import require_GET
+from . import upstream  # Circuit breakers das APIs externas
+from django.views.decorators.http import condition, require_GET
 
 
 @require_GET
-def get_ficha_api(request, product_slug, city_id):
+@condition(
+    etag_func=lambda request, product_slug, city_id: data_service.etag_ficha_requisicao(
+        request, product_slug, city_id),
+    last_modified_func=lambda request, product_slug, city_id: data_service.last_modified_ficha_requisicao(
+        request, product_slug, city_id),
+)
+async def get_ficha_api(request, product_slug, city_id):
     """
     API que retorna a ficha técnica completa de um produto para uma cidade.
 
     A função data_service.get_ficha_tecnica busca e consolida todos os
     dados (CSV, 4 JSONs, e Clima) em uma única estrutura, incluindo os
     campos brutos (raw data) de todos os JSONs, conforme solicitado.
+
+    ?fields= (ou ?include=) limita a resposta a algumas seções, ex:
+    ?fields=producao,cotacao (seções: producao, cotacao, sazonalidade,
+    atributos, clima). As seções não pedidas não são calculadas.
     """
+    try:
+        secoes = data_service.secoes_da_requisicao(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
     # 1. Chamar a função principal de serviço que faz todo o trabalho de
     # normalização, busca IBGE, busca CSV/JSON e busca de Clima.
     # product_slug (nome não normalizado) e city_id são passados diretamente.
-    ficha_completa = data_service.get_ficha_tecnica(product_slug, city_id)
+    # Versão assíncrona: IBGE (httpx) e clima (ORM async) em paralelo.
+    ficha_completa = await data_service.get_ficha_tecnica_async(product_slug, city_id, secoes)
 
     if not ficha_completa:
         # Se retornar None, houve uma falha crítica na busca de dados ou na consolidação.
@@ -29,4 +48,22 @@ def get_ficha_api(request, product_slug, city_id):
 
     # 2. Retorna o resultado completo, que inclui todos os campos formatados (16 campos)
     # e os novos blocos com os dados brutos (raw) dos 4 JSONs.
-    return JsonResponse(ficha_completa)
+    return FastJsonResponse(ficha_completa)
+
+
+@staff_member_required
+@require_GET
+def status_api(request):
+    """
+    API de instrumentação (só para a equipe, is_staff): estado dos circuit
+    breakers das APIs externas (IBGE e OpenWeather) deste processo, com
+    contadores de chamadas, falhas, recusas e respostas "não encontrado", a taxa
+    de acerto do cache de fichas e o reuso de conexões com o banco (com pool:
+    tamanho, espera por conexão e erros). Dos erros, só a classe e o host do
+    serviço (nunca a URL, que pode ter a chave da API).
+    """
+    return JsonResponse({
+        'upstream': upstream.estado_dos_circuitos(),
+        'cache_ficha': data_service.estatisticas_cache_ficha(),
+        'banco': estatisticas_conexoes(),
+    })
@@ -18,6 +18,9 @@ urlpatterns = [
     # 2. Busca cidades de um estado específico (usa o ID do estado)
     path('api/cities/<int:state_id>/', views.get_cities_for_state, name='api_cities'),
 
+    # 2B. Nomes de vários estados/cidades numa só requisição (?estados=35,33&cidades=3506003)
+    path('api/localidades/nomes/', views.get_location_names, name='api_location_names'),
+
     # 3. Busca produtos disponíveis em uma cidade (usa o ID da cidade)
     path('api/products/<int:city_id>/', views.get_products_for_filter, name='api_products_for_filter'),
 
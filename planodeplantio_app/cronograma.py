@@ -0,0 +1,202 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from agro_app.models import EtapaPlantio, agendar_resumo_dashboard
+from fichatecnica_app import data_service
+from .resumo import invalidar_resumo_usuario
+
+# ======================================================================
+# CRONOGRAMA AUTOMÁTICO DO PLANO (ETAPAS DE PLANTIO)
+# ======================================================================
+# A partir da data de início do plano e dos dados de ciclo do produto
+# (ciclo em ficha_producao.json; janelas de plantio/colheita em
+# sazonalidade.json, ex: "Set - Dez" / "Jan - Mai"), calcula as datas de
+# preparo, plantio, manutenção e colheita. De cada texto só é usada a
+# primeira faixa de meses; "Ano todo", "Não se aplica" etc. não restringem
+# a data.
+#
+# As etapas geradas são gravadas com automatica=True, todas num único
+# bulk_create dentro de uma transação. Gerar de novo (ex: troca de produto)
+# compara com as etapas existentes: atualiza só as que mudaram (bulk_update),
+# cria as que faltam e apaga as que sobraram, sem mexer nas etapas concluídas
+# nem nas cadastradas manualmente. Como bulk_create/bulk_update não disparam
+# sinais, o resumo de custo/progresso do usuário é invalidado (e o resumo do
+# dashboard recalculado) aqui mesmo.
+
+PREPARO_DIAS = 15                        # Preparo do solo antes do plantio
+CICLO_MINIMO_DIAS = 90                   # Temporárias: tempo mínimo entre plantio e colheita
+CICLO_PADRAO_DIAS = 120                  # Temporárias sem janela de colheita definida
+PRIMEIRA_COLHEITA_PERMANENTE_DIAS = 365  # Permanentes: a primeira colheita leva ao menos um ano
+
+# Manutenções entre o plantio e a colheita: (fração do ciclo, nome, descrição)
+MANUTENCOES = (
+    (1 / 3, "Adubação de cobertura", "Aplicação de fertilizantes conforme a Ficha Técnica do cultivo."),
+    (2 / 3, "Monitoramento de pragas e doenças", "Vistoria da lavoura e controle fitossanitário, se necessário."),
+)
+
+MESES = {
+    'JAN': 1, 'FEV': 2, 'MAR': 3, 'ABR': 4, 'MAI': 5, 'JUN': 6,
+    'JUL': 7, 'AGO': 8, 'SET': 9, 'OUT': 10, 'NOV': 11, 'DEZ': 12,
+}
+_MES = r'(JAN|FEV|MAR|ABR|MAI|JUN|JUL|AGO|SET|OUT|NOV|DEZ)[A-Z]*'
+_FAIXA_MESES = re.compile(rf'\b{_MES}\s*-\s*{_MES}\b')
+_MESES_APOS_PLANTIO = re.compile(r'(\d+)\s*A\s*\d+\s*MESES\s*APOS')
+_CICLO_EM_DIAS = re.compile(r'CICLO\s*(\d+)\s*A\s*\d+\+?\s*DIAS')
+
+
+def _normalizar(texto):
+    # Diferente do normalize_text do data_service, mantém o conteúdo entre parênteses
+    # (ex: "Ano todo (3 a 4 meses após plantio)")
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('utf-8')
+    return texto.upper()
+
+
+def _janela_meses(texto):
+    """(mês inicial, mês final) da primeira faixa do texto (ex: 'Set - Dez' -> (9, 12)), ou None."""
+    faixa = _FAIXA_MESES.search(_normalizar(texto))
+    if faixa is None:
+        return None
+    return MESES[faixa.group(1)], MESES[faixa.group(2)]
+
+
+def _dias_minimos_ate_colheita(texto_colheita):
+    """Duração mínima do ciclo indicada no texto da colheita ('3 a 4 meses após...', 'ciclo 60 a 100+ dias')."""
+    texto = _normalizar(texto_colheita)
+    meses = _MESES_APOS_PLANTIO.search(texto)
+    if meses:
+        return int(meses.group(1)) * 30
+    dias = _CICLO_EM_DIAS.search(texto)
+    if dias:
+        return int(dias.group(1))
+    return None
+
+
+def _mes_na_janela(mes, janela):
+    inicio, fim = janela
+    if inicio <= fim:
+        return inicio <= mes <= fim
+    # Janela que atravessa a virada do ano (ex: Set - Mar)
+    return mes >= inicio or mes <= fim
+
+
+def _proxima_data_na_janela(data, janela):
+    """A própria data, se estiver na janela; senão o dia 1º do próximo mês inicial da janela."""
+    if janela is None or _mes_na_janela(data.month, janela):
+        return data
+    mes_inicial = janela[0]
+    ano = data.year if mes_inicial > data.month else data.year + 1
+    return date(ano, mes_inicial, 1)
+
+
+def calcular_cronograma(produto_nome, data_inicio):
+    """
+    Etapas do plano (sem gravar) em ordem cronológica:
+    [{'tipo', 'nome', 'descricao', 'data_prevista'}, ...].
+    """
+    dados = data_service.get_dados_ciclo(produto_nome) or {}
+    permanente = _normalizar(dados.get('ciclo')).startswith('PERMANENTE')
+    texto_plantio = dados.get('plantio') or 'não informada'
+    texto_colheita = dados.get('colheita') or 'não informado'
+    janela_colheita = _janela_meses(dados.get('colheita'))
+
+    data_plantio = _proxima_data_na_janela(
+        data_inicio + timedelta(days=PREPARO_DIAS), _janela_meses(dados.get('plantio'))
+    )
+
+    if permanente:
+        data_colheita = _proxima_data_na_janela(
+            data_plantio + timedelta(days=PRIMEIRA_COLHEITA_PERMANENTE_DIAS), janela_colheita
+        )
+    else:
+        dias_minimos = _dias_minimos_ate_colheita(dados.get('colheita'))
+        if janela_colheita is not None:
+            data_colheita = _proxima_data_na_janela(
+                data_plantio + timedelta(days=dias_minimos or CICLO_MINIMO_DIAS), janela_colheita
+            )
+        else:
+            data_colheita = data_plantio + timedelta(days=dias_minimos or CICLO_PADRAO_DIAS)
+
+    etapas = [
+        {
+            'tipo': 'PREPARO',
+            'nome': "Preparo do solo",
+            'descricao': "Correção e preparo do solo para o plantio.",
+            'data_prevista': data_inicio,
+        },
+        {
+            'tipo': 'PLANTIO',
+            'nome': "Plantio das mudas" if permanente else "Plantio",
+            'descricao': f"Janela de plantio sugerida: {texto_plantio}.",
+            'data_prevista': data_plantio,
+        },
+    ]
+
+    duracao_dias = (data_colheita - data_plantio).days
+    for fracao, nome, descricao in MANUTENCOES:
+        etapas.append({
+            'tipo': 'MANUTENCAO',
+            'nome': nome,
+            'descricao': descricao,
+            'data_prevista': data_plantio + timedelta(days=round(duracao_dias * fracao)),
+        })
+
+    etapas.append({
+        'tipo': 'COLHEITA',
+        'nome': "Primeira colheita" if permanente else "Colheita",
+        'descricao': f"Período de colheita: {texto_colheita}.",
+        'data_prevista': data_colheita,
+    })
+    return etapas
+
+
+def gerar_cronograma(plano):
+    """
+    Cria ou atualiza (por diferença) as etapas automáticas do plano, numa transação.
+    Retorna {'criadas', 'atualizadas', 'removidas', 'data_colheita'}.
+    """
+    desejadas = calcular_cronograma(plano.produto.nome, plano.data_inicio)
+
+    with transaction.atomic():
+        existentes = {}
+        sobras = []
+        for etapa in plano.etapas.select_for_update().filter(automatica=True):
+            chave = (etapa.tipo, etapa.nome)
+            if chave in existentes:
+                sobras.append(etapa)  # Duplicada: fica só a primeira
+            else:
+                existentes[chave] = etapa
+
+        novas = []
+        alteradas = []
+        for dados in desejadas:
+            etapa = existentes.pop((dados['tipo'], dados['nome']), None)
+            if etapa is None:
+                novas.append(EtapaPlantio(plano=plano, automatica=True, **dados))
+            elif not etapa.concluida and (etapa.data_prevista, etapa.descricao) != (dados['data_prevista'], dados['descricao']):
+                etapa.data_prevista = dados['data_prevista']
+                etapa.descricao = dados['descricao']
+                alteradas.append(etapa)
+
+        # Etapas automáticas que não fazem mais parte do cronograma (as concluídas ficam)
+        removidas = [etapa.pk for etapa in sobras + list(existentes.values()) if not etapa.concluida]
+
+        if removidas:
+            EtapaPlantio.objects.filter(pk__in=removidas).delete()
+        if alteradas:
+            EtapaPlantio.objects.bulk_update(alteradas, ['data_prevista', 'descricao'])
+        if novas:
+            EtapaPlantio.objects.bulk_create(novas)
+
+    if novas or alteradas or removidas:
+        invalidar_resumo_usuario(plano.proprietario_id)
+        agendar_resumo_dashboard(plano.proprietario_id)
+
+    return {
+        'criadas': len(novas),
+        'atualizadas': len(alteradas),
+        'removidas': len(removidas),
+        'data_colheita': desejadas[-1]['data_prevista'],
+    }
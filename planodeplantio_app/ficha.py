@@ -0,0 +1,88 @@
+import json
+
+from django.core.cache import cache
+
+from AgroData.respostas import dumps_json
+from fichatecnica_app import data_service
+
+# ======================================================================
+# FICHA TÉCNICA ESTRUTURADA (WIZARD E PÁGINA FINAL DO PLANO)
+# ======================================================================
+# O data_service devolve a ficha "plana"; o wizard (api_buscar_ficha) e a
+# página final (planofinal_plano) exibem a mesma ficha em seções. A versão
+# estruturada é montada aqui uma única vez e guardada já serializada (JSON) no
+# cache: abrir o plano salvo logo depois do wizard não recalcula nada.
+#
+# A chave reaproveita o ETag da ficha (produto canônico, município, versão dos
+# dados e janela do clima), então expira junto com o clima exibido.
+
+FICHA_ESTRUTURADA_TTL_S = data_service.CLIMA_CACHE_TTL_S
+
+# Seção -> [(rótulo exibido, campo da ficha plana)]
+SECOES_FICHA = {
+    "Informações Básicas": [
+        ("Produto", 'produto'),
+        ("Localização", 'city_name'),
+        ("Ciclo de Vida (dias)", 'ciclo_vida_dias'),
+        ("Tipo de Solo", 'tipo_solo'),
+        ("pH do Solo Ideal", 'ph_solo_ideal'),
+        ("Status Sustentabilidade", 'status_sustentabilidade'),
+    ],
+    "Dados Climáticos": [
+        ("Temperatura Ideal (°C)", 'temperatura_ideal_c'),
+        ("Precipitação Mínima (mm)", 'precipitacao_min_mm'),
+        ("Plantio Sugerido", 'periodo_plantio_sugerido'),
+        ("Colheita Prevista", 'tempo_colheita_meses'),
+        ("Condição Ideal Colheita", 'condicao_ideal_colheita'),
+        ("Necessidade Hídrica Total (mm)", 'necessidade_hidrica_total_mm'),
+    ],
+    "Produtividade e Riscos": [
+        ("Produtividade Média Local", 'produtividade_media_kg_ha'),
+        ("Vulnerabilidade a Pragas", 'vulnerabilidade_pragas'),
+        ("Fertilizante Essencial", 'fertilizante_essencial'),
+        ("Cotação (PMA - R$)", 'cotacao_pma_rs'),
+    ],
+    "Clima Local Atual": [
+        ("Temperatura Atual", 'clima_atual_temperatura'),
+        ("Condição Atual", 'clima_atual_condicao'),
+        ("Umidade Atual", 'clima_atual_umidade'),
+        ("Vento Atual", 'clima_atual_vento'),
+    ],
+}
+
+
+def estruturar_ficha(ficha_data_plana):
+    """Organiza a ficha plana do data_service nas seções exibidas (campos ausentes viram '')."""
+    return {
+        secao: {rotulo: ficha_data_plana.get(campo, '') for rotulo, campo in campos}
+        for secao, campos in SECOES_FICHA.items()
+    }
+
+
+def _chave_ficha_estruturada(produto_nome, cidade_id):
+    return f"ficha_estruturada:{data_service.etag_ficha(produto_nome, cidade_id)}"
+
+
+def get_ficha_estruturada_json(produto_nome, cidade_id):
+    """
+    Ficha estruturada já serializada (bytes JSON), do cache ou montada e guardada nele.
+    Retorna None se não houver ficha para o produto/cidade.
+    """
+    chave = _chave_ficha_estruturada(produto_nome, cidade_id)
+    conteudo = cache.get(chave)
+    if conteudo is not None:
+        return conteudo
+
+    ficha_data_plana = data_service.get_ficha_tecnica(produto_nome, str(cidade_id))
+    if ficha_data_plana is None:
+        return None
+
+    conteudo = dumps_json(estruturar_ficha(ficha_data_plana))
+    cache.set(chave, conteudo, FICHA_ESTRUTURADA_TTL_S)
+    return conteudo
+
+
+def get_ficha_estruturada(produto_nome, cidade_id):
+    """Mesma ficha de get_ficha_estruturada_json, como dicionário (para os templates)."""
+    conteudo = get_ficha_estruturada_json(produto_nome, cidade_id)
+    return json.loads(conteudo) if conteudo is not None else None
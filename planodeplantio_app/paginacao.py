@@ -0,0 +1,122 @@
+import base64
+import json
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+
+# ======================================================================
+# PAGINAÇÃO POR CURSOR (KEYSET) DAS APIS DE LISTAGEM
+# ======================================================================
+# Em vez de OFFSET, a próxima página começa logo depois da última linha da
+# anterior (WHERE (nome, id) > (último_nome, último_id)), usando o índice:
+# o custo de uma página não cresce com o número de terrenos/planos da conta.
+#
+# Parâmetros aceitos (GET):
+#   cursor : valor opaco devolvido em 'proximo_cursor' pela página anterior
+#   limite : itens por página (limitado a LIMITE_MAXIMO)
+#   total=1: inclui o total de itens (COUNT) na resposta, só quando pedido
+#
+# Os campos de ordenação precisam ser NOT NULL (a comparação com NULL não
+# funciona no WHERE e cada banco ordena os nulos de um jeito). Os valores do
+# cursor são convertidos pelo próprio campo do modelo: cursor adulterado ou
+# malformado vira ValueError (400 nas views), nunca erro 500.
+
+LIMITE_MAXIMO = 100
+
+
+def codificar_cursor(valores):
+    """Codifica os valores de ordenação da última linha num cursor opaco (base64 URL-safe)."""
+    if any(valor is None for valor in valores):
+        raise ValueError("Os campos de ordenação do cursor não podem ser nulos.")
+    texto = json.dumps([str(valor) for valor in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, campos):
+    """
+    Decodifica o cursor e converte cada valor pelo campo do modelo (ex: DateField
+    -> date); ValueError se for inválido.
+    """
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + preenchimento).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor inválido.")
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        raise ValueError("Cursor inválido.")
+
+    convertidos = []
+    for campo, valor in zip(campos, valores):
+        if not isinstance(valor, str):
+            raise ValueError("Cursor inválido.")
+        try:
+            convertido = campo.to_python(valor)
+        except ValidationError:
+            raise ValueError("Cursor inválido.")
+        if convertido is None:
+            raise ValueError("Cursor inválido.")
+        convertidos.append(convertido)
+    return convertidos
+
+
+def ler_limite(request, padrao):
+    """Tamanho da página pedido em ?limite= (entre 1 e LIMITE_MAXIMO); ValueError se não for número."""
+    valor = request.GET.get('limite')
+    if not valor:
+        return padrao
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError("Parâmetro 'limite' deve ser um número inteiro.")
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _filtro_apos(campos, valores, descendente):
+    """Monta (c1 > v1) OR (c1 = v1 AND c2 > v2) ... (ou '<' na ordem decrescente)."""
+    operador = 'lt' if descendente else 'gt'
+    filtro = Q()
+    iguais = {}
+    for campo, valor in zip(campos, valores):
+        filtro |= Q(**iguais, **{f"{campo}__{operador}": valor})
+        iguais[campo] = valor
+    return filtro
+
+
+def paginar(queryset, campos, request, limite_padrao, descendente=False):
+    """
+    Aplica a paginação por cursor ao queryset, ordenado por 'campos' (o último
+    deve ser único, ex: 'id'; todos NOT NULL).
+
+    Retorna (itens, pagina), onde 'pagina' tem 'proximo_cursor' (None na última
+    página), 'limite' e, se pedido com ?total=1, 'total'. Levanta ValueError
+    para cursor ou limite inválidos.
+    """
+    campos_modelo = [queryset.model._meta.get_field(campo) for campo in campos]
+    nulos = [campo.name for campo in campos_modelo if campo.null]
+    if nulos:
+        raise ImproperlyConfigured(f"Paginação por cursor com campo(s) que aceitam nulo: {', '.join(nulos)}.")
+
+    limite = ler_limite(request, limite_padrao)
+
+    pagina = {'limite': limite}
+    if request.GET.get('total') in ('1', 'true'):
+        pagina['total'] = queryset.count()
+
+    ordem = [f"-{campo}" if descendente else campo for campo in campos]
+    queryset = queryset.order_by(*ordem)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        valores = decodificar_cursor(cursor, campos_modelo)
+        queryset = queryset.filter(_filtro_apos(campos, valores, descendente))
+
+    # Busca um item a mais só para saber se existe uma próxima página
+    itens = list(queryset[:limite + 1])
+    proximo_cursor = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor([getattr(ultimo, campo) for campo in campos])
+
+    pagina['proximo_cursor'] = proximo_cursor
+    return itens, pagina
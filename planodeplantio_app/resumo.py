@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from agro_app.models import EtapaPlantio, PlanoPlantio, Terreno
+
+# ======================================================================
+# RESUMO DE CUSTO E PROGRESSO DOS PLANOS (AGREGADO NO BANCO)
+# ======================================================================
+# Custo (soma de EtapaPlantio.custo_total), progresso (etapas concluídas /
+# total) e próxima etapa pendente de cada plano saem de um único SELECT com
+# Sum/Count condicionais e subconsultas, sem percorrer as etapas em Python:
+#   - anotar_resumo(queryset de planos): por plano (lista de planos, página final)
+#   - resumo_usuario(user_id): por terreno e total do usuário, guardado no cache
+#     e descartado pelos sinais de EtapaPlantio/PlanoPlantio (agro_app/models.py)
+#     e pelo gerador de cronograma (bulk_create/bulk_update não disparam sinais).
+# Planos em RASCUNHO ou sem produto ficam de fora, como na lista de planos.
+
+RESUMO_PLANOS_TTL_S = 60 * 60
+
+STATUS_ATIVOS = [status for status, _ in PlanoPlantio.STATUS_CHOICES if status != 'RASCUNHO']
+
+_ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _soma_custo(campo, filtro=None):
+    return Coalesce(Sum(campo, filter=filtro), _ZERO, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _progresso_pct(concluidas, total):
+    return round(100 * concluidas / total) if total else 0
+
+
+def anotar_resumo(queryset):
+    """Anota custo, contagem de etapas e próxima etapa pendente em cada plano do queryset."""
+    proxima = EtapaPlantio.objects.filter(
+        plano=OuterRef('pk'), concluida=False
+    ).order_by('data_prevista', 'id')
+
+    return queryset.annotate(
+        resumo_custo_total=_soma_custo('etapas__custo_total'),
+        resumo_custo_realizado=_soma_custo('etapas__custo_total', Q(etapas__concluida=True)),
+        resumo_total_etapas=Count('etapas'),
+        resumo_etapas_concluidas=Count('etapas', filter=Q(etapas__concluida=True)),
+        resumo_proxima_nome=Subquery(proxima.values('nome')[:1]),
+        resumo_proxima_data=Subquery(proxima.values('data_prevista')[:1]),
+    )
+
+
+def resumo_plano(plano):
+    """Dicionário do resumo de um plano anotado por anotar_resumo."""
+    proxima = None
+    if plano.resumo_proxima_nome:
+        proxima = {'nome': plano.resumo_proxima_nome, 'data_prevista': plano.resumo_proxima_data}
+
+    return {
+        'custo_total': plano.resumo_custo_total,
+        'custo_realizado': plano.resumo_custo_realizado,
+        'total_etapas': plano.resumo_total_etapas,
+        'etapas_concluidas': plano.resumo_etapas_concluidas,
+        'progresso_pct': _progresso_pct(plano.resumo_etapas_concluidas, plano.resumo_total_etapas),
+        'proxima_etapa': proxima,
+    }
+
+
+def insumos_plano(plano):
+    """Quantidade total de cada insumo do plano, por unidade (uma consulta agrupada)."""
+    return list(
+        EtapaPlantio.objects.filter(
+            plano=plano, quantidade_insumo__isnull=False
+        ).values(
+            'insumo_usado', 'unidade_insumo'
+        ).annotate(
+            quantidade=Sum('quantidade_insumo')
+        ).order_by('insumo_usado', 'unidade_insumo')
+    )
+
+
+def _chave_resumo_usuario(user_id):
+    return f"resumo_planos:{user_id}"
+
+
+def invalidar_resumo_usuario(user_id):
+    """Descarta o resumo em cache do usuário (chamado quando etapas/planos mudam)."""
+    if user_id:
+        cache.delete(_chave_resumo_usuario(user_id))
+
+
+def _calcular_resumo_usuario(user_id):
+    ativos = Q(plantios__status__in=STATUS_ATIVOS, plantios__produto__isnull=False)
+    concluidas = ativos & Q(plantios__etapas__concluida=True)
+
+    terrenos = Terreno.objects.filter(proprietario_id=user_id).annotate(
+        resumo_planos=Count('plantios', filter=ativos, distinct=True),
+        resumo_custo_total=_soma_custo('plantios__etapas__custo_total', ativos),
+        resumo_custo_realizado=_soma_custo('plantios__etapas__custo_total', concluidas),
+        resumo_total_etapas=Count('plantios__etapas', filter=ativos),
+        resumo_etapas_concluidas=Count('plantios__etapas', filter=concluidas),
+    ).order_by('nome', 'id')
+
+    por_terreno = []
+    totais = {'planos': 0, 'custo_total': Decimal('0.00'), 'custo_realizado': Decimal('0.00'),
+              'total_etapas': 0, 'etapas_concluidas': 0}
+    for terreno in terrenos:
+        linha = {
+            'terreno_id': terreno.pk,
+            'terreno_nome': terreno.nome,
+            'planos': terreno.resumo_planos,
+            'custo_total': terreno.resumo_custo_total,
+            'custo_realizado': terreno.resumo_custo_realizado,
+            'total_etapas': terreno.resumo_total_etapas,
+            'etapas_concluidas': terreno.resumo_etapas_concluidas,
+            'progresso_pct': _progresso_pct(terreno.resumo_etapas_concluidas, terreno.resumo_total_etapas),
+        }
+        por_terreno.append(linha)
+        for campo in totais:
+            totais[campo] += linha[campo]
+    totais['progresso_pct'] = _progresso_pct(totais['etapas_concluidas'], totais['total_etapas'])
+
+    proxima = EtapaPlantio.objects.filter(
+        plano__proprietario_id=user_id,
+        plano__status__in=STATUS_ATIVOS,
+        plano__produto__isnull=False,
+        concluida=False,
+    ).select_related('plano').order_by('data_prevista', 'id').first()
+    totais['proxima_etapa'] = {
+        'nome': proxima.nome,
+        'data_prevista': proxima.data_prevista,
+        'plano_id': proxima.plano_id,
+        'plano_nome': proxima.plano.nome,
+    } if proxima else None
+
+    return {'totais': totais, 'terrenos': por_terreno}
+
+
+def resumo_usuario(user_id):
+    """
+    Resumo dos planos do usuário: {'totais': {...}, 'terrenos': [...]}.
+    Vem do cache; quando não está lá, custa duas consultas (terrenos agregados e próxima etapa).
+    """
+    chave = _chave_resumo_usuario(user_id)
+    resumo = cache.get(chave)
+    if resumo is None:
+        resumo = _calcular_resumo_usuario(user_id)
+        cache.set(chave, resumo, RESUMO_PLANOS_TTL_S)
+    return resumo
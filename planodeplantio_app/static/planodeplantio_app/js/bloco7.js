@@ -19,10 +19,20 @@ document.addEventListener('DOMContentLoaded', () => {
     const planosLoading = document.getElementById('planosLoading');
     const planosEmpty = document.getElementById('planosEmpty');
     const planosList = document.getElementById('planosList'); // Novo UL para a lista
+    const planosResumo = document.getElementById('planosResumo'); // Totais de custo/progresso do usuário
 
     // Variável global para armazenar os dados dos terrenos
     let terrenosData = [];
 
+    // Paginação por cursor das APIs: cursor da próxima página (null = última página)
+    const OPCAO_MAIS_TERRENOS = '__mais__';
+    let proximoCursorTerrenos = null;
+    let proximoCursorPlanos = null;
+    let verMaisPlanosBtn = null;
+
+    // Monta a URL da API com o cursor da próxima página, se houver
+    const urlComCursor = (url, cursor) => cursor ? `${url}?cursor=${encodeURIComponent(cursor)}` : url;
+
     // Função auxiliar para exibir mensagens de status
     const showMessage = (message, isError = false, targetBox = messageBox) => {
         // Verifica se o targetBox existe, protegendo contra erros de DOM
@@ -38,7 +48,7 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // 2. Função principal para carregar os terrenos (INALTERADA NA LÓGICA)
-    const loadTerrenos = async () => {
+    const loadTerrenos = async (cursor = null) => {
         if (typeof API_TERRENOS_URL === 'undefined' || typeof WIZARD_START_URL === 'undefined') {
             showMessage("Erro: As URLs do Django não foram injetadas corretamente no HTML.", true);
             if (selecionarBtn) selecionarBtn.disabled = true;
@@ -51,7 +61,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (loadingSpinner) loadingSpinner.classList.remove('hidden');
 
         try {
-            const response = await fetch(API_TERRENOS_URL);
+            const response = await fetch(urlComCursor(API_TERRENOS_URL, cursor));
 
             if (!response.ok) {
                 const errorData = await response.json();
@@ -59,22 +69,38 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             const data = await response.json();
-            terrenosData = data.terrenos || [];
+            const novosTerrenos = data.terrenos || [];
+            terrenosData = cursor ? terrenosData.concat(novosTerrenos) : novosTerrenos;
+            proximoCursorTerrenos = data.proximo_cursor || null;
 
             if (terrenoSelect) {
-                terrenoSelect.innerHTML = '<option value="" disabled selected>Selecione um terreno</option>';
+                if (cursor) {
+                    // Página seguinte: remove a opção "carregar mais" e acrescenta os novos terrenos
+                    const opcaoMais = terrenoSelect.querySelector(`option[value="${OPCAO_MAIS_TERRENOS}"]`);
+                    if (opcaoMais) opcaoMais.remove();
+                    terrenoSelect.value = '';
+                } else {
+                    terrenoSelect.innerHTML = '<option value="" disabled selected>Selecione um terreno</option>';
+                }
 
                 if (terrenosData.length === 0) {
                     showMessage('Nenhum terreno cadastrado. Crie um terreno antes de iniciar um plano.', true);
                     terrenoSelect.innerHTML = '<option value="" disabled selected>Nenhum terreno encontrado</option>';
                 } else {
-                    terrenosData.forEach(terreno => {
+                    novosTerrenos.forEach(terreno => {
                         const option = document.createElement('option');
                         option.value = terreno.id;
                         option.textContent = `${terreno.nome} (${terreno.localizacao_display})`;
                         terrenoSelect.appendChild(option);
                     });
-                    showMessage(`Foram encontrados ${terrenosData.length} terreno(s).`, false);
+
+                    if (proximoCursorTerrenos) {
+                        const option = document.createElement('option');
+                        option.value = OPCAO_MAIS_TERRENOS;
+                        option.textContent = 'Carregar mais terrenos...';
+                        terrenoSelect.appendChild(option);
+                    }
+                    showMessage(`Foram carregados ${terrenosData.length} terreno(s).`, false);
                 }
             }
 
@@ -87,7 +113,22 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
-    // 3. Função para renderizar um único item de plano
+    // 3. Formata valores decimais (strings da API) como moeda
+    const formatarReais = (valor) => Number(valor || 0).toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
+
+    // 3A. Totais dos planos do usuário (só vêm na primeira página da API)
+    const renderResumoPlanos = (resumo) => {
+        if (!planosResumo) return;
+        if (!resumo || resumo.planos === 0) {
+            planosResumo.classList.add('hidden');
+            return;
+        }
+        planosResumo.textContent = `${resumo.planos} plano(s) ativo(s) | Progresso geral: ${resumo.progresso_pct}% | ` +
+            `Custo: ${formatarReais(resumo.custo_total)} (realizado: ${formatarReais(resumo.custo_realizado)})`;
+        planosResumo.classList.remove('hidden');
+    };
+
+    // 3B. Função para renderizar um único item de plano
     const renderPlanoItem = (plano) => {
         const li = document.createElement('li');
         // Estilo básico para o item da lista (reaproveita 'terreno-item' do main.css, mas com ajustes)
@@ -100,6 +141,11 @@ document.addEventListener('DOMContentLoaded', () => {
         // Substitui o placeholder '0' pelo ID real do plano
         const viewUrl = PLANO_VISUALIZACAO_URL.replace('0', plano.id);
 
+        // Custo e progresso já vêm agregados pela API (custo_total chega como string decimal)
+        const proximaEtapa = plano.proxima_etapa
+            ? `${plano.proxima_etapa.nome} em ${plano.proxima_etapa.data_prevista}`
+            : 'nenhuma pendente';
+
         let statusColor = '#2196F3'; // Azul para 'Em Andamento'
         if (plano.status === 'Concluído') {
             statusColor = '#4CAF50'; // Verde
@@ -118,6 +164,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 <p style="font-size: 0.85em; color: #666; margin: 2px 0;">
                     Local: ${plano.localizacao_display} | Início: ${plano.data_inicio}
                 </p>
+                <p style="font-size: 0.85em; color: #666; margin: 2px 0;">
+                    Progresso: ${plano.progresso_pct}% (${plano.etapas_concluidas}/${plano.total_etapas} etapas) | Custo: ${formatarReais(plano.custo_total)}
+                </p>
+                <p style="font-size: 0.85em; color: #666; margin: 2px 0;">
+                    Próxima etapa: ${proximaEtapa}
+                </p>
             </div>
             <div class="terreno-actions" style="margin-left: auto;">
                 <span style="font-size: 0.9em; font-weight: bold; color: ${statusColor}; border: 1px solid ${statusColor}; padding: 3px 6px; border-radius: 4px;">
@@ -132,7 +184,7 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // 4. Função para carregar a lista de planos (NOVA)
-    const loadPlanos = async () => {
+    const loadPlanos = async (cursor = null) => {
         if (typeof API_LISTA_PLANOS_URL === 'undefined') {
             // Este erro deve ser capturado na seção de terrenos, mas reforçamos aqui
             console.error("Erro fatal: API_LISTA_PLANOS_URL indefinida.");
@@ -143,11 +195,12 @@ document.addEventListener('DOMContentLoaded', () => {
         // 1. Mostrar loading e esconder tudo mais
         if (planosLoading) planosLoading.style.display = 'block';
         if (planosEmpty) planosEmpty.classList.add('hidden'); // Usa a classe 'hidden' do CSS fornecido
-        if (planosList) planosList.innerHTML = '';
+        if (planosList && !cursor) planosList.innerHTML = '';
+        if (verMaisPlanosBtn) verMaisPlanosBtn.disabled = true;
 
 
         try {
-            const response = await fetch(API_LISTA_PLANOS_URL);
+            const response = await fetch(urlComCursor(API_LISTA_PLANOS_URL, cursor));
 
             if (!response.ok) {
                 const errorData = await response.json();
@@ -156,8 +209,10 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const data = await response.json();
             const planosData = data.planos || [];
+            proximoCursorPlanos = data.proximo_cursor || null;
+            if (!cursor) renderResumoPlanos(data.resumo);
 
-            if (planosData.length === 0) {
+            if (planosData.length === 0 && !cursor) {
                 // Nenhum plano encontrado
                 if (planosEmpty) planosEmpty.classList.remove('hidden');
             } else {
@@ -168,6 +223,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
             }
 
+            atualizarVerMaisPlanos();
+
         } catch (error) {
             console.error('Falha ao carregar planos:', error);
             if (planosListContainer) {
@@ -182,10 +239,35 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
 
+    // 4B. Botão "Ver mais planos": aparece enquanto a API devolver um cursor
+    const atualizarVerMaisPlanos = () => {
+        if (!planosList) return;
+
+        if (!verMaisPlanosBtn) {
+            verMaisPlanosBtn = document.createElement('button');
+            verMaisPlanosBtn.type = 'button';
+            verMaisPlanosBtn.className = 'link-verde';
+            verMaisPlanosBtn.textContent = 'Ver mais planos';
+            verMaisPlanosBtn.style.display = 'block';
+            verMaisPlanosBtn.style.margin = '10px auto 0';
+            verMaisPlanosBtn.addEventListener('click', () => loadPlanos(proximoCursorPlanos));
+            planosList.insertAdjacentElement('afterend', verMaisPlanosBtn);
+        }
+
+        verMaisPlanosBtn.disabled = false;
+        verMaisPlanosBtn.classList.toggle('hidden', !proximoCursorPlanos);
+    };
+
     // 5. Eventos de Terrenos (MANTIDOS)
     if (terrenoSelect) {
         terrenoSelect.addEventListener('change', (event) => {
             const selectedId = event.target.value;
+
+            if (selectedId === OPCAO_MAIS_TERRENOS) {
+                loadTerrenos(proximoCursorTerrenos);
+                return;
+            }
+
             const selectedTerreno = terrenosData.find(t => String(t.id) === selectedId);
 
             if (selectedTerreno) {
@@ -1,3 +1,198 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from AgroData.apoio_testes import CACHE_LOCAL
+from agro_app.models import EtapaPlantio, PlanoPlantio, Produto, Terreno
+from . import cronograma
+from .paginacao import codificar_cursor, paginar
+
+
+def _cursor_bruto(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class PaginacaoCursorTests(TestCase):
+    """Paginação por cursor (keyset) de /plano/terrenos/ e /plano/api/planos/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('dono', password='x')
+        outro = User.objects.create_user('outro', password='x')
+
+        # Nomes repetidos: o desempate é pelo id
+        Terreno.objects.bulk_create([
+            Terreno(proprietario=cls.usuario, nome=f'Terreno {i % 4}', area_total=1, unidade_area='HA')
+            for i in range(11)
+        ] + [Terreno(proprietario=outro, nome='Terreno 0', area_total=1, unidade_area='HA')])
+
+        terreno = Terreno.objects.filter(proprietario=cls.usuario).first()
+        produto = Produto.objects.create(nome='Milho')
+        status = ['ANDAMENTO', 'CONCLUIDO', 'RASCUNHO']
+        PlanoPlantio.objects.bulk_create([
+            PlanoPlantio(proprietario=cls.usuario, terreno=terreno, produto=produto, status=status[i % 3],
+                         data_inicio=datetime.date(2026, 1, 1) + datetime.timedelta(days=i // 2))
+            for i in range(12)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def percorrer(self, url, chave, limite):
+        """Segue os cursores até a última página; devolve os ids na ordem recebida."""
+        ids = []
+        cursor = None
+        while True:
+            parametros = {'limite': limite}
+            if cursor:
+                parametros['cursor'] = cursor
+            resposta = self.client.get(url, parametros)
+            self.assertEqual(resposta.status_code, 200)
+            dados = resposta.json()
+            self.assertLessEqual(len(dados[chave]), limite)
+            ids.extend(item['id'] for item in dados[chave])
+            cursor = dados['proximo_cursor']
+            if cursor is None:
+                return ids
+
+    def test_terrenos_em_ordem_de_nome_e_id_sem_repetir(self):
+        esperado = list(
+            Terreno.objects.filter(proprietario=self.usuario).order_by('nome', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.percorrer(reverse('plano:api_terrenos'), 'terrenos', 3), esperado)
+
+    def test_planos_recentes_sem_rascunho(self):
+        esperado = list(
+            PlanoPlantio.objects.filter(proprietario=self.usuario).exclude(status='RASCUNHO')
+            .order_by('-data_inicio', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(esperado), 8)
+        self.assertEqual(self.percorrer(reverse('plano:api_lista_planos'), 'planos', 3), esperado)
+
+    def test_total_so_quando_pedido(self):
+        url = reverse('plano:api_terrenos')
+        self.assertNotIn('total', self.client.get(url).json())
+        self.assertEqual(self.client.get(url, {'total': '1'}).json()['total'], 11)
+
+    def test_consultas_por_pagina_nao_dependem_da_posicao(self):
+        url = reverse('plano:api_terrenos')
+        primeira = self.client.get(url, {'limite': 2}).json()
+        with CaptureQueriesContext(connection) as inicio:
+            self.client.get(url, {'limite': 2})
+        with CaptureQueriesContext(connection) as meio:
+            self.client.get(url, {'limite': 2, 'cursor': primeira['proximo_cursor']})
+        self.assertEqual(len(inicio), len(meio))
+
+    def test_cursor_ou_limite_invalidos_sao_400(self):
+        url = reverse('plano:api_lista_planos')
+        invalidos = [
+            'lixo',
+            _cursor_bruto(['None', '3']),          # Data nula gravada como texto
+            _cursor_bruto([None, 3]),
+            _cursor_bruto(['2026-01-01', 'abc']),  # id que não é número
+            _cursor_bruto(['2026-01-01']),         # Quantidade de valores errada
+        ]
+        for cursor in invalidos:
+            with self.subTest(cursor=cursor):
+                resposta = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(resposta.status_code, 400)
+                self.assertEqual(resposta.json()['error'], 'Cursor inválido.')
+
+        self.assertEqual(self.client.get(url, {'limite': 'dez'}).status_code, 400)
+
+    def test_campos_de_ordenacao_nulos_nao_sao_aceitos(self):
+        with self.assertRaises(ValueError):
+            codificar_cursor([None, 1])
+
+        requisicao = RequestFactory().get('/')
+        with self.assertRaises(ImproperlyConfigured):
+            paginar(PlanoPlantio.objects.all(), ['data_colheita_prevista', 'id'], requisicao, 5)
+
+
+DADOS_TEMPORARIA = {'ciclo': 'Temporário', 'plantio': 'Set - Dez', 'colheita': 'Jan - Mai'}
+DADOS_PERMANENTE = {'ciclo': 'Permanente', 'plantio': 'Ano todo', 'colheita': 'Mai - Ago'}
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CronogramaTests(TestCase):
+    """Cronograma gerado a partir das janelas de plantio/colheita (data_service simulado)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('dono', password='x')
+        terreno = Terreno.objects.create(proprietario=cls.usuario, nome='Sítio', area_total=1, unidade_area='HA')
+        cls.plano = PlanoPlantio.objects.create(
+            proprietario=cls.usuario, terreno=terreno, produto=Produto.objects.create(nome='Milho'),
+            data_inicio=datetime.date(2026, 1, 10),
+        )
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(cronograma.data_service, 'get_dados_ciclo', return_value=DADOS_TEMPORARIA)
+        self.get_dados_ciclo = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_datas_respeitam_as_janelas_de_plantio_e_colheita(self):
+        etapas = cronograma.calcular_cronograma('Milho', datetime.date(2026, 1, 10))
+
+        self.assertEqual(
+            [(etapa['tipo'], etapa['data_prevista']) for etapa in etapas],
+            [
+                ('PREPARO', datetime.date(2026, 1, 10)),
+                ('PLANTIO', datetime.date(2026, 9, 1)),       # Próxima janela Set - Dez
+                ('MANUTENCAO', datetime.date(2026, 10, 12)),
+                ('MANUTENCAO', datetime.date(2026, 11, 21)),
+                ('COLHEITA', datetime.date(2027, 1, 1)),      # Ciclo mínimo, depois janela Jan - Mai
+            ],
+        )
+        self.assertIn('Set - Dez', etapas[1]['descricao'])
+
+    def test_permanente_colhe_depois_de_um_ano(self):
+        self.get_dados_ciclo.return_value = DADOS_PERMANENTE
+        etapas = cronograma.calcular_cronograma('Laranja', datetime.date(2026, 1, 1))
+
+        self.assertEqual(etapas[1]['data_prevista'], datetime.date(2026, 1, 16))  # "Ano todo" não restringe
+        self.assertEqual(etapas[-1]['nome'], 'Primeira colheita')
+        self.assertEqual(etapas[-1]['data_prevista'], datetime.date(2027, 5, 1))
+
+    def test_gerar_de_novo_nao_duplica(self):
+        primeira = cronograma.gerar_cronograma(self.plano)
+        self.assertEqual(primeira['criadas'], 5)
+        self.assertEqual(primeira['data_colheita'], datetime.date(2027, 1, 1))
+
+        with self.assertNumQueries(3):  # SAVEPOINT, SELECT ... FOR UPDATE, RELEASE
+            segunda = cronograma.gerar_cronograma(self.plano)
+        self.assertEqual((segunda['criadas'], segunda['atualizadas'], segunda['removidas']), (0, 0, 0))
+        self.assertEqual(self.plano.etapas.count(), 5)
+
+    def test_etapas_concluidas_e_manuais_sao_preservadas(self):
+        cronograma.gerar_cronograma(self.plano)
+        preparo = self.plano.etapas.get(tipo='PREPARO')
+        preparo.concluida = True
+        preparo.save()
+        manual = EtapaPlantio.objects.create(
+            plano=self.plano, tipo='MANUTENCAO', nome='Irrigação', data_prevista=datetime.date(2026, 3, 1)
+        )
+
+        # Outra data de início: as demais etapas automáticas são recalculadas
+        self.plano.data_inicio = datetime.date(2026, 9, 1)
+        resultado = cronograma.gerar_cronograma(self.plano)
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (0, 0))
+        self.assertEqual(resultado['atualizadas'], 3)  # A colheita continua em 01/01/2027
+        preparo.refresh_from_db()
+        self.assertEqual(preparo.data_prevista, datetime.date(2026, 1, 10))
+        manual.refresh_from_db()
+        self.assertEqual(manual.data_prevista, datetime.date(2026, 3, 1))
+        self.assertEqual(self.plano.etapas.get(tipo='PLANTIO').data_prevista, datetime.date(2026, 9, 16))
@@ -1,5 +1,6 @@
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from AgroData.respostas import FastJsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
@@ -7,33 +8,19 @@ from django.contrib import messages
 # IMPORTAÇÃO CORRETA DOS MODELOS DO SEU PROJETO (agro_app)
 from agro_app.models import Terreno, PlanoPlantio, Produto
 # Importa as funções do serviço de dados
-from fichatecnica_app.data_service import get_products_for_city, get_ficha_tecnica
-from django.db import IntegrityError
+from fichatecnica_app.data_service import get_products_for_city
+from .ficha import get_ficha_estruturada, get_ficha_estruturada_json
+from .paginacao import paginar
+from .cronograma import gerar_cronograma
+from .resumo import anotar_resumo, insumos_plano, resumo_plano, resumo_usuario
+from django.db import IntegrityError, transaction
 import json
 from datetime import date
-from decimal import Decimal
 
-# IMPORTAÇÃO DA LÓGICA DE TRADUÇÃO (que está em agro_app.views)
-from agro_app.views import get_city_name_from_id, get_state_name_from_id
 
-
-# ======================================================================
-# FUNÇÃO AUXILIAR GLOBAL
-# ======================================================================
-def convert_decimal_and_clean(obj):
-    """Converte Decimal para str, None para string vazia, e limpa recursivamente."""
-    if isinstance(obj, Decimal):
-        return str(obj)
-    if obj is None:
-        return ""
-    if isinstance(obj, dict):
-        return {k: convert_decimal_and_clean(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [convert_decimal_and_clean(i) for i in obj]
-    return obj
-
-
-# ======================================================================
+# Itens por página das APIs de listagem (o cliente pode pedir até paginacao.LIMITE_MAXIMO)
+LIMITE_TERRENOS = 50
+LIMITE_PLANOS = 5
 
 
 # ----------------------------------------------------------------------
@@ -46,15 +33,18 @@ def api_terrenos(request):
     """
     API endpoint que retorna a lista de Terrenos do usuário,
     com os campos de Localização traduzidos (sem IDs IBGE).
+    Paginada por cursor (ordem: nome, id): ?cursor=, ?limite= e ?total=1 (ver paginacao.py).
     """
     try:
-        user_terrenos = Terreno.objects.filter(proprietario=request.user).order_by('nome')
+        user_terrenos, pagina = paginar(
+            Terreno.objects.filter(proprietario=request.user),
+            ['nome', 'id'], request, LIMITE_TERRENOS,
+        )
 
         terrenos_list = []
         for terreno in user_terrenos:
-            # 1. TRADUZ OS IDs PARA NOMES LEGÍVEIS
-            cidade_nome = get_city_name_from_id(terreno.cidade)
-            estado_sigla = get_state_name_from_id(terreno.estado)
+            # 1. NOMES LEGÍVEIS: rótulos de localização gravados no próprio terreno
+            cidade_nome, estado_sigla = terreno.rotulos_localizacao()
 
             terrenos_list.append({
                 'id': terreno.id,
@@ -65,10 +55,14 @@ def api_terrenos(request):
                 'estado_id': terreno.estado,
                 'cidade_nome': cidade_nome or 'N/A',
                 'estado_sigla': estado_sigla or 'N/A',
-                'localizacao_display': f"{cidade_nome or 'N/A'} / {estado_sigla or 'N/A'}"
+                'localizacao_display': terreno.localizacao_display
             })
 
-        return JsonResponse({'terrenos': terrenos_list}, status=200)
+        return FastJsonResponse({'terrenos': terrenos_list, **pagina}, status=200)
+
+    except ValueError as e:
+        # Cursor ou limite inválidos
+        return JsonResponse({'error': str(e)}, status=400)
 
     except Exception as e:
         return JsonResponse({'error': f'Erro interno ao listar terrenos: {str(e)}'}, status=500)
@@ -83,29 +77,33 @@ def api_terrenos(request):
 def api_lista_planos(request):
     """
     API endpoint que retorna a lista dos Planos de Plantio mais recentes do usuário
-    (limitado a 5, excluindo RASCUNHOS).
+    (5 por página, excluindo RASCUNHOS).
+    Paginada por cursor (ordem: data_inicio, id decrescentes): ?cursor=, ?limite= e ?total=1.
+    Cada plano traz custo, progresso e próxima etapa (agregados na mesma consulta);
+    a primeira página traz também o resumo do usuário ('resumo', em cache).
     """
     try:
-        # Busca os 5 planos mais recentes que não estão em RASCUNHO
+        # Busca os planos mais recentes que não estão em RASCUNHO
         # Garante que o produto não é NULL
-        planos = PlanoPlantio.objects.filter(
-            proprietario=request.user
-        ).exclude(
-            status='RASCUNHO'
-        ).filter(
-            produto__isnull=False
-        ).select_related(
-            'terreno', 'produto'
-        ).order_by(
-            '-data_inicio'
-        )[:5] # Limita a 5
+        planos, pagina = paginar(
+            anotar_resumo(
+                PlanoPlantio.objects.filter(
+                    proprietario=request.user
+                ).exclude(
+                    status='RASCUNHO'
+                ).filter(
+                    produto__isnull=False
+                ).select_related(
+                    'terreno', 'produto'
+                )
+            ),
+            ['data_inicio', 'id'], request, LIMITE_PLANOS, descendente=True,
+        )
 
         planos_list = []
         for plano in planos:
-            # Tradução dos IDs do terreno para exibição
-            cidade_nome = get_city_name_from_id(plano.terreno.cidade)
-            estado_sigla = get_state_name_from_id(plano.terreno.estado)
-
+            resumo = resumo_plano(plano)
+            proxima = resumo['proxima_etapa']
             planos_list.append({
                 'id': plano.id,
                 'nome': plano.nome,
@@ -113,11 +111,34 @@ def api_lista_planos(request):
                 'produto_nome': plano.produto.nome if plano.produto else 'A definir',
                 'data_inicio': plano.data_inicio.strftime('%d/%m/%Y'),
                 'status': plano.get_status_display(), # Usa a tradução legível do status
-                'localizacao_display': f"{cidade_nome or 'N/A'} / {estado_sigla or 'N/A'}"
+                # Rótulos gravados no terreno (já trazido pelo select_related)
+                'localizacao_display': plano.terreno.localizacao_display,
+                'custo_total': resumo['custo_total'],
+                'total_etapas': resumo['total_etapas'],
+                'etapas_concluidas': resumo['etapas_concluidas'],
+                'progresso_pct': resumo['progresso_pct'],
+                'proxima_etapa': {
+                    'nome': proxima['nome'],
+                    'data_prevista': proxima['data_prevista'].strftime('%d/%m/%Y'),
+                } if proxima else None,
             })
 
-        # Adiciona json_dumps_params={'ensure_ascii': False} para evitar problemas de codificação
-        return JsonResponse({'planos': planos_list}, status=200, json_dumps_params={'ensure_ascii': False})
+        resposta = {'planos': planos_list, **pagina}
+        if not request.GET.get('cursor'):
+            totais = resumo_usuario(request.user.pk)['totais']
+            resposta['resumo'] = {
+                'planos': totais['planos'],
+                'custo_total': totais['custo_total'],
+                'custo_realizado': totais['custo_realizado'],
+                'progresso_pct': totais['progresso_pct'],
+            }
+
+        # O FastJsonResponse não escapa os acentos (equivale a ensure_ascii=False)
+        return FastJsonResponse(resposta, status=200)
+
+    except ValueError as e:
+        # Cursor ou limite inválidos
+        return JsonResponse({'error': str(e)}, status=400)
 
     except Exception as e:
         return JsonResponse({'error': f'Erro interno ao listar planos: {str(e)}'}, status=500)
@@ -194,9 +215,8 @@ def etapa1_plano(request, plano_id):
     # ESTA LINHA VAI PRO SEU CONSOLE/TERMINAL
     print(f"DEBUG: Terreno ID {terreno.pk} | Cidade ID: {cidade_id} | Estado ID: {estado_id}")
 
-    # 1. TRADUÇÃO DOS IDS PARA NOMES LEGÍVEIS
-    cidade_nome = get_city_name_from_id(cidade_id)
-    estado_sigla = get_state_name_from_id(estado_id)
+    # 1. NOMES LEGÍVEIS (rótulos de localização gravados no terreno)
+    cidade_nome, estado_sigla = terreno.rotulos_localizacao()
     # Usando N/A_CIDADE e N/A_ESTADO para facilitar o DEBUG no console:
     localizacao_display = f"{cidade_nome or 'N/A_CIDADE'} / {estado_sigla or 'N/A_ESTADO'}"
 
@@ -247,59 +267,15 @@ def api_buscar_ficha(request):
     if not produto_nome or not cidade_id:
         return JsonResponse({'error': 'Parâmetros produto_nome e cidade_id são obrigatórios.'}, status=400)
 
-    # Lógica de fallback/conversão para garantir que a ID passada seja compatível
-    cidade_id_para_busca = str(cidade_id)
-
-    # O get_ficha_tecnica retorna um dicionário plano (ex: {'produto': 'Uva', 'tipo_solo': 'Drenado', ...})
-    ficha_data_plana = get_ficha_tecnica(produto_nome, cidade_id_para_busca)
+    # Ficha estruturada em seções (planodeplantio_app/ficha.py), já serializada e em cache:
+    # a página final do plano reaproveita o mesmo resultado.
+    conteudo = get_ficha_estruturada_json(produto_nome, cidade_id)
 
-    if ficha_data_plana is None:
+    if conteudo is None:
         return JsonResponse({'error': 'Ficha Técnica não encontrada para o produto/cidade ou erro interno.'},
                             status=404)
 
-    # ====================================================================
-    # CORREÇÃO CRÍTICA: ESTRUTURAR O DICIONÁRIO PLANO EM SEÇÕES
-    # ====================================================================
-
-    # Cria a estrutura aninhada que o JS espera
-    ficha_data_estruturada = {
-        "Informações Básicas": {
-            "Produto": ficha_data_plana.get('produto'),
-            "Localização": ficha_data_plana.get('city_name'),
-            "Ciclo de Vida (dias)": ficha_data_plana.get('ciclo_vida_dias'),
-            "Tipo de Solo": ficha_data_plana.get('tipo_solo'),
-            "pH do Solo Ideal": ficha_data_plana.get('ph_solo_ideal'),
-            "Status Sustentabilidade": ficha_data_plana.get('status_sustentabilidade'),
-        },
-        "Dados Climáticos": {
-            "Temperatura Ideal (°C)": ficha_data_plana.get('temperatura_ideal_c'),
-            "Precipitação Mínima (mm)": ficha_data_plana.get('precipitacao_min_mm'),
-            "Plantio Sugerido": ficha_data_plana.get('periodo_plantio_sugerido'),
-            "Colheita Prevista": ficha_data_plana.get('tempo_colheita_meses'),
-            "Condição Ideal Colheita": ficha_data_plana.get('condicao_ideal_colheita'),
-            "Necessidade Hídrica Total (mm)": ficha_data_plana.get('necessidade_hidrica_total_mm'),
-        },
-        "Produtividade e Riscos": {
-            "Produtividade Média Local": ficha_data_plana.get('produtividade_media_kg_ha'),
-            "Vulnerabilidade a Pragas": ficha_data_plana.get('vulnerabilidade_pragas'),
-            "Fertilizante Essencial": ficha_data_plana.get('fertilizante_essencial'),
-            "Cotação (PMA - R$)": ficha_data_plana.get('cotacao_pma_rs'),
-        },
-        "Clima Local Atual": {
-            "Temperatura Atual": ficha_data_plana.get('clima_atual_temperatura'),
-            "Condição Atual": ficha_data_plana.get('clima_atual_condicao'),
-            "Umidade Atual": ficha_data_plana.get('clima_atual_umidade'),
-            "Vento Atual": ficha_data_plana.get('clima_atual_vento'),
-        }
-    }
-
-    # --------------------------------------------------------------------
-
-    # Aplica a conversão/limpeza na estrutura FINAL
-    ficha_data_final = convert_decimal_and_clean(ficha_data_estruturada)
-
-    # CORREÇÃO CRÍTICA: Adicionar json_dumps_params={'ensure_ascii': False} para resolver a codificação (acentos)
-    return JsonResponse(ficha_data_final, status=200, safe=False, json_dumps_params={'ensure_ascii': False})
+    return HttpResponse(conteudo, status=200, content_type='application/json')
 
 
 @login_required
@@ -322,25 +298,24 @@ def api_salvar_etapa1(request, plano_id):
         if not produto_nome:
             return JsonResponse({'error': 'A seleção do Produto é obrigatória.'}, status=400)
 
-        # 1. Tenta buscar (case-insensitive) e CRIA o objeto Produto se ele não existir
+        # 1. Busca pela chave canônica (índice único) e CRIA o objeto Produto se ele não existir
         try:
-            produto_obj, created = Produto.objects.get_or_create(
-                nome__iexact=produto_nome,
-                defaults={'nome': produto_nome}
-            )
+            produto_obj, created = Produto.obter_ou_criar(produto_nome)
         except Exception as e:
             return JsonResponse({'error': f"Erro ao processar o Produto no catálogo: {str(e)}"}, status=500)
 
-        # 2. Atualiza o Plano
+        # 2. Atualiza o Plano e gera (ou atualiza) o cronograma de etapas, tudo na mesma transação
         plano.produto = produto_obj
 
         if plano.data_inicio is None:
             plano.data_inicio = date.today()
 
-        plano.data_colheita_prevista = None
         plano.status = 'ANDAMENTO'
 
-        plano.save()
+        with transaction.atomic():
+            cronograma = gerar_cronograma(plano)
+            plano.data_colheita_prevista = cronograma['data_colheita']
+            plano.save()
 
         return JsonResponse({
             'message': 'Cultivo salvo com sucesso.',
@@ -367,9 +342,9 @@ def planofinal_plano(request, plano_id):
     Renderiza a página final de visualização do plano salvo (planofinal.html).
     CORRIGIDO: Estrutura os dados da Ficha Técnica e garante que a localização seja passada.
     """
-    # 1. Busca o Plano e verifica a posse
+    # 1. Busca o Plano (com custo/progresso agregados) e verifica a posse
     plano = get_object_or_404(
-        PlanoPlantio,
+        anotar_resumo(PlanoPlantio.objects.select_related('terreno', 'produto')),
         pk=plano_id,
         proprietario=request.user
     )
@@ -382,63 +357,24 @@ def planofinal_plano(request, plano_id):
     cidade_ibge_id = plano.terreno.cidade
     produto_nome = plano.produto.nome
 
-    # Lógica de conversão para garantir que a ID seja string para o serviço
-    cidade_id_para_busca = str(cidade_ibge_id)
-
-    # Obtém o dicionário PLANO
-    ficha_data_plana = get_ficha_tecnica(produto_nome, cidade_id_para_busca)
+    # Ficha estruturada (mesmo resultado em cache usado pelo wizard em api_buscar_ficha)
+    ficha_data_final = get_ficha_estruturada(produto_nome, cidade_ibge_id)
 
-    # 3. TRADUÇÃO DOS IDS PARA NOMES LEGÍVEIS PARA EXIBIÇÃO NO TEMPLATE
-    cidade_nome = get_city_name_from_id(plano.terreno.cidade)
-    estado_sigla = get_state_name_from_id(plano.terreno.estado)
-    localizacao_display = f"{cidade_nome or 'N/A'} / {estado_sigla or 'N/A'}"
+    # 3. NOMES LEGÍVEIS PARA EXIBIÇÃO NO TEMPLATE (rótulos gravados no terreno)
+    localizacao_display = plano.terreno.localizacao_display
 
-    # ====================================================================
-    # CORREÇÃO CRÍTICA AQUI: ESTRUTURAR A FICHA TÉCNICA
-    # ====================================================================
-    if ficha_data_plana is None:
+    if ficha_data_final is None:
         ficha_data_final = {}
         messages.warning(request, "Ficha Técnica não encontrada para o produto/cidade.")
-    else:
-        # Cria a estrutura aninhada (COPIADA DA api_buscar_ficha)
-        ficha_data_estruturada = {
-            "Informações Básicas": {
-                "Produto": ficha_data_plana.get('produto'),
-                "Localização": ficha_data_plana.get('city_name'),
-                "Ciclo de Vida (dias)": ficha_data_plana.get('ciclo_vida_dias'),
-                "Tipo de Solo": ficha_data_plana.get('tipo_solo'),
-                "pH do Solo Ideal": ficha_data_plana.get('ph_solo_ideal'),
-                "Status Sustentabilidade": ficha_data_plana.get('status_sustentabilidade'),
-            },
-            "Dados Climáticos": {
-                "Temperatura Ideal (°C)": ficha_data_plana.get('temperatura_ideal_c'),
-                "Precipitação Mínima (mm)": ficha_data_plana.get('precipitacao_min_mm'),
-                "Plantio Sugerido": ficha_data_plana.get('periodo_plantio_sugerido'),
-                "Colheita Prevista": ficha_data_plana.get('tempo_colheita_meses'),
-                "Condição Ideal Colheita": ficha_data_plana.get('condicao_ideal_colheita'),
-                "Necessidade Hídrica Total (mm)": ficha_data_plana.get('necessidade_hidrica_total_mm'),
-            },
-            "Produtividade e Riscos": {
-                "Produtividade Média Local": ficha_data_plana.get('produtividade_media_kg_ha'),
-                "Vulnerabilidade a Pragas": ficha_data_plana.get('vulnerabilidade_pragas'),
-                "Fertilizante Essencial": ficha_data_plana.get('fertilizante_essencial'),
-                "Cotação (PMA - R$)": ficha_data_plana.get('cotacao_pma_rs'),
-            },
-            "Clima Local Atual": {
-                "Temperatura Atual": ficha_data_plana.get('clima_atual_temperatura'),
-                "Condição Atual": ficha_data_plana.get('clima_atual_condicao'),
-                "Umidade Atual": ficha_data_plana.get('clima_atual_umidade'),
-                "Vento Atual": ficha_data_plana.get('clima_atual_vento'),
-            }
-        }
-
-        # Garante a serialização (Decimal para str)
-        ficha_data_final = convert_decimal_and_clean(ficha_data_estruturada)
-    # ====================================================================
 
     context = {
         'plano': plano,
         'terreno': plano.terreno,
+        # Cronograma gerado em api_salvar_etapa1 (ordem de data_prevista)
+        'etapas': plano.etapas.all(),
+        # Custo, progresso e insumos somados no banco (planodeplantio_app/resumo.py)
+        'resumo': resumo_plano(plano),
+        'insumos': insumos_plano(plano),
         'ficha_data': ficha_data_final,  # PASSA O DICIONÁRIO ESTRUTURADO
         'app_name': 'plano',
         'localizacao_display': localizacao_display
@@ -0,0 +1,195 @@
+import codecs
+import csv
+import io
+from itertools import islice
+
+from django.db import transaction
+
+from agro_app.models import Terreno, agendar_resumo_dashboard
+from fichatecnica_app import localidades
+from planodeplantio_app.resumo import invalidar_resumo_usuario
+from .forms import AREA_UNIT_CHOICES, TerrenoForm
+
+# ==============================================================================
+# IMPORTAÇÃO DE TERRENOS EM LOTE (CSV)
+# ==============================================================================
+# O arquivo enviado é lido linha a linha (csv.DictReader sobre o upload, que o
+# Django guarda em disco acima de FILE_UPLOAD_MAX_MEMORY_SIZE): nunca fica
+# inteiro na memória. A cada IMPORTACAO_LOTE linhas, cada uma é validada pelas
+# regras do TerrenoForm e pela tabela local do IBGE (fichatecnica_app/localidades)
+# e as válidas são gravadas com um bulk_create. Linhas inválidas não impedem as
+# outras; o relatório traz os erros de cada linha (até IMPORTACAO_MAX_ERROS).
+#
+# A importação inteira roda numa transação: se a leitura (byte inválido, CSV
+# mal formado) ou a gravação falhar no meio do arquivo, os lotes já gravados
+# são desfeitos, e reenviar o arquivo corrigido não duplica terrenos.
+#
+# Codificação: UTF-8 (com ou sem BOM) ou, se o início do arquivo não for UTF-8
+# válido, Windows-1252 (o padrão dos CSVs do Excel no Brasil). A decodificação
+# é estrita: bytes inválidos viram ArquivoInvalido, nunca texto trocado.
+#
+# Colunas (cabeçalho obrigatório, separador ';' ou ','):
+#   nome; area_total; unidade_area (HA, M2 ou ALQ); cidade (código IBGE)
+#   ou municipio + uf (nome e sigla); estado (código IBGE da UF, opcional:
+#   se informado, precisa ser o do município)
+#
+# Como o bulk_create não chama save() nem dispara sinais, os rótulos de
+# localização são preenchidos aqui e os resumos do usuário (planos e dashboard)
+# são atualizados uma vez no fim.
+
+IMPORTACAO_LOTE = 500
+IMPORTACAO_MAX_ERROS = 1000
+AMOSTRA_CODIFICACAO_BYTES = 64 * 1024
+
+COLUNAS_OBRIGATORIAS = ('nome', 'area_total', 'unidade_area')
+UNIDADES_AREA = {codigo for codigo, _ in AREA_UNIT_CHOICES}
+
+
+class ArquivoInvalido(ValueError):
+    """O arquivo não é um CSV utilizável (cabeçalho ausente, colunas obrigatórias faltando ou conteúdo ilegível)."""
+
+
+def _detectar_codificacao(arquivo):
+    """'utf-8-sig' se o início do arquivo é UTF-8 válido, senão 'cp1252'."""
+    arquivo.seek(0)
+    amostra = arquivo.read(AMOSTRA_CODIFICACAO_BYTES)
+    arquivo.seek(0)
+    try:
+        # final=False: um caractere cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _leitor_csv(texto):
+    cabecalho = texto.readline()
+    if not cabecalho.strip():
+        raise ArquivoInvalido("Arquivo vazio ou sem cabeçalho.")
+    delimitador = ';' if cabecalho.count(';') >= cabecalho.count(',') else ','
+
+    colunas = [coluna.strip().lower() for coluna in next(csv.reader([cabecalho], delimiter=delimitador))]
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in colunas]
+    if 'cidade' not in colunas and not {'municipio', 'uf'} <= set(colunas):
+        faltando.append("cidade (ou municipio e uf)")
+    if faltando:
+        raise ArquivoInvalido(f"Colunas obrigatórias ausentes: {', '.join(faltando)}.")
+
+    return csv.DictReader(texto, fieldnames=colunas, delimiter=delimitador)
+
+
+def _area(valor):
+    # Aceita o formato brasileiro ('1.234,5') além do '1234.5'
+    valor = (valor or '').strip()
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    return valor
+
+
+def _validar_linha(registro):
+    """(Terreno sem proprietário, None) se a linha é válida, senão (None, {campo: [erros]})."""
+    dados = {campo: (valor or '').strip() for campo, valor in registro.items() if campo}
+    erros = {}
+
+    cidade = dados.get('cidade')
+    if not cidade and dados.get('municipio'):
+        cidade = localidades.codigo_municipio(dados['municipio'], dados.get('uf'))
+        if not cidade:
+            erros['municipio'] = [f"Município '{dados['municipio']}/{dados.get('uf', '')}' não encontrado na tabela do IBGE."]
+
+    municipio = localidades.get_municipio(cidade) if cidade else None
+    if cidade and municipio is None and 'municipio' not in erros:
+        erros['cidade'] = [f"Código IBGE de município inválido: '{cidade}'."]
+    elif not cidade and 'municipio' not in erros:
+        erros['cidade'] = ["Informe o código IBGE do município (ou municipio e uf)."]
+
+    estado = dados.get('estado')
+    if municipio is not None:
+        if estado and estado != str(municipio['codigo_uf']):
+            erros['estado'] = [f"O município {cidade} não pertence ao estado '{estado}'."]
+        estado = str(municipio['codigo_uf'])
+
+    unidade = dados.get('unidade_area', '').upper()
+    if unidade not in UNIDADES_AREA:
+        erros['unidade_area'] = [f"Unidade inválida: '{dados.get('unidade_area', '')}'. Use {', '.join(sorted(UNIDADES_AREA))}."]
+
+    form = TerrenoForm(data={
+        'nome': dados.get('nome', ''),
+        'area_total': _area(dados.get('area_total')),
+        'unidade_area': unidade,
+        'pais': 'Brasil',
+        'estado': estado or '',
+        'cidade': cidade or '',
+    })
+    if not form.is_valid():
+        for campo, mensagens in form.errors.items():
+            erros.setdefault(campo, []).extend(mensagens)
+
+    if erros:
+        return None, erros
+
+    terreno = form.save(commit=False)
+    terreno.estado = estado
+    terreno.cidade = cidade
+    return terreno, None
+
+
+def _ultima_linha(leitor):
+    return leitor.line_num + 1 if leitor is not None else 0
+
+
+def importar_terrenos(arquivo, usuario, lote=IMPORTACAO_LOTE):
+    """
+    Importa os terrenos do CSV enviado (UploadedFile) para o usuário.
+    Retorna {'linhas', 'importados', 'com_erro', 'erros': [{'linha', 'erros'}]};
+    levanta ArquivoInvalido (sem gravar nenhum terreno) se o cabeçalho não
+    servir ou se o arquivo não puder ser lido até o fim.
+    """
+    codificacao = _detectar_codificacao(arquivo)
+    texto = io.TextIOWrapper(arquivo.file, encoding=codificacao, newline='')
+    relatorio = {'linhas': 0, 'importados': 0, 'com_erro': 0, 'erros': []}
+    leitor = None
+    try:
+        with transaction.atomic():
+            leitor = _leitor_csv(texto)
+            while True:
+                # Linha do arquivo onde cada registro termina (a 1 é o cabeçalho, lido
+                # antes do DictReader); campos entre aspas podem ocupar várias linhas
+                registros = [(registro, leitor.line_num + 1) for registro in islice(leitor, lote)]
+                if not registros:
+                    break
+
+                validos = []
+                for registro, linha in registros:
+                    relatorio['linhas'] += 1
+                    terreno, erros = _validar_linha(registro)
+                    if erros:
+                        relatorio['com_erro'] += 1
+                        if len(relatorio['erros']) < IMPORTACAO_MAX_ERROS:
+                            relatorio['erros'].append({'linha': linha, 'erros': erros})
+                        continue
+                    terreno.proprietario = usuario
+                    terreno.atualizar_rotulos_localizacao()
+                    validos.append(terreno)
+
+                if validos:
+                    Terreno.objects.bulk_create(validos)
+                    relatorio['importados'] += len(validos)
+    except UnicodeDecodeError:
+        raise ArquivoInvalido(
+            f"O arquivo deve estar em UTF-8 ou Windows-1252 (lido como {codificacao}): caractere inválido "
+            f"depois da linha {_ultima_linha(leitor)}; nenhum terreno foi importado."
+        )
+    except csv.Error as e:
+        raise ArquivoInvalido(
+            f"CSV mal formado depois da linha {_ultima_linha(leitor)} ({e}); nenhum terreno foi importado."
+        )
+    finally:
+        texto.detach()  # Não fecha o arquivo do upload junto com o wrapper
+        # Também nos caminhos de erro (onde a transação já desfez os lotes):
+        # recalcular custa pouco e os resumos nunca ficam com números velhos
+        if relatorio['importados']:
+            invalidar_resumo_usuario(usuario.pk)
+            agendar_resumo_dashboard(usuario.pk)
+
+    return relatorio
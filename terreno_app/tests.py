@@ -1,3 +1,126 @@
-from django.test import TestCase
+import csv
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from AgroData.apoio_testes import CACHE_LOCAL
+from agro_app.models import ResumoDashboard, Terreno
+from . import importacao
+
+CAMPINAS = '3509502'
+
+
+def _csv(texto, codificacao='utf-8'):
+    return SimpleUploadedFile('terrenos.csv', texto.encode(codificacao), content_type='text/csv')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ImportarTerrenosTests(TestCase):
+    """Importação de terrenos por CSV (/api/terrenos/importar/)."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('dono', password='x')
+        self.client.force_login(self.usuario)
+        self.url = reverse('terreno_app:importar_terrenos')
+
+    def importar(self, arquivo):
+        return self.client.post(self.url, {'arquivo': arquivo})
+
+    def test_linhas_validas_e_invalidas_com_o_numero_da_linha(self):
+        resposta = self.importar(_csv(
+            "nome,area_total,unidade_area,cidade\n"
+            f"Sítio A,\"1.234,5\",HA,{CAMPINAS}\n"
+            f"\"Sítio\nB\",abc,HA,{CAMPINAS}\n"   # Nome entre aspas em duas linhas (3 e 4)
+            f"Sítio C,1,XX,{CAMPINAS}\n"
+            "Sítio D,1,HA,9999999\n"
+            f"Sítio E,10,M2,{CAMPINAS}\n"
+        ))
+
+        self.assertEqual(resposta.status_code, 200)
+        relatorio = resposta.json()
+        self.assertEqual((relatorio['linhas'], relatorio['importados'], relatorio['com_erro']), (5, 2, 3))
+        self.assertEqual(
+            [(erro['linha'], sorted(erro['erros'])) for erro in relatorio['erros']],
+            [(4, ['area_total']), (5, ['unidade_area']), (6, ['cidade'])],
+        )
+
+        sitio_a = Terreno.objects.get(proprietario=self.usuario, nome='Sítio A')
+        self.assertEqual(str(sitio_a.area_total), '1234.50')
+        self.assertEqual((sitio_a.estado, sitio_a.cidade), ('35', CAMPINAS))
+        self.assertEqual(sitio_a.rotulos_localizacao(), ('Campinas', 'SP'))
+
+    def test_csv_do_excel_em_windows_1252_com_municipio_e_uf(self):
+        resposta = self.importar(_csv(
+            "nome;area_total;unidade_area;municipio;uf\n"
+            "Fazenda São João;2,5;ALQ;Ribeirão Preto;SP\n"
+            "Chácara;1;HA;Lugar Nenhum;SP\n",
+            codificacao='cp1252',
+        ))
+
+        relatorio = resposta.json()
+        self.assertEqual((relatorio['importados'], relatorio['com_erro']), (1, 1))
+        self.assertEqual(relatorio['erros'][0]['linha'], 3)
+        self.assertIn('municipio', relatorio['erros'][0]['erros'])
+        terreno = Terreno.objects.get(proprietario=self.usuario)
+        self.assertEqual(terreno.nome, 'Fazenda São João')
+        self.assertEqual(terreno.rotulos_localizacao(), ('Ribeirão Preto', 'SP'))
+
+    def test_utf8_com_bom(self):
+        resposta = self.importar(_csv(f"nome;area_total;unidade_area;cidade\nSítio;1;HA;{CAMPINAS}\n", 'utf-8-sig'))
+        self.assertEqual(resposta.json()['importados'], 1)
+
+    @mock.patch.object(importacao, 'AMOSTRA_CODIFICACAO_BYTES', 64)
+    def test_byte_invalido_no_meio_do_arquivo_nao_importa_nada(self):
+        # A amostra (64 bytes aqui) é UTF-8 válido; o byte inválido vem depois de
+        # mais de um lote de linhas válidas
+        ResumoDashboard.do_usuario(self.usuario)
+        linhas = ''.join(f"Sítio {i};1;HA;{CAMPINAS}\n" for i in range(importacao.IMPORTACAO_LOTE + 100))
+        conteudo = f"nome;area_total;unidade_area;cidade\n{linhas}".encode('utf-8') + b"Fazenda \xff;1;HA;3509502\n"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.importar(SimpleUploadedFile('terrenos.csv', conteudo, content_type='text/csv'))
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('UTF-8 ou Windows-1252', resposta.json()['error'])
+        self.assertIn('nenhum terreno foi importado', resposta.json()['error'])
+        self.assertFalse(Terreno.objects.exists())
+        self.assertEqual(ResumoDashboard.objects.get(usuario=self.usuario).terrenos, 0)
+
+    def test_csv_mal_formado_nao_importa_nada(self):
+        campo_enorme = 'x' * (csv.field_size_limit() + 1)
+        resposta = self.importar(_csv(
+            f"nome;area_total;unidade_area;cidade\nSítio;1;HA;{CAMPINAS}\n\"{campo_enorme}\";1;HA;{CAMPINAS}\n"
+        ))
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('CSV mal formado depois da linha 2', resposta.json()['error'])
+        self.assertFalse(Terreno.objects.exists())
+
+    def test_arquivo_sem_colunas_obrigatorias_ou_ausente(self):
+        resposta = self.importar(_csv("nome;area\nSítio;1\n"))
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('area_total', resposta.json()['error'])
+
+        self.assertEqual(self.importar(_csv("")).status_code, 400)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertFalse(Terreno.objects.exists())
+
+    def test_atualiza_o_resumo_do_dashboard(self):
+        ResumoDashboard.do_usuario(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar(_csv(f"nome;area_total;unidade_area;cidade\nSítio;1;HA;{CAMPINAS}\nHorta;5000;M2;{CAMPINAS}\n"))
+
+        resumo = ResumoDashboard.objects.get(usuario=self.usuario)
+        self.assertEqual(resumo.terrenos, 2)
+        self.assertEqual(str(resumo.area_total_ha), '1.5000')
+
+    def test_exige_login(self):
+        self.client.logout()
+        self.assertEqual(self.importar(_csv(f"nome;area_total;unidade_area;cidade\nSítio;1;HA;{CAMPINAS}\n")).status_code, 302)
+        self.assertFalse(Terreno.objects.exists())
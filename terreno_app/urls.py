@@ -8,6 +8,9 @@ urlpatterns = [
     # URL para criar um novo terreno
     path('criar/', views.create_terreno, name='create_terreno'),
 
+    # URL para importar terrenos em lote (upload de CSV, resposta em JSON)
+    path('importar/', views.importar_terrenos_csv, name='importar_terrenos'),
+
     # URL para editar um terreno existente, usando a Primary Key (pk)
     path('editar/<int:pk>/', views.edit_terreno, name='edit_terreno'),
 
@@ -1,30 +1,34 @@
+import csv
+import sys
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import DatabaseError
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from AgroData.respostas import FastJsonResponse
 # Importa o modelo Terreno do aplicativo principal (agro_app)
 from agro_app.models import Terreno
 from .forms import TerrenoForm
-# CORREÇÃO DEFINITIVA: Importa a função do local correto, conforme arquivo data_service.py
-from fichatecnica_app.data_service import get_city_name_by_id
+from .importacao import ArquivoInvalido, importar_terrenos
 
 
 @login_required
 def listar_terrenos(request):
     """
-    Exibe a lista de todos os terrenos do usuário, usando o serviço real para buscar o nome da cidade.
+    Exibe a lista de todos os terrenos do usuário, com o nome da cidade gravado no terreno.
     """
     terrenos = Terreno.objects.filter(proprietario=request.user).order_by('nome')
 
     terrenos_processados = []
     for terreno in terrenos:
-        # Localização - Chama o serviço real para buscar o nome da cidade (IBGE)
-        try:
-            # A função retorna (nome_completo, nome_normalizado). Pegamos apenas o nome completo.
-            full_name, _ = get_city_name_by_id(terreno.cidade)
-            # Usa o nome completo retornado pela API. Se a API retornar None, usa o código IBGE como fallback.
-            nome_cidade = full_name if full_name else f"Cód. IBGE: {terreno.cidade}"
-        except Exception:
-            # Em caso de falha de conexão/serviço, exibe o código IBGE como fallback
+        # Localização - Rótulos gravados no próprio terreno (nome da cidade e UF, sem buscas)
+        cidade_nome, estado_sigla = terreno.rotulos_localizacao()
+        if cidade_nome:
+            nome_cidade = f"{cidade_nome} ({estado_sigla})" if estado_sigla else cidade_nome
+        else:
+            # Código fora da tabela de municípios: exibe o código IBGE como fallback
             nome_cidade = f"Cód. IBGE: {terreno.cidade}"
 
         # Área - Formata a área para exibição (ex: "10,00 HA")
@@ -115,3 +119,29 @@ def delete_terreno(request, pk):
         return redirect('agro_app:dashboard')
 
     return redirect('agro_app:dashboard')
+
+
+@login_required
+@require_POST
+def importar_terrenos_csv(request):
+    """
+    Importa terrenos em lote a partir de um CSV enviado no campo 'arquivo'
+    (formato em terreno_app/importacao.py). Devolve o relatório em JSON, com os
+    erros de cada linha rejeitada.
+    """
+    arquivo = request.FILES.get('arquivo')
+    if arquivo is None:
+        return JsonResponse({'error': "Envie o arquivo CSV no campo 'arquivo'."}, status=400)
+
+    try:
+        relatorio = importar_terrenos(arquivo, request.user)
+    except ArquivoInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except (UnicodeError, csv.Error) as e:
+        sys.stderr.write(f"Importação de terrenos (usuário {request.user.pk}): CSV ilegível: {e!r}\n")
+        return JsonResponse({'error': 'Não foi possível ler o arquivo CSV; nenhum terreno foi importado.'}, status=400)
+    except DatabaseError as e:
+        sys.stderr.write(f"Importação de terrenos (usuário {request.user.pk}): erro no banco: {e!r}\n")
+        return JsonResponse({'error': 'Erro interno ao gravar os terrenos; nenhum terreno foi importado.'}, status=500)
+
+    return FastJsonResponse(relatorio, status=200)